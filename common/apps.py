@@ -1,6 +1,21 @@
+from datetime import timedelta
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CommonConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'common'
+
+    def ready(self):
+        from . import streams  # noqa: F401  registers the outbox listener that feeds the SSE broker
+        from . import scheduler
+        from .archive import archive_rows
+        from .outbox import prune_events
+
+        scheduler.register('outbox.prune_events', timedelta(hours=1), prune_events)
+        # Bounded so a backlog is worked off over several runs, each well within the scheduler lease.
+        scheduler.register('archive.archive_rows', timedelta(hours=1),
+                           lambda: sum(archive_rows(max_batches=settings.ARCHIVE_JOB_MAX_BATCHES).values()))
+        scheduler.register('scheduler.prune_runs', timedelta(days=1), scheduler.prune_runs)
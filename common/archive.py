@@ -0,0 +1,148 @@
+"""
+Archive tables for finished rows.
+
+Reports and applications of closed projects and paid invoices are only read
+for history, yet they make up most of their tables. ``archive_rows`` moves rows
+that have been finished for longer than ``ARCHIVE_AFTER_DAYS`` into archive
+tables with the same columns and ids, in transactions of at most
+``ARCHIVE_BATCH_SIZE`` rows, so the live tables and their indexes stay small
+and no transaction holds locks for long.
+
+Archive tables reference the same parents with real foreign keys, so they
+cascade like the live rows, and many-to-many links move with their rows.
+Archiving is not a deletion: no ``post_delete`` signals are sent, so outbox
+tombstones, ratings and other derived data are left as they are.
+
+Viewsets with ``IncludeArchivedMixin`` serve archived rows next to the live
+ones when asked with ``?include_archived=true``.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction, DEFAULT_DB_ALIAS
+from django.http import Http404
+from django.utils import timezone
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.generics import get_object_or_404
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from .outbox import model_label
+
+# label -> ArchivePolicy
+policies = {}
+
+
+class ArchivePolicy:
+    def __init__(self, model, archive_model, eligible):
+        self.model = model
+        self.archive_model = archive_model
+        self.eligible = eligible
+        self.fields = [field.attname for field in model._meta.concrete_fields]
+
+    def archive_batch(self, cutoff, batch_size, using=DEFAULT_DB_ALIAS):
+        """Move up to ``batch_size`` eligible rows in one transaction. Returns the number moved."""
+        rows = self.model._base_manager.using(using)
+        with transaction.atomic(using=using):
+            ids = list(rows.filter(self.eligible(cutoff)).order_by('pk').select_for_update(of=('self',))
+                       .values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return 0
+            archived_at = timezone.now()
+            self.archive_model._base_manager.using(using).bulk_create(
+                [self.archive_model(archived_at=archived_at, **row)
+                 for row in rows.filter(pk__in=ids).values(*self.fields)])
+            for field in self.model._meta.many_to_many:
+                self.move_links(field, ids, using)
+            # A raw delete sends no signals and collects no cascades; nothing references these rows.
+            rows.filter(pk__in=ids)._raw_delete(using)
+        return len(ids)
+
+    def move_links(self, field, ids, using):
+        archive_field = self.archive_model._meta.get_field(field.name)
+        archive_through = archive_field.remote_field.through
+        links = field.remote_field.through._base_manager.using(using) \
+            .filter(**{f'{field.m2m_field_name()}__in': ids})
+        source, target = f'{archive_field.m2m_field_name()}_id', f'{archive_field.m2m_reverse_field_name()}_id'
+        archive_through._base_manager.using(using).bulk_create(
+            [archive_through(**{source: source_id, target: target_id})
+             for source_id, target_id in links.values_list(field.m2m_field_name(), field.m2m_reverse_field_name())])
+        links._raw_delete(using)
+
+
+def register(model, archive_model, eligible):
+    """
+    Archive rows of ``model`` into ``archive_model``, which has the same
+    columns plus ``archived_at``. ``eligible(cutoff)`` returns the ``Q`` of the
+    rows that were finished before ``cutoff``.
+    """
+    policies[model_label(model)] = ArchivePolicy(model, archive_model, eligible)
+
+
+def archive_rows(days=None, batch_size=None, max_batches=None, labels=None, using=DEFAULT_DB_ALIAS):
+    """
+    Archive the eligible rows of the registered models (or those in
+    ``labels``), at most ``max_batches`` batches per model. Returns
+    ``{label: rows moved}``.
+    """
+    cutoff = timezone.now() - timedelta(days=settings.ARCHIVE_AFTER_DAYS if days is None else days)
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    moved = {}
+    for label, policy in policies.items():
+        if labels and label not in labels:
+            continue
+        moved[label] = batches = 0
+        while max_batches is None or batches < max_batches:
+            count = policy.archive_batch(cutoff, batch_size, using)
+            moved[label] += count
+            batches += 1
+            if count < batch_size:
+                break
+    return moved
+
+
+def wants_archived(request):
+    return request.query_params.get('include_archived', '').lower() in ('1', 'true', 'yes')
+
+
+class IncludeArchivedMixin:
+    """
+    Adds ``?include_archived=true`` to a viewset's list and retrieve actions:
+    archived rows are served too, after the live ones, and are read-only.
+    Viewsets define ``get_archived_queryset()``, which applies the visibility
+    rules of ``get_queryset`` to the archive model. Delta sync
+    (``updated_since``) only covers live rows, archived rows no longer change.
+    """
+
+    def filter_archived_queryset(self, queryset):
+        for backend in self.filter_backends:
+            if issubclass(backend, DjangoFilterBackend):
+                # DjangoFilterBackend only takes the filterset's own model; the archive has the same fields.
+                filterset_class = getattr(self, 'filterset_class', None)
+                if filterset_class is not None:
+                    queryset = filterset_class(self.request.query_params, queryset=queryset,
+                                               request=self.request).qs
+            else:
+                queryset = backend().filter_queryset(self.request, queryset, self)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        if not wants_archived(request) or 'updated_since' in request.query_params:
+            return super().list(request, *args, **kwargs)
+        rows = list(self.filter_queryset(self.get_queryset()))
+        rows += self.filter_archived_queryset(self.get_archived_queryset())
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(rows, many=True).data)
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            if self.request.method not in SAFE_METHODS or not wants_archived(self.request):
+                raise
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(self.get_archived_queryset(), **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(self.request, row)
+        return row
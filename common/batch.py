@@ -0,0 +1,140 @@
+"""
+Batched API calls.
+
+``run_batch`` dispatches a list of sub-requests to the regular URL routes
+in-process. The batch request is authenticated once; sub-requests carry the
+resolved user through DRF's forced authentication, so no token is decoded
+again and no middleware runs per sub-request.
+
+- ``atomic``: sub-requests run in order inside one transaction; the first one
+  that fails rolls everything back and the rest are not run (424).
+- otherwise each sub-request runs in its own savepoint, so a failing one only
+  rolls back itself. A batch of safe (read-only) sub-requests runs them
+  concurrently on up to ``BATCH_MAX_WORKERS`` threads, each with its own
+  database connection.
+
+Only DRF views can be batched; other routes (the event stream, the admin)
+get a 400 entry. A sub-request that raises gets a 500 entry, the other
+entries are returned as usual.
+"""
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections, transaction
+from django.urls import resolve, Resolver404
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+METHODS = SAFE_METHODS + ('POST', 'PUT', 'PATCH', 'DELETE')
+
+
+class BatchError(ValueError):
+    pass
+
+
+def parse_batch(data):
+    """Validate the payload and return ``(atomic, sub_requests)``; raise ``BatchError`` when invalid."""
+    if not isinstance(data, dict) or not isinstance(data.get('requests'), list) or not data['requests']:
+        raise BatchError('requests must be a non-empty list.')
+    if len(data['requests']) > settings.BATCH_MAX_REQUESTS:
+        raise BatchError(f'A batch holds at most {settings.BATCH_MAX_REQUESTS} requests.')
+    sub_requests = []
+    for index, item in enumerate(data['requests']):
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str) or not item['path'].startswith('/'):
+            raise BatchError(f'requests[{index}] needs a path starting with "/".')
+        method = str(item.get('method', 'GET')).upper()
+        if method not in METHODS:
+            raise BatchError(f'requests[{index}] has an unsupported method.')
+        sub_requests.append({'id': item.get('id', index), 'method': method, 'path': item['path'],
+                             'body': item.get('body')})
+    return bool(data.get('atomic', False)), sub_requests
+
+
+def build_request(request, sub_request):
+    """A WSGI request for ``sub_request`` that inherits the batch request's headers and user."""
+    path, _, query_string = sub_request['path'].partition('?')
+    body = b'' if sub_request['body'] is None else json.dumps(sub_request['body']).encode()
+    environ = {key: value for key, value in request.META.items() if key not in ('wsgi.input', 'CONTENT_LENGTH')}
+    environ.update({
+        'REQUEST_METHOD': sub_request['method'],
+        'PATH_INFO': path,
+        'SCRIPT_NAME': '',
+        'QUERY_STRING': query_string,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': BytesIO(body),
+    })
+    wsgi_request = WSGIRequest(environ)
+    wsgi_request.user = request.user
+    wsgi_request._force_auth_user = request.user
+    wsgi_request._force_auth_token = request.auth
+    return wsgi_request
+
+
+def dispatch(request, sub_request):
+    path = sub_request['path'].partition('?')[0]
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return {'id': sub_request['id'], 'status': 404, 'body': {"error": "Not found."}}
+    if match.url_name == 'batch':
+        return {'id': sub_request['id'], 'status': 400, 'body': {"error": "Batches cannot be nested."}}
+    if not hasattr(match.func, 'cls'):  # as_view() of APIView and ViewSet sets it
+        return {'id': sub_request['id'], 'status': 400, 'body': {"error": "Only API endpoints can be batched."}}
+    response = match.func(build_request(request, sub_request), *match.args, **match.kwargs)
+    if hasattr(response, 'data'):
+        body = response.data
+    else:
+        body = response.content.decode() if not response.streaming else None
+    return {'id': sub_request['id'], 'status': response.status_code, 'body': body}
+
+
+def failed(sub_request):
+    logger.exception('Batched %s %s failed', sub_request['method'], sub_request['path'])
+    return {'id': sub_request['id'], 'status': 500, 'body': {"error": "The request failed."}}
+
+
+def dispatch_in_savepoint(request, sub_request):
+    # DRF marks the innermost atomic block for rollback when a view fails; an exception rolls it back.
+    try:
+        with transaction.atomic():
+            return dispatch(request, sub_request)
+    except Exception:
+        return failed(sub_request)
+
+
+def dispatch_in_thread(request, sub_request):
+    try:
+        return dispatch(request, sub_request)
+    except Exception:
+        return failed(sub_request)
+    finally:
+        connections.close_all()
+
+
+def run_batch(request, sub_requests, atomic=False):
+    if atomic:
+        results = []
+        with transaction.atomic():
+            for sub_request in sub_requests:
+                try:
+                    result = dispatch(request, sub_request)
+                except Exception:
+                    result = failed(sub_request)
+                results.append(result)
+                if result['status'] >= 400:
+                    transaction.set_rollback(True)
+                    break
+        results.extend({'id': sub_request['id'], 'status': 424, 'body': {"error": "Not run, the batch failed."}}
+                       for sub_request in sub_requests[len(results):])
+        return results
+    workers = min(settings.BATCH_MAX_WORKERS, len(sub_requests))
+    if workers > 1 and all(sub_request['method'] in SAFE_METHODS for sub_request in sub_requests):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda sub_request: dispatch_in_thread(request, sub_request), sub_requests))
+    return [dispatch_in_savepoint(request, sub_request) for sub_request in sub_requests]
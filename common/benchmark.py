@@ -0,0 +1,213 @@
+"""
+Endpoint benchmarks.
+
+Every list and detail route registered on the DRF routers is requested through
+the test client as a given user. Results hold latency percentiles and query
+counts per route, so two runs (for example on two commits) can be compared.
+
+``profile_loading`` times loading and serializing freelancer rows with and
+without the JSON profile columns.
+
+``hold_streams`` opens many idle SSE connections against the ASGI application
+and measures the memory they hold.
+"""
+import asyncio
+import gc
+import json
+import tracemalloc
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, URLPattern, URLResolver, reverse
+from rest_framework.test import APIClient
+
+from .streams import broker
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(durations, query_counts, statuses):
+    durations = sorted(durations)
+    return {
+        'runs': len(durations),
+        'p50_ms': round(percentile(durations, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(durations, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(durations, 0.99) * 1000, 3),
+        'max_ms': round(durations[-1] * 1000, 3),
+        'queries': max(query_counts),
+        'statuses': sorted(set(statuses)),
+    }
+
+
+def router_endpoints(resolver=None, namespace=''):
+    """Yield ``(url_name, view)`` for every router list and detail route."""
+    resolver = resolver or get_resolver()
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            yield from router_endpoints(pattern, namespace + (f'{pattern.namespace}:' if pattern.namespace else ''))
+        elif isinstance(pattern, URLPattern) and pattern.name and pattern.name.endswith(('-list', '-detail')):
+            # Routers register a second, format-suffixed pattern under the same name.
+            if 'format' not in pattern.pattern.regex.groupindex:
+                yield namespace + pattern.name, pattern.callback
+
+
+def endpoint_urls(client):
+    """
+    Resolve the URL of every router endpoint. Detail routes use the first row
+    returned by the matching list route, so they only cover rows the user sees.
+    """
+    names = [name for name, _ in router_endpoints()]
+    urls = {name: reverse(name) for name in names if name.endswith('-list')}
+    for name in names:
+        list_name = name[:-len('-detail')] + '-list'
+        if not name.endswith('-detail') or list_name not in urls:
+            continue
+        response = client.get(urls[list_name])
+        rows = response.json() if response.status_code == 200 else []
+        if isinstance(rows, dict):
+            rows = rows.get('results', [])
+        if rows and 'id' in rows[0]:
+            urls[name] = reverse(name, kwargs={'pk': rows[0]['id']})
+    return urls
+
+
+def server_name():
+    # A host the site accepts; with DEBUG and no ALLOWED_HOSTS that is localhost.
+    return next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+
+
+def run_endpoint_benchmarks(user, runs=20, warmup=2, names=None):
+    client = APIClient(SERVER_NAME=server_name())
+    client.force_authenticate(user)
+    results = {}
+    for name, url in sorted(endpoint_urls(client).items()):
+        if names and name not in names:
+            continue
+        for _ in range(warmup):
+            client.get(url)
+        durations, query_counts, statuses = [], [], []
+        for _ in range(runs):
+            with CaptureQueriesContext(connection) as queries:
+                start = perf_counter()
+                response = client.get(url)
+                durations.append(perf_counter() - start)
+            query_counts.append(len(queries))
+            statuses.append(response.status_code)
+        results[name] = dict(url=url, **summarize(durations, query_counts, statuses))
+    return results
+
+
+def compare(baseline, current):
+    """Yield ``(name, metric, before, after)`` for every metric present in both runs."""
+    for name in sorted(set(baseline) & set(current)):
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'queries'):
+            yield name, metric, baseline[name][metric], current[name][metric]
+
+
+def load(path):
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def profile_loading(limit=1000, runs=10):
+    """
+    Compare loading ``limit`` freelancers with all columns against the summary
+    projection. ``load`` covers the query and JSON decoding, ``serialize`` the
+    list serializer on top of it; ``json_bytes`` is the size of the profile
+    columns the summary skips.
+    """
+    from django.db.models import Sum, TextField
+    from django.db.models.functions import Cast, Length
+    from user.models import Freelancer
+    from user.serializers import FreelancerSerializer, FreelancerSummarySerializer
+
+    variants = {
+        'full': (Freelancer.objects.all(), FreelancerSerializer),
+        'summary': (Freelancer.objects.summary(), FreelancerSummarySerializer),
+    }
+    results = {}
+    for name, (queryset, serializer_class) in variants.items():
+        queryset = queryset.select_related('user').order_by('pk')[:limit]
+        load_times, serialize_times = [], []
+        for _ in range(runs):
+            start = perf_counter()
+            rows = list(queryset.all())
+            loaded = perf_counter()
+            serializer_class(rows, many=True).data
+            load_times.append(loaded - start)
+            serialize_times.append(perf_counter() - start)
+        results[name] = {
+            'rows': len(rows),
+            'load_p50_ms': round(percentile(sorted(load_times), 0.5) * 1000, 3),
+            'serialize_p50_ms': round(percentile(sorted(serialize_times), 0.5) * 1000, 3),
+        }
+    sizes = Freelancer.objects.filter(pk__in=Freelancer.objects.order_by('pk').values('pk')[:limit]).aggregate(
+        **{field: Sum(Length(Cast(field, TextField()))) for field in Freelancer.PROFILE_FIELDS})
+    results['json_bytes'] = sum(size or 0 for size in sizes.values())
+    return results
+
+
+async def hold_streams(token, connections=1000, path='/common/stream/', timeout=60):
+    """
+    Open ``connections`` SSE requests through the project's ASGI application,
+    wait until every one is subscribed, and report the memory they hold. The
+    connections are closed again before returning.
+    """
+    from talent_buzz.asgi import application
+    host = server_name()
+    disconnect = asyncio.Event()
+    statuses = []
+
+    async def connection(index):
+        body_sent = False
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+
+        scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                 'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+                 'query_string': f'token={token}'.encode(), 'headers': [(b'host', host.encode())],
+                 'server': (host, 80), 'client': ('127.0.0.1', 10000 + index)}
+        await application(scope, receive, send)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        before = len(broker)
+        start = perf_counter()
+        tasks = [asyncio.create_task(connection(index)) for index in range(connections)]
+        while len(broker) - before < connections and perf_counter() - start < timeout:
+            await asyncio.sleep(0.05)
+        opened = perf_counter() - start
+        held = len(broker) - before
+        gc.collect()
+        memory = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+        disconnect.set()
+    await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), timeout)
+    return {
+        'connections': held,
+        'open_seconds': round(opened, 3),
+        'memory_bytes': memory,
+        'bytes_per_connection': memory // held if held else None,
+        'statuses': sorted(set(statuses)),
+        'remaining': len(broker) - before,
+    }
@@ -0,0 +1,54 @@
+"""
+Worker startup import profile.
+
+``measure_startup`` runs ``django.setup()`` plus URLconf loading in a fresh
+interpreter under ``python -X importtime`` and summarizes the report, so
+startup regressions show up as numbers: the total import time, the packages
+that cost the most, and any of ``settings.STARTUP_DEFERRED_MODULES`` that were
+imported although they should only load on first use.
+"""
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+
+STARTUP_CODE = ('import sys, django; django.setup(); '
+                'from django.urls import get_resolver; get_resolver().url_patterns; '
+                'print(*sys.modules, sep="\\n")')
+
+
+def parse_importtime(text):
+    """Yield ``(module, self_us, cumulative_us, depth)`` for every line of an ``-X importtime`` report."""
+    for line in text.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # the header line
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        yield name.strip(), int(parts[0]), int(parts[1]), depth
+
+
+def measure_startup(top=15):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP_CODE], env=env,
+                            cwd=settings.BASE_DIR, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f'Startup failed:\n{result.stderr[-2000:]}')
+
+    rows = list(parse_importtime(result.stderr))
+    packages = defaultdict(int)
+    for module, self_us, _, _ in rows:
+        packages[module.split('.')[0]] += self_us
+    imported = set(result.stdout.split())
+    deferred = getattr(settings, 'STARTUP_DEFERRED_MODULES', ())
+    return {
+        'total_ms': round(sum(packages.values()) / 1000, 1),
+        'modules': len(imported),
+        'packages': [(package, round(us / 1000, 1))
+                     for package, us in sorted(packages.items(), key=lambda item: -item[1])[:top]],
+        'eager_deferred': sorted(module for module in deferred if module in imported),
+    }
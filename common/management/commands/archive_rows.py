@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from common.archive import archive_rows, policies
+
+
+class Command(BaseCommand):
+    help = 'Move reports and applications of closed projects and paid invoices into the archive tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                            help='Archive rows finished more than this many days ago.')
+        parser.add_argument('--batch-size', type=int, default=settings.ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Stop after this many batches per table, e.g. to bound one run.')
+        parser.add_argument('--model', action='append', choices=sorted(policies), dest='labels',
+                            help='Only archive this model (app_label.model), may be repeated.')
+
+    def handle(self, *args, **options):
+        moved = archive_rows(options['days'], options['batch_size'], options['max_batches'], options['labels'])
+        for label, count in moved.items():
+            self.stdout.write(f'{label}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Archived {sum(moved.values())} rows.'))
@@ -0,0 +1,54 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from common.benchmark import run_endpoint_benchmarks, compare, load
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every router endpoint through the test client and report latency percentiles and ' \
+           'query counts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='User to authenticate as. Defaults to the freelancer with the '
+                                               'most gig applications.')
+        parser.add_argument('--runs', type=int, default=20, help='Measured requests per endpoint.')
+        parser.add_argument('--warmup', type=int, default=2, help='Unmeasured requests per endpoint.')
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help='Only benchmark this URL name, can be repeated.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--compare', help='JSON results of an earlier run to compare against.')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['username'])
+        results = run_endpoint_benchmarks(user, runs=options['runs'], warmup=options['warmup'],
+                                          names=options['endpoints'])
+        for name, result in results.items():
+            self.stdout.write(f"{name:40} p50 {result['p50_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  "
+                              f"p99 {result['p99_ms']:9.2f} ms  queries {result['queries']:4}  "
+                              f"status {','.join(map(str, result['statuses']))}")
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2, sort_keys=True)
+        if options['compare']:
+            self.stdout.write('\nChanges against baseline:')
+            for name, metric, before, after in compare(load(options['compare']), results):
+                change = (after - before) / before * 100 if before else 0
+                self.stdout.write(f'{name:40} {metric:8} {before:10} -> {after:10} ({change:+.1f}%)')
+
+    @staticmethod
+    def get_user(username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'User "{username}" does not exist.')
+        user = User.objects.annotate(applications=Count('freelancer__freelancer_application')) \
+            .order_by('-applications', 'pk').first()
+        if user is None:
+            raise CommandError('No users found, run generate_scale_data first.')
+        return user
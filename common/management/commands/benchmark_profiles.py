@@ -0,0 +1,16 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from common.benchmark import profile_loading
+
+
+class Command(BaseCommand):
+    help = 'Time loading and serializing freelancers with and without their JSON profile columns.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=1000, help='Freelancers loaded per run.')
+        parser.add_argument('--runs', type=int, default=10)
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(profile_loading(options['limit'], options['runs']), indent=2))
@@ -0,0 +1,28 @@
+import asyncio
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from common.benchmark import hold_streams
+from common.streams import make_stream_token
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Hold many idle server-sent event connections in-process and report the memory they use.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=5000)
+        parser.add_argument('--username', help='User to connect as. Defaults to the first user.')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['username']:
+            users = users.filter(username=options['username'])
+        user = users.first()
+        if user is None:
+            raise CommandError('No matching user found.')
+        result = asyncio.run(hold_streams(make_stream_token(user.pk), options['connections']))
+        self.stdout.write(json.dumps(result, indent=2))
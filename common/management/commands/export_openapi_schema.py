@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from common.schema import generate_schema
+
+
+class Command(BaseCommand):
+    help = 'Generate the OpenAPI schema and write it to a JSON file, by default OPENAPI_SCHEMA_FILE.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='File to write. Defaults to OPENAPI_SCHEMA_FILE.')
+
+    def handle(self, *args, **options):
+        path = options['output'] or settings.OPENAPI_SCHEMA_FILE
+        if not path:
+            raise CommandError('Pass --output or set OPENAPI_SCHEMA_FILE.')
+        body = generate_schema()
+        with open(path, 'wb') as handle:
+            handle.write(body)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {len(body)} bytes to {path}.'))
@@ -0,0 +1,212 @@
+import random
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from finance.models import Invoice
+from project.models import Project, Gig, GigApplication, ProjectApplication, GigReport
+from project.search import rebuild_index
+from user.models import Freelancer, Company
+
+User = get_user_model()
+
+CATEGORIES = ['software', 'design', 'marketing', 'writing', 'data', 'finance', 'legal', 'sales', 'support',
+              'translation', 'video', 'engineering']
+# Roughly Zipf distributed: a few categories hold most of the work.
+CATEGORY_WEIGHTS = [1 / rank for rank in range(1, len(CATEGORIES) + 1)]
+SKILLS = ['python', 'django', 'react', 'figma', 'seo', 'copywriting', 'sql', 'excel', 'swift', 'kotlin', 'go',
+          'accounting', 'video editing', 'illustration', 'devops']
+LANGUAGES = ['English', 'Dutch', 'German', 'French', 'Spanish', 'Persian']
+WORDS = ('build design migrate integrate refactor audit launch optimise write translate review deploy mobile web '
+         'payment dashboard analytics campaign brand catalogue checkout onboarding api platform report pipeline '
+         'warehouse model search landing newsletter').split()
+
+
+class Command(BaseCommand):
+    help = 'Generate a realistic scale-test dataset of users, profiles, projects, gigs, applications, ' \
+           'reports and invoices.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Number of users to create.')
+        parser.add_argument('--company-ratio', type=float, default=0.1,
+                            help='Share of users that own a company; the rest are freelancers.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows per bulk_create batch.')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed, for reproducible datasets.')
+        parser.add_argument('--skip-search-index', action='store_true',
+                            help='Do not rebuild the search index afterwards.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.today = date.today()
+        self.now = timezone.now()
+        users = options['users']
+        companies = max(1, int(users * options['company_ratio']))
+
+        with transaction.atomic():
+            prefix = f'scale{options["seed"]}_{User.objects.count()}_'
+            user_ids = self.create_users(prefix, users)
+            company_user_ids, freelancer_user_ids = user_ids[:companies], user_ids[companies:]
+            company_ids = self.create_companies(company_user_ids, freelancer_user_ids)
+            freelancer_ids = self.create_freelancers(freelancer_user_ids)
+            projects = self.create_projects(company_ids, company_user_ids)
+            gigs = self.create_gigs(projects)
+            accepted = self.create_applications(gigs, projects, freelancer_ids)
+            reports = self.create_reports(accepted, gigs, company_user_ids, company_ids)
+            invoices = self.create_invoices(reports, gigs, projects, company_ids)
+
+        if not options['skip_search_index']:
+            rebuild_index(batch_size=self.chunk_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {users} users, {len(company_ids)} companies, {len(freelancer_ids)} freelancers, '
+            f'{len(projects)} projects, {len(gigs)} gigs, {len(accepted)} accepted applications, '
+            f'{len(reports)} reports and {invoices} invoices.'))
+
+    def bulk_create(self, model, objects):
+        created = []
+        for start in range(0, len(objects), self.chunk_size):
+            created.extend(model.objects.bulk_create(objects[start:start + self.chunk_size]))
+        return created
+
+    def sentence(self, words):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(words)).capitalize()
+
+    def create_users(self, prefix, count):
+        password = make_password('password')  # hashing once keeps generation fast
+        users = [User(username=f'{prefix}{index}', email=f'{prefix}{index}@example.com', password=password,
+                      first_name=f'First{index}', last_name=f'Last{index}', is_active=True)
+                 for index in range(count)]
+        return [user.pk for user in self.bulk_create(User, users)]
+
+    def create_companies(self, owner_ids, employee_pool):
+        companies = self.bulk_create(Company, [
+            Company(owner_id=owner_id, company_name=f'Company {owner_id}', company_size=self.rng.choice(
+                ['1-10', '11-50', '51-200', '200+']), company_industry=self.rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0],
+                    company_location=self.rng.choice(['Amsterdam', 'Berlin', 'Paris', 'Madrid', 'Tehran']))
+            for owner_id in owner_ids
+        ])
+        through = Company.employees.through
+        links = [through(company_id=company.pk, user_id=user_id)
+                 for company in companies
+                 for user_id in self.rng.sample(employee_pool, min(len(employee_pool), self.rng.randint(0, 5)))]
+        self.bulk_create(through, links)
+        return [company.pk for company in companies]
+
+    def create_freelancers(self, user_ids):
+        freelancers = [
+            Freelancer(
+                user_id=user_id,
+                hourly_rate=Decimal(self.rng.randint(15, 150)),
+                rating=Decimal(self.rng.randint(10, 50)) / 10,
+                total_job=self.rng.randint(0, 200),
+                availability={'hours_per_week': self.rng.choice([10, 20, 32, 40])},
+                skill=self.rng.sample(SKILLS, self.rng.randint(1, 6)),
+                language=self.rng.sample(LANGUAGES, self.rng.randint(1, 3)),
+                experience=[{'title': self.sentence(3), 'years': self.rng.randint(1, 10)}
+                            for _ in range(self.rng.randint(0, 4))],
+                education=[{'degree': self.rng.choice(['BSc', 'MSc', 'PhD'])}],
+                certification=[],
+                portfolio=[{'url': f'https://example.com/{user_id}/{index}', 'description': self.sentence(12)}
+                           for index in range(self.rng.randint(0, 5))],
+            )
+            for user_id in user_ids
+        ]
+        return [freelancer.pk for freelancer in self.bulk_create(Freelancer, freelancers)]
+
+    def create_projects(self, company_ids, owner_ids):
+        projects = []
+        for company_id, owner_id in zip(company_ids, owner_ids):
+            # Most companies post a few projects, a handful post many.
+            for _ in range(min(50, int(self.rng.paretovariate(1.5)))):
+                start = self.today - timedelta(days=self.rng.randint(-60, 900))
+                projects.append(Project(
+                    title=self.sentence(4), description=self.sentence(40), text_requirements=self.sentence(15),
+                    hourly_rate=self.rng.randint(20, 120), category=self.rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0],
+                    status=self.rng.choices(['open', 'in_progress', 'closed'], [4, 3, 3])[0],
+                    associated_user_id=owner_id, start_date=start,
+                    end_date=start + timedelta(days=self.rng.randint(14, 365)),
+                ))
+                projects[-1].company_id = company_id
+        # bulk_create hands back the same instances, so company_id survives for the gigs below.
+        return {project.pk: project for project in self.bulk_create(Project, projects)}
+
+    def create_gigs(self, projects):
+        gigs = []
+        for project in projects.values():
+            for _ in range(self.rng.randint(1, 8)):
+                start = timezone.make_aware(datetime.combine(
+                    project.start_date + timedelta(days=self.rng.randint(0, 30)), time.min))
+                gigs.append(Gig(
+                    project_id=project.pk, title=self.sentence(3), description=self.sentence(25),
+                    text_requirements=self.sentence(10), hours=self.rng.randint(4, 160),
+                    status=self.rng.choice(['open', 'open', 'in_progress', 'done']), user_id=project.company_id,
+                    start=start, end=start + timedelta(days=self.rng.randint(1, 60)),
+                    number_of_freelancers=self.rng.choice([None, 1, 1, 2, 3, 5]),
+                ))
+        return {gig.pk: gig for gig in self.bulk_create(Gig, gigs)}
+
+    def create_applications(self, gigs, projects, freelancer_ids):
+        """Create gig and project applications; return the accepted ``(gig_id, freelancer_id)`` pairs."""
+        gig_applications, project_applications, accepted = [], [], []
+        for gig in gigs.values():
+            applicants = self.rng.sample(freelancer_ids, min(len(freelancer_ids), int(self.rng.expovariate(1 / 4))))
+            slots = gig.number_of_freelancers or len(applicants)
+            for freelancer_id in applicants:
+                status = self.rng.choices([0, 1, 2], [5, 3, 2])[0]
+                if status == 1:
+                    if slots == 0:
+                        status = 2
+                    else:
+                        slots -= 1
+                        accepted.append((gig.pk, freelancer_id))
+                gig_applications.append(GigApplication(freelancer_id=freelancer_id, gig_id=gig.pk, status=status))
+        for project in projects.values():
+            for freelancer_id in self.rng.sample(freelancer_ids, min(len(freelancer_ids), self.rng.randint(0, 3))):
+                project_applications.append(ProjectApplication(
+                    freelancer_id=freelancer_id, project_id=project.pk, status=self.rng.choices([0, 1, 2], [5, 3, 2])[0]))
+        self.bulk_create(GigApplication, gig_applications)
+        self.bulk_create(ProjectApplication, project_applications)
+        if gigs:
+            Gig.objects.filter(pk__range=(min(gigs), max(gigs))).recount_accepted()
+        return accepted
+
+    def create_reports(self, accepted, gigs, reviewer_ids, company_ids):
+        reviewer_by_company = dict(zip(company_ids, reviewer_ids))
+        reports = []
+        for gig_id, freelancer_id in accepted:
+            gig = gigs[gig_id]
+            for _ in range(self.rng.randint(0, 3)):
+                start = gig.start + timedelta(hours=self.rng.randint(0, 24 * 30))
+                status = self.rng.choices(['submitted', 'approved', 'rejected'], [3, 6, 1])[0]
+                reports.append(GigReport(
+                    freelancer_id=freelancer_id, gig_id=gig_id, text=self.sentence(20), start_time=start,
+                    end_time=start + timedelta(minutes=self.rng.randint(30, 600)), status=status,
+                    reviewed_by_id=reviewer_by_company[gig.user_id] if status != 'submitted' else None,
+                    review={'rating': self.rng.choices([1, 2, 3, 4, 5], [1, 1, 3, 8, 10])[0]}
+                    if status == 'approved' else None,
+                ))
+        return self.bulk_create(GigReport, reports)
+
+    def create_invoices(self, reports, gigs, projects, company_ids):
+        invoices = []
+        for report in reports:
+            if report.status != 'approved':
+                continue
+            gig = gigs[report.gig_id]
+            hours = (report.end_time - report.start_time).total_seconds() / 3600
+            paid = self.rng.random() < 0.6
+            due_date = report.end_time.date() + timedelta(days=30)
+            currency = self.rng.choices(['EUR', 'USD', 'GBP'], [6, 3, 1])[0]
+            invoices.append(Invoice(
+                company_id=gig.user_id, freelancer_id=report.freelancer_id, project_id=gig.project_id, gig_id=gig.pk,
+                amount=int(hours * projects[gig.project_id].hourly_rate),
+                status='paid' if paid else self.rng.choice(['pending', 'approved']), due_date=due_date,
+                paid_currency=currency, received_currency=currency, transaction_fee_currency=currency,
+                paid_at=self.now - timedelta(days=self.rng.randint(0, 365)) if paid else None,
+            ))
+        return len(self.bulk_create(Invoice, invoices))
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from common.importtime import measure_startup
+
+
+class Command(BaseCommand):
+    help = 'Report the import time of django.setup() plus URLconf loading, measured with python -X importtime.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help='Number of packages to list.')
+        parser.add_argument('--budget', type=float, default=settings.STARTUP_IMPORT_BUDGET_MS,
+                            help='Fail if the total import time exceeds this many milliseconds.')
+
+    def handle(self, *args, **options):
+        report = measure_startup(top=options['top'])
+        self.stdout.write(f"{report['total_ms']} ms importing {report['modules']} modules")
+        for package, ms in report['packages']:
+            self.stdout.write(f'{ms:>10.1f} ms  {package}')
+        if report['eager_deferred']:
+            raise CommandError(f"Imported at startup but should load on first use: "
+                               f"{', '.join(report['eager_deferred'])}")
+        if report['total_ms'] > options['budget']:
+            raise CommandError(f"Startup imports take {report['total_ms']} ms, over the {options['budget']} ms budget.")
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from common.outbox import prune_events
+
+
+class Command(BaseCommand):
+    help = 'Delete outbox events past the retention period or beyond the newest OUTBOX_MAX_EVENTS.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=settings.OUTBOX_RETENTION_DAYS)
+        parser.add_argument('--max-events', type=int, default=settings.OUTBOX_MAX_EVENTS)
+        parser.add_argument('--chunk-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        deleted = prune_events(options['retention_days'], options['max_events'], options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} outbox events.'))
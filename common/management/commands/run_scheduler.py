@@ -0,0 +1,46 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from common.scheduler import Scheduler, jobs, latest_runs
+
+
+class Command(BaseCommand):
+    help = 'Run the scheduled jobs. Start one per host; the schedulers elect a leader that runs the jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the due jobs once and exit.')
+        parser.add_argument('--status', action='store_true', help='Show the last run of every job and exit.')
+        parser.add_argument('--tick', type=float, default=None, help='Seconds between checks for due jobs.')
+
+    def handle(self, *args, **options):
+        if options['status']:
+            runs = latest_runs()
+            for name, job in sorted(jobs.items()):
+                run = runs.get(name)
+                last = (f'{run.started_at:%Y-%m-%d %H:%M:%S} {"ok" if run.succeeded else "FAILED"} '
+                        f'{run.duration:.2f}s {run.rows} rows') if run else 'never run'
+                self.stdout.write(f'{name} (every {job.interval}): {last}')
+            return
+
+        scheduler = Scheduler(tick_seconds=options['tick'])
+        if options['once']:
+            runs = scheduler.tick()
+            scheduler.release()
+            for run in runs:
+                self.report(run)
+            return
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+        self.stdout.write(f'Scheduler {scheduler.holder} started with {len(jobs)} jobs.')
+        for run in scheduler.run(stop):
+            self.report(run)
+
+    def report(self, run):
+        if run.succeeded:
+            self.stdout.write(self.style.SUCCESS(f'{run.job}: {run.rows} rows in {run.duration:.2f}s'))
+        else:
+            self.stderr.write(f'{run.job} failed after {run.duration:.2f}s:\n{run.error}')
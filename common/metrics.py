@@ -0,0 +1,142 @@
+"""
+In-process request metrics.
+
+``RequestMetricsMiddleware`` feeds every request into the module level
+``registry``; the ``/metrics`` view renders it in the Prometheus text format.
+Aggregation is a handful of integer increments under a lock per request, so the
+cost stays flat regardless of traffic.
+"""
+import heapq
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class RouteStats:
+    __slots__ = ('latency', 'queries', 'query_seconds', 'response_size', 'statuses')
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.query_seconds = 0.0
+        self.response_size = Histogram(SIZE_BUCKETS)
+        self.statuses = {}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def observe(self, method, route, status, duration, query_count, query_seconds, response_size):
+        with self._lock:
+            stats = self._routes.get((method, route))
+            if stats is None:
+                stats = self._routes[(method, route)] = RouteStats()
+            stats.latency.observe(duration)
+            stats.queries.observe(query_count)
+            stats.query_seconds += query_seconds
+            if response_size is not None:
+                stats.response_size.observe(response_size)
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._routes = {}
+
+    def render(self):
+        with self._lock:
+            routes = sorted(self._routes.items())
+            sections = {
+                'http_requests_total': ('counter', 'Requests handled, by route and status.', []),
+                'http_request_duration_seconds': ('histogram', 'Request latency.', []),
+                'http_request_db_queries': ('histogram', 'SQL queries executed per request.', []),
+                'http_request_db_seconds_total': ('counter', 'Time spent in SQL queries.', []),
+                'http_response_size_bytes': ('histogram', 'Response body size.', []),
+            }
+            for (method, route), stats in routes:
+                labels = f'method="{method}",route="{escape_label(route)}"'
+                for status, count in sorted(stats.statuses.items()):
+                    sections['http_requests_total'][2].append(
+                        f'http_requests_total{{{labels},status="{status}"}} {count}')
+                sections['http_request_duration_seconds'][2].extend(
+                    stats.latency.render('http_request_duration_seconds', labels))
+                sections['http_request_db_queries'][2].extend(
+                    stats.queries.render('http_request_db_queries', labels))
+                sections['http_request_db_seconds_total'][2].append(
+                    f'http_request_db_seconds_total{{{labels}}} {stats.query_seconds}')
+                sections['http_response_size_bytes'][2].extend(
+                    stats.response_size.render('http_response_size_bytes', labels))
+        lines = []
+        for name, (kind, help_text, samples) in sections.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper counting queries and their total time, keeping
+    only the ``keep`` slowest statements.
+    """
+
+    def __init__(self, keep=3):
+        self.keep = keep
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = perf_counter() - start
+            self.count += 1
+            self.seconds += duration
+            if self.keep:
+                entry = (duration, self.count, sql)
+                if len(self.slowest) < self.keep:
+                    heapq.heappush(self.slowest, entry)
+                elif duration > self.slowest[0][0]:
+                    heapq.heapreplace(self.slowest, entry)
+
+    def slowest_queries(self):
+        return [(duration, sql) for duration, _, sql in sorted(self.slowest, reverse=True)]
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,48 @@
+import logging
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import registry, QueryRecorder
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetricsMiddleware:
+    """
+    Record latency, SQL query count/time and response size for every resolved
+    route, and log requests that go over the configured budgets together with
+    their slowest queries.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.latency_budget = getattr(settings, 'METRICS_LATENCY_BUDGET_MS', 500) / 1000
+        self.query_budget = getattr(settings, 'METRICS_QUERY_BUDGET', 50)
+        self.slow_query_count = getattr(settings, 'METRICS_SLOW_QUERY_COUNT', 3)
+
+    def __call__(self, request):
+        recorder = QueryRecorder(keep=self.slow_query_count)
+        start = perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = perf_counter() - start
+
+        resolver_match = request.resolver_match
+        route = resolver_match.route if resolver_match else 'unresolved'
+        response_size = None if response.streaming else len(response.content)
+        registry.observe(request.method, route, response.status_code, duration,
+                         recorder.count, recorder.seconds, response_size)
+
+        if duration > self.latency_budget or recorder.count > self.query_budget:
+            logger.warning(
+                'Request over budget: %s %s (%s) took %.1f ms with %d queries (%.1f ms in SQL). Slowest: %s',
+                request.method, request.path, route, duration * 1000, recorder.count, recorder.seconds * 1000,
+                '; '.join(f'{query_duration * 1000:.1f} ms: {sql}'
+                          for query_duration, sql in recorder.slowest_queries()),
+            )
+        return response
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 # Create your models here.
@@ -18,4 +19,74 @@ class Photo(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return self.user.first_name + " " + self.user.last_name + " - " + self.photo.name
\ No newline at end of file
+        return self.user.first_name + " " + self.user.last_name + " - " + self.photo.name
+
+
+class OutboxEvent(models.Model):
+    """
+    A change to a tracked model, written in the same transaction as the change
+    (see ``common.outbox``). ``id`` is the feed cursor.
+    """
+    id = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=100)  # app_label.model_name
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=[('created', 'Created'), ('updated', 'Updated'),
+                                                      ('deleted', 'Deleted')])
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'object_id'], name='outbox_object_idx'),
+            models.Index(fields=['created_at'], name='outbox_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.id} {self.action} {self.model}#{self.object_id}'
+
+
+class OutboxHorizon(models.Model):
+    """
+    How far the outbox has been pruned (see ``common.outbox.prune_events``):
+    every event created after ``pruned_until`` is still there.
+    """
+    OUTBOX = 'outbox'
+
+    name = models.CharField(max_length=50, primary_key=True, default=OUTBOX)
+    pruned_until = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.name} pruned until {self.pruned_until}'
+
+
+class SchedulerLease(models.Model):
+    """
+    The lease of the scheduler leader (see ``common.scheduler``). ``holder``
+    runs the jobs until ``expires_at`` unless it renews the lease.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    holder = models.CharField(max_length=200)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.name} held by {self.holder} until {self.expires_at}'
+
+
+class JobRun(models.Model):
+    """One run of a scheduled job: when, how long (seconds), how many rows, and the error if it failed."""
+    job = models.CharField(max_length=100)
+    holder = models.CharField(max_length=200)
+    started_at = models.DateTimeField()
+    duration = models.FloatField()
+    rows = models.BigIntegerField(blank=True, null=True)
+    succeeded = models.BooleanField()
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['job', '-started_at'], name='jobrun_job_started_idx'),
+            models.Index(fields=['started_at'], name='jobrun_started_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.job} at {self.started_at}'
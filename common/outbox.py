@@ -0,0 +1,204 @@
+"""
+Transactional outbox.
+
+Tracked models append a compact ``OutboxEvent`` on every create, update and
+delete, on the connection that made the change, so the event commits or rolls
+back with it (API requests run in ``ATOMIC_REQUESTS`` transactions). Model
+saves are picked up through signals; code that changes rows with
+``QuerySet.update()`` calls ``append_events`` itself.
+
+Deleted events of models tracked with ``owned_by`` also carry the ids of the
+users who could see the row, so delta sync hands each user only their own
+tombstones.
+
+Consumers read the feed with ``read_events(after=cursor)`` and store the last
+id they processed. ``prune_events`` keeps the table bounded. In-process
+listeners registered with ``add_listener`` are called with each batch of
+events once its transaction commits.
+"""
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Max, Min, F, Value, CharField, DateTimeField
+from django.db.models.functions import JSONObject
+from django.db.models.signals import post_save, pre_delete, post_delete
+from django.utils import timezone
+
+from .models import OutboxEvent, OutboxHorizon
+
+CREATED = 'created'
+UPDATED = 'updated'
+DELETED = 'deleted'
+
+# label -> payload fields
+tracked = {}
+# label -> {payload key: lookup of a user id}
+owners = {}
+listeners = []
+
+
+def model_label(model):
+    return model._meta.label_lower
+
+
+def compact(value):
+    return value if value is None or isinstance(value, (int, str, bool, float)) else str(value)
+
+
+def event_payload(instance, fields):
+    return {field: compact(getattr(instance, field)) for field in fields}
+
+
+def track(model, fields, owned_by=None):
+    """
+    Append outbox events for every save and delete of ``model``, carrying
+    ``fields`` as payload. ``owned_by`` maps payload keys to lookups of the
+    users who can see a row (``{'applicant_id': 'freelancer__user_id'}``);
+    deleted events carry those ids as well.
+    """
+    label = model_label(model)
+    tracked[label] = tuple(fields)
+    owners[label] = dict(owned_by or {})
+
+    def on_save(sender, instance, created, raw=False, using=None, **kwargs):
+        if not raw:
+            append_event(instance, CREATED if created else UPDATED, using=using)
+
+    def before_delete(sender, instance, using=None, **kwargs):
+        # Read while the row and its parents still exist; cascades delete children first.
+        lookups = owners[label]
+        row = model._base_manager.using(using).filter(pk=instance.pk).values(*lookups.values()).first() or {}
+        instance._outbox_owners = {key: row.get(lookup) for key, lookup in lookups.items()}
+
+    def on_delete(sender, instance, using=None, **kwargs):
+        append_event(instance, DELETED, using=using)
+
+    post_save.connect(on_save, sender=model, weak=False, dispatch_uid=f'outbox-save-{label}')
+    if owned_by:
+        pre_delete.connect(before_delete, sender=model, weak=False, dispatch_uid=f'outbox-owners-{label}')
+    post_delete.connect(on_delete, sender=model, weak=False, dispatch_uid=f'outbox-delete-{label}')
+
+
+def add_listener(listener):
+    """Call ``listener(events)`` with the events of every committed transaction."""
+    listeners.append(listener)
+
+
+def notify(events):
+    for listener in listeners:
+        listener(events)
+
+
+def after_commit(events, using=None):
+    if listeners and events:
+        transaction.on_commit(partial(notify, events), using=using)
+    return events
+
+
+def append_event(instance, action, using=None):
+    label = model_label(type(instance))
+    payload = event_payload(instance, tracked[label])
+    if action == DELETED:
+        payload.update(getattr(instance, '_outbox_owners', {}))
+    event = OutboxEvent.objects.using(using).create(
+        model=label, object_id=instance.pk, action=action, payload=payload)
+    after_commit([event], using)
+    return event
+
+
+def append_events(model, ids, action=UPDATED, using=None):
+    """
+    Append events for rows changed in bulk. The payload is read back in one
+    query, so it reflects the rows as the current transaction sees them.
+    """
+    if not ids:
+        return []
+    label = model_label(model)
+    fields = tracked[label]
+    rows = model._default_manager.using(using).filter(pk__in=ids).order_by('pk').values('pk', *fields)
+    return after_commit(OutboxEvent.objects.using(using).bulk_create([
+        OutboxEvent(model=label, object_id=row.pop('pk'), action=action,
+                    payload={field: compact(row[field]) for field in fields})
+        for row in rows
+    ]), using)
+
+
+def append_queryset_events(queryset, action=UPDATED):
+    """
+    Append an event for every row of ``queryset`` with one INSERT ... SELECT,
+    for changes too large to read back into Python. The database builds the
+    payloads, so the tracked fields must be numbers, strings or booleans.
+    In-process listeners are not called; feed readers see the events as usual.
+    Returns the number of events appended.
+    """
+    label = model_label(queryset.model)
+    fields = tracked[label]
+    names = ('model', 'object_id', 'action', 'payload', 'created_at')
+    # Only annotations are selected, in this order, so they line up with the INSERT columns.
+    rows = queryset.order_by('pk').annotate(**{f'outbox_{name}': value for name, value in zip(names, (
+        Value(label, output_field=CharField()), F('pk'), Value(action, output_field=CharField()),
+        JSONObject(**{field: F(field) for field in fields}), Value(timezone.now(), output_field=DateTimeField()),
+    ))}).values_list(*(f'outbox_{name}' for name in names))
+    sql, params = rows.query.sql_with_params()
+    connection = connections[queryset.db]
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(OutboxEvent._meta.get_field(name).column) for name in names)
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {quote(OutboxEvent._meta.db_table)} ({columns}) {sql}', params)
+        return cursor.rowcount
+
+
+def serialize_event(event):
+    return {'id': event.id, 'model': event.model, 'object_id': event.object_id, 'action': event.action,
+            'payload': event.payload, 'created_at': event.created_at}
+
+
+def read_events(after=0, limit=None, models=None):
+    """
+    Events with an id above ``after``, oldest first, and the cursor to pass next.
+
+    Ids are allocated when a transaction inserts, not when it commits, so a
+    consumer that must not miss events under concurrent writers should re-read
+    a small window behind its cursor.
+    """
+    limit = limit or settings.OUTBOX_BATCH_SIZE
+    events = OutboxEvent.objects.filter(id__gt=after).order_by('id')
+    if models:
+        events = events.filter(model__in=models)
+    events = list(events[:limit])
+    return events, events[-1].id if events else after
+
+
+def pruned_until():
+    """The newest ``created_at`` of the pruned events, or None if nothing was pruned."""
+    horizon = OutboxHorizon.objects.filter(pk=OutboxHorizon.OUTBOX).first()
+    return horizon.pruned_until if horizon else None
+
+
+def prune_events(retention_days=None, max_events=None, chunk_size=10000):
+    """
+    Delete events older than the retention period and beyond the newest
+    ``max_events``, oldest first, in id-range chunks. The newest ``created_at``
+    deleted is kept as the horizon (``pruned_until``): the feed is complete
+    after it. Returns the number deleted.
+    """
+    retention_days = settings.OUTBOX_RETENTION_DAYS if retention_days is None else retention_days
+    max_events = settings.OUTBOX_MAX_EVENTS if max_events is None else max_events
+    bounds = OutboxEvent.objects.aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return 0
+    cutoff = bounds['last'] - max_events
+    expired = OutboxEvent.objects.filter(created_at__lt=timezone.now() - timedelta(days=retention_days)) \
+        .aggregate(last=Max('id'))['last']
+    cutoff = max(cutoff, expired or 0)
+    horizon = OutboxEvent.objects.filter(id__lte=cutoff).aggregate(last=Max('created_at'))['last']
+    if horizon is not None:
+        OutboxHorizon.objects.update_or_create(pk=OutboxHorizon.OUTBOX, defaults={
+            'pruned_until': max(horizon, pruned_until() or horizon)})
+    deleted = 0
+    for start in range(bounds['first'], cutoff + 1, chunk_size):
+        count, _ = OutboxEvent.objects.filter(id__gte=start, id__lte=min(start + chunk_size - 1, cutoff)).delete()
+        deleted += count
+    return deleted
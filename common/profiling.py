@@ -0,0 +1,133 @@
+"""
+On-demand request profiling.
+
+A request is profiled when it carries a valid signed ``X-Profile`` header (see
+``make_profile_token``) or falls into the sampled fraction of traffic set by
+``PROFILING_SAMPLE_RATE``. Profiled requests run under cProfile with every SQL
+statement logged; the result is kept in a bounded in-process ring buffer and
+served to staff through ``common.views.ProfileListView``/``ProfileDetailView``.
+"""
+import cProfile
+import io
+import itertools
+import pstats
+import random
+import threading
+from collections import deque
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+from django.utils import timezone
+
+SALT = 'common.profiling'
+
+
+def make_profile_token():
+    """Signed value for the ``X-Profile`` header, valid for ``PROFILING_TOKEN_MAX_AGE`` seconds."""
+    return signing.dumps('profile', salt=SALT)
+
+
+def is_valid_token(token, max_age):
+    try:
+        return signing.loads(token, salt=SALT, max_age=max_age) == 'profile'
+    except signing.BadSignature:
+        return False
+
+
+class ProfileStore:
+    """Thread-safe ring buffer holding the most recent profiles."""
+
+    def __init__(self, size):
+        self._lock = threading.Lock()
+        self._profiles = deque(maxlen=size)
+        self._ids = itertools.count(1)
+
+    def add(self, profile):
+        with self._lock:
+            profile['id'] = next(self._ids)
+            self._profiles.append(profile)
+        return profile['id']
+
+    def list(self):
+        with self._lock:
+            return list(reversed(self._profiles))
+
+    def get(self, profile_id):
+        with self._lock:
+            return next((profile for profile in self._profiles if profile['id'] == profile_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+
+class SQLLog:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({'sql': sql, 'duration_ms': round((perf_counter() - start) * 1000, 3),
+                                 'many': many})
+
+
+store = ProfileStore(getattr(settings, 'PROFILING_BUFFER_SIZE', 50))
+
+
+class ProfilingMiddleware:
+    """
+    Profile the requests selected by header or sampling. Requests that are not
+    selected only pay for a header lookup and, when sampling is enabled, one
+    random number.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        self.token_max_age = getattr(settings, 'PROFILING_TOKEN_MAX_AGE', 3600)
+        self.stats_limit = getattr(settings, 'PROFILING_STATS_LIMIT', 40)
+
+    def should_profile(self, request):
+        token = request.META.get('HTTP_X_PROFILE')
+        if token is not None:
+            return is_valid_token(token, self.token_max_age)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        sql_log = SQLLog()
+        profiler = cProfile.Profile()
+        started_at = timezone.now()
+        start = perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(sql_log))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = perf_counter() - start
+
+        stats_output = io.StringIO()
+        pstats.Stats(profiler, stream=stats_output).sort_stats('cumulative').print_stats(self.stats_limit)
+        profile_id = store.add({
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'started_at': started_at.isoformat(),
+            'duration_ms': round(duration * 1000, 3),
+            'query_count': len(sql_log.queries),
+            'queries': sql_log.queries,
+            'stats': stats_output.getvalue(),
+        })
+        response['X-Profile-Id'] = str(profile_id)
+        return response
@@ -0,0 +1,161 @@
+"""
+Periodic jobs.
+
+Apps register jobs from ``ready()`` with ``register(name, interval, func)``;
+``func()`` does one run and returns the number of rows it changed.
+``manage.py run_scheduler`` wakes up every ``SCHEDULER_TICK_SECONDS`` and
+runs the jobs whose interval has passed since their last run.
+
+Several schedulers can run at once (one per host, say); only the holder of
+the ``SchedulerLease`` row runs jobs. The lease is taken and renewed with
+conditional UPDATEs, so the database decides the race. A leader that dies
+stops renewing and another scheduler takes over when the lease expires, which
+is why the lease has to outlast the slowest job: jobs that work off a backlog
+take a bounded amount per run and leave the rest to the next one.
+
+Every run is recorded as a ``JobRun`` with its duration, row count and error.
+The latest run of each job is exported on ``/metrics``.
+"""
+import logging
+import os
+import socket
+import threading
+import traceback
+import uuid
+from datetime import timedelta
+from time import perf_counter
+
+from django.conf import settings
+from django.db import transaction, IntegrityError, close_old_connections
+from django.db.models import Q, Max
+from django.utils import timezone
+
+from .metrics import escape_label
+from .models import SchedulerLease, JobRun
+
+logger = logging.getLogger(__name__)
+
+LEASE = 'scheduler'
+
+# name -> Job
+jobs = {}
+
+
+class Job:
+    __slots__ = ('name', 'interval', 'func')
+
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+
+
+def register(name, interval, func):
+    """Run ``func()`` every ``interval`` (a timedelta)."""
+    jobs[name] = Job(name, interval, func)
+
+
+def default_holder():
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+class Scheduler:
+    def __init__(self, holder=None, lease_seconds=None, tick_seconds=None):
+        self.holder = holder or default_holder()
+        self.lease_seconds = lease_seconds or settings.SCHEDULER_LEASE_SECONDS
+        self.tick_seconds = tick_seconds or settings.SCHEDULER_TICK_SECONDS
+
+    def acquire(self):
+        """Take or renew the lease. Returns whether this scheduler is the leader."""
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=self.lease_seconds)
+        if SchedulerLease.objects.filter(Q(holder=self.holder) | Q(expires_at__lt=now), name=LEASE) \
+                .update(holder=self.holder, expires_at=expires_at):
+            return True
+        try:
+            with transaction.atomic():
+                SchedulerLease.objects.create(name=LEASE, holder=self.holder, expires_at=expires_at)
+        except IntegrityError:
+            return False
+        return True
+
+    def release(self):
+        SchedulerLease.objects.filter(name=LEASE, holder=self.holder).delete()
+
+    def due_jobs(self, now=None):
+        now = now or timezone.now()
+        last_runs = dict(JobRun.objects.filter(job__in=jobs).values('job').annotate(last=Max('started_at'))
+                         .values_list('job', 'last'))
+        return [job for name, job in jobs.items() if name not in last_runs or last_runs[name] + job.interval <= now]
+
+    def run_job(self, job):
+        run = JobRun(job=job.name, holder=self.holder, started_at=timezone.now(), succeeded=False)
+        start = perf_counter()
+        try:
+            run.rows = job.func()
+            run.succeeded = True
+        except Exception:
+            logger.exception('Scheduled job %s failed', job.name)
+            run.error = traceback.format_exc()
+        run.duration = perf_counter() - start
+        run.save()
+        return run
+
+    def tick(self):
+        """Run the due jobs if this scheduler holds the lease. Returns the ``JobRun``s."""
+        runs = []
+        if not self.acquire():
+            return runs
+        for job in self.due_jobs():
+            # Renewed before every job, so a leader that lost the lease stops here.
+            if not self.acquire():
+                break
+            runs.append(self.run_job(job))
+        return runs
+
+    def run(self, stop=None):
+        """Tick until ``stop`` (a ``threading.Event``) is set."""
+        stop = stop or threading.Event()
+        try:
+            while not stop.is_set():
+                # Long-lived process: drop connections the database has timed out.
+                close_old_connections()
+                for run in self.tick():
+                    yield run
+                stop.wait(self.tick_seconds)
+        finally:
+            self.release()
+
+
+def latest_runs():
+    """The last run of every registered job, in one query."""
+    last_ids = JobRun.objects.filter(job__in=jobs).values('job').annotate(last=Max('id')).values('last')
+    return {run.job: run for run in JobRun.objects.filter(id__in=last_ids)}
+
+
+def render_metrics():
+    """The latest runs in the Prometheus text format, for ``/metrics``."""
+    runs = latest_runs()
+    sections = {
+        'scheduler_job_last_run_timestamp_seconds': ('gauge', 'When the job last started.', 'started_at'),
+        'scheduler_job_last_duration_seconds': ('gauge', 'How long the last run took.', 'duration'),
+        'scheduler_job_last_rows': ('gauge', 'Rows changed by the last run.', 'rows'),
+        'scheduler_job_last_success': ('gauge', '1 if the last run succeeded.', 'succeeded'),
+    }
+    lines = []
+    for name, (kind, help_text, field) in sections.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for job, run in sorted(runs.items()):
+            value = getattr(run, field)
+            if field == 'started_at':
+                value = value.timestamp()
+            lines.append(f'{name}{{job="{escape_label(job)}"}} {float(value or 0)}')
+    return '\n'.join(lines) + '\n'
+
+
+def prune_runs(retention_days=None):
+    """Delete runs past ``SCHEDULER_RUN_RETENTION_DAYS``. Returns the number deleted."""
+    retention_days = settings.SCHEDULER_RUN_RETENTION_DAYS if retention_days is None else retention_days
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    return JobRun.objects.filter(started_at__lt=cutoff).delete()[0]
@@ -0,0 +1,84 @@
+"""
+The OpenAPI schema, generated once per process instead of per request.
+
+The schema only changes with the code, so it is read from
+``settings.OPENAPI_SCHEMA_FILE`` (written at deploy time by
+``manage.py export_openapi_schema``) or generated on first use, and kept for the
+life of the process. Responses carry an ETag derived from the document, so
+clients that poll it get 304s.
+
+drf_yasg is slow to import, so this module is only imported by the views on
+first use and not at URLconf load.
+"""
+import hashlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.renderers import OpenAPIRenderer, SwaggerJSONRenderer
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+
+INFO = openapi.Info(
+    title="AI",
+    default_version='v1',
+    description="AI generative for events",
+    terms_of_service="https://www.yourapp.com/terms/",
+    contact=openapi.Contact(email="sadeghesfahani.sina@gmail.com"),
+    license=openapi.License(name="MIT License"),
+)
+
+BaseSchemaView = get_schema_view(
+    INFO,
+    public=True,
+    permission_classes=([permissions.AllowAny]),
+)
+
+
+def generate_schema():
+    """Build the schema from the URL configuration and return it as JSON bytes."""
+    generator = BaseSchemaView.generator_class(INFO)
+    return OpenAPICodecJson(validators=[]).encode(generator.get_schema(request=None, public=True))
+
+
+@lru_cache(maxsize=None)
+def schema_document():
+    """Return ``(body, etag)`` for the JSON schema."""
+    path = getattr(settings, 'OPENAPI_SCHEMA_FILE', None)
+    if path:
+        with open(path, 'rb') as handle:
+            body = handle.read()
+    else:
+        body = generate_schema()
+    return body, hashlib.sha256(body).hexdigest()[:32]
+
+
+def schema_etag(request, *args, **kwargs):
+    return schema_document()[1]
+
+
+@condition(etag_func=schema_etag)
+def serve_schema(request):
+    response = HttpResponse(schema_document()[0], content_type='application/json')
+    # Caches may keep the document but must revalidate it, which costs a 304.
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+class SchemaView(BaseSchemaView):
+    """
+    drf_yasg's schema view with the JSON spec served from ``schema_document``.
+    The Swagger UI page and the YAML spec keep drf_yasg's own rendering.
+    """
+
+    def get(self, request, version='', format=None):
+        if isinstance(request.accepted_renderer, (OpenAPIRenderer, SwaggerJSONRenderer)):
+            return serve_schema(request._request)
+        return super().get(request, version, format)
+
+
+swagger_ui_view = SchemaView.with_ui('swagger', cache_timeout=0)
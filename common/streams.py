@@ -0,0 +1,271 @@
+"""
+Server-sent events for application and report status changes.
+
+``broker`` fans events out to the SSE connections held by this process. Every
+connection owns a small bounded queue; when a slow client lets it fill up, the
+oldest event is dropped, so no client can grow the process memory. Events come
+from the outbox after their transaction commits, so rolled-back changes are
+never pushed.
+
+Under ASGI the stream is served by ``EventStreamApplication``, a bare ASGI app
+mounted in ``talent_buzz.asgi`` next to Django: an idle connection then costs a
+queue and a task. A Django request would keep a request context, and the
+worker thread Django creates for it, alive for as long as the client stays
+connected.
+
+WSGI servers such as runserver fall back to ``common.views.event_stream``,
+which drives the stream on a private event loop with ``sync_stream``. That
+holds a worker thread per client, so the connection is closed after
+``SSE_SYNC_STREAM_SECONDS`` and EventSource reconnects; use ASGI in production.
+
+EventSource cannot set headers, so browsers connect with ``?token=``, a
+signed stream token from ``common.views.StreamTokenView`` that is valid for
+``SSE_TOKEN_MAX_AGE`` seconds and is not an access token, so URLs that end up
+in access logs grant nothing else. ``EventStreamApplication`` answers with the
+CORS headers of the ``CORS_*`` settings itself, since no middleware runs.
+
+The broker is per process: a client hears about the changes committed by the
+process it is connected to. Clients should treat events as hints and use the
+list endpoints (or the outbox feed) as the source of truth after reconnecting.
+"""
+import asyncio
+import json
+import re
+import threading
+from collections import defaultdict, deque
+from contextlib import suppress
+from time import monotonic
+from urllib.parse import parse_qs
+
+from corsheaders.conf import conf as cors
+from django.conf import settings
+from django.core import signing
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from user.models import Freelancer
+from .outbox import add_listener, DELETED
+
+SALT = 'common.streams'
+
+# outbox model label -> event type
+STATUS_MODELS = {
+    'project.gigapplication': 'gig_application',
+    'project.projectapplication': 'project_application',
+    'project.gigreport': 'gig_report',
+}
+
+
+class Subscription:
+    """
+    One connection's buffer: a bounded deque that drops the oldest event when
+    full, and a future the stream waits on while the deque is empty.
+    """
+    __slots__ = ('user_id', 'events', 'loop', 'waiter', 'dropped')
+
+    def __init__(self, user_id, maxsize):
+        self.user_id = user_id
+        self.events = deque(maxlen=maxsize)
+        self.loop = asyncio.get_running_loop()
+        self.waiter = None
+        self.dropped = 0
+
+    def offer(self, event):
+        if len(self.events) == self.events.maxlen:
+            self.dropped += 1
+        self.events.append(event)
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def get(self, timeout):
+        """Next event, or None after ``timeout`` seconds without one."""
+        if not self.events:
+            self.waiter = self.loop.create_future()
+            try:
+                await asyncio.wait_for(self.waiter, timeout)
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                self.waiter = None
+        return self.events.popleft()
+
+
+class Broker:
+    """
+    Maps user ids to their open subscriptions. ``publish`` may be called from
+    any thread; delivery happens on the loop that owns each subscription.
+    """
+
+    def __init__(self):
+        self.subscriptions = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def subscribe(self, user_id, maxsize=None):
+        subscription = Subscription(user_id, maxsize or getattr(settings, 'SSE_QUEUE_SIZE', 100))
+        with self.lock:
+            self.subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.subscriptions[subscription.user_id]
+
+    def user_ids(self):
+        with self.lock:
+            return set(self.subscriptions)
+
+    def __len__(self):
+        with self.lock:
+            return sum(len(subscriptions) for subscriptions in self.subscriptions.values())
+
+    def publish(self, user_id, event):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.offer, event)
+
+
+broker = Broker()
+
+
+def publish_status_changes(events):
+    """Outbox listener: push status events to the freelancers they concern, if connected."""
+    events = [event for event in events if event.model in STATUS_MODELS and event.action != DELETED]
+    listening = broker.user_ids() if events else ()
+    if not listening:
+        return
+    users = dict(Freelancer.objects.filter(pk__in={event.payload['freelancer_id'] for event in events},
+                                           user_id__in=listening).values_list('pk', 'user_id'))
+    for event in events:
+        user_id = users.get(event.payload['freelancer_id'])
+        if user_id is not None:
+            broker.publish(user_id, {'id': event.id, 'type': STATUS_MODELS[event.model],
+                                     'object_id': event.object_id, 'status': event.payload['status']})
+
+
+add_listener(publish_status_changes)
+
+
+def make_stream_token(user_id):
+    """Signed value for the stream's ``token`` parameter, valid for ``SSE_TOKEN_MAX_AGE`` seconds."""
+    return signing.dumps(user_id, salt=SALT)
+
+
+def authenticate(header, query_token):
+    """
+    User id from a JWT access token in the Authorization header (bytes) or a
+    stream token in the ``token`` query parameter. Tokens are only verified,
+    no user row is loaded.
+    """
+    if not header:
+        try:
+            return signing.loads(query_token, salt=SALT, max_age=settings.SSE_TOKEN_MAX_AGE) if query_token else None
+        except signing.BadSignature:
+            return None
+    authentication = JWTAuthentication()
+    raw_token = authentication.get_raw_token(header)
+    if not raw_token:
+        return None
+    try:
+        return authentication.get_validated_token(raw_token)[api_settings.USER_ID_CLAIM]
+    except (InvalidToken, TokenError, KeyError):
+        return None
+
+
+def authenticate_request(request):
+    return authenticate(JWTAuthentication().get_header(request), request.GET.get('token'))
+
+
+def format_event(event):
+    return f"id: {event['id']}\nevent: status\ndata: {json.dumps(event)}\n\n"
+
+
+async def stream(user_id, heartbeat=None):
+    heartbeat = heartbeat or getattr(settings, 'SSE_HEARTBEAT_SECONDS', 15)
+    subscription = broker.subscribe(user_id)
+    try:
+        yield f'retry: {heartbeat * 1000}\n\n'
+        while True:
+            event = await subscription.get(heartbeat)
+            yield ': keep-alive\n\n' if event is None else format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def sync_stream(user_id, heartbeat=None, duration=None):
+    """
+    ``stream`` for WSGI servers, driven one chunk at a time on a private event
+    loop. Ends after ``duration`` seconds (``SSE_SYNC_STREAM_SECONDS``), plus at
+    most one heartbeat, to give the worker thread back.
+    """
+    duration = duration or settings.SSE_SYNC_STREAM_SECONDS
+    loop = asyncio.new_event_loop()
+    events = stream(user_id, heartbeat)
+    deadline = monotonic() + duration
+    try:
+        while monotonic() < deadline:
+            yield loop.run_until_complete(anext(events))
+    finally:
+        loop.run_until_complete(events.aclose())
+        loop.close()
+
+
+def origin_allowed(origin):
+    return (cors.CORS_ALLOW_ALL_ORIGINS or origin in cors.CORS_ALLOWED_ORIGINS
+            or any(re.match(pattern, origin) for pattern in cors.CORS_ALLOWED_ORIGIN_REGEXES))
+
+
+def cors_headers(origin, preflight=False):
+    """The headers ``corsheaders.middleware.CorsMiddleware`` would add for ``origin`` (bytes)."""
+    if not origin or not origin_allowed(origin.decode('latin-1')):
+        return []
+    headers = [(b'access-control-allow-origin', origin), (b'vary', b'origin')]
+    if cors.CORS_ALLOW_CREDENTIALS:
+        headers.append((b'access-control-allow-credentials', b'true'))
+    if preflight:
+        headers += [(b'access-control-allow-headers', ', '.join(cors.CORS_ALLOW_HEADERS).encode()),
+                    (b'access-control-allow-methods', b'GET, OPTIONS'),
+                    (b'access-control-max-age', str(cors.CORS_PREFLIGHT_MAX_AGE).encode())]
+    return headers
+
+
+class EventStreamApplication:
+    """Bare ASGI application serving ``stream`` for one path."""
+    headers = [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'),
+               (b'x-accel-buffering', b'no')]
+
+    async def __call__(self, scope, receive, send):
+        headers = dict(scope['headers'])
+        cors_response_headers = cors_headers(headers.get(b'origin'), preflight=scope['method'] == 'OPTIONS')
+        if scope['method'] == 'OPTIONS':
+            await send({'type': 'http.response.start', 'status': 200,
+                        'headers': cors_response_headers + [(b'content-length', b'0')]})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        query_token = parse_qs(scope.get('query_string', b'').decode()).get('token', [None])[0]
+        user_id = authenticate(headers.get(b'authorization'), query_token)
+        if user_id is None:
+            body = json.dumps({"error": "A valid access or stream token is required."}).encode()
+            await send({'type': 'http.response.start', 'status': 401,
+                        'headers': cors_response_headers + [(b'content-type', b'application/json')]})
+            await send({'type': 'http.response.body', 'body': body})
+            return
+        await send({'type': 'http.response.start', 'status': 200, 'headers': cors_response_headers + self.headers})
+        sender = asyncio.create_task(self.send_events(user_id, send))
+        try:
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+        finally:
+            sender.cancel()
+            with suppress(asyncio.CancelledError):
+                await sender
+
+    @staticmethod
+    async def send_events(user_id, send):
+        async for chunk in stream(user_id):
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
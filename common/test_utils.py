@@ -0,0 +1,70 @@
+"""Helpers shared by the apps' tests."""
+from datetime import date, timedelta
+
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from project.models import Project, Gig
+
+
+def viewset_queryset(viewset_class, user, action='list'):
+    """The queryset ``viewset_class`` serves ``user`` for ``action``, visibility rules included."""
+    request = APIRequestFactory().get('/')
+    force_authenticate(request, user)
+    view = viewset_class(action_map={'get': action}, kwargs={}, args=(), format_kwarg=None)
+    view.request = view.initialize_request(request)
+    return view.get_queryset()
+
+
+def full_table_scans(queryset):
+    """Return the lines of the query plan that scan the queryset's table without an index."""
+    table = queryset.model._meta.db_table
+    return [line for line in queryset.explain().splitlines()
+            if f'SCAN {table}' in line and 'USING' not in line]
+
+
+def assert_filters_use_indexes(test, filterset_class, queryset, values):
+    """
+    Run EXPLAIN for every filter of the filterset, alone and combined with every
+    ordering, and fail if the plan falls back to a full table scan.
+    """
+    orderings = [None] + [key for key, _ in filterset_class.base_filters['ordering'].field.choices if key]
+    for name in filterset_class.base_filters:
+        if name == 'ordering':
+            continue
+        for ordering in orderings:
+            data = {name: values[name]}
+            if ordering:
+                data['ordering'] = ordering
+            filterset = filterset_class(data, queryset=queryset)
+            test.assertTrue(filterset.is_valid(), filterset.errors)
+            with test.subTest(filter=name, ordering=ordering):
+                test.assertEqual(full_table_scans(filterset.qs), [])
+
+
+def make_project(user, **kwargs):
+    defaults = {
+        'title': 'Mobile banking app',
+        'description': 'Build a mobile banking application',
+        'text_requirements': 'Kotlin, Swift',
+        'hourly_rate': 50,
+        'category': 'software',
+        'status': 'open',
+        'associated_user': user,
+        'start_date': date.today(),
+        'end_date': date.today() + timedelta(days=90),
+    }
+    defaults.update(kwargs)
+    return Project.objects.create(**defaults)
+
+
+def make_gig(project, **kwargs):
+    defaults = {
+        'project': project,
+        'title': 'Backend integration',
+        'description': 'Integrate the payment provider',
+        'start': timezone.now(),
+        'end': timezone.now() + timedelta(days=7),
+    }
+    defaults.update(kwargs)
+    return Gig.objects.create(**defaults)
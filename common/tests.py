@@ -1,3 +1,674 @@
-from django.test import TestCase
+import asyncio
+import threading
+import time
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from common import profiling, streams, schema, importtime, batch as common_batch
+from common.benchmark import hold_streams, profile_loading
+from common.models import OutboxEvent
+from common.admin_utils import KeysetPaginator, EstimatedCountPaginator
+from common.metrics import registry, Histogram
+from common.outbox import prune_events
+from common.profiling import make_profile_token
+from common.test_utils import make_project, make_gig
+from project.models import Project, Gig, GigApplication
+from user.models import Freelancer
+
+User = get_user_model()
+
+
+class HistogramTests(TestCase):
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram((1, 5))
+        for value in (0, 1, 3, 10):
+            histogram.observe(value)
+        self.assertEqual(histogram.render('x', 'a="b"'), [
+            'x_bucket{a="b",le="1"} 2',
+            'x_bucket{a="b",le="5"} 3',
+            'x_bucket{a="b",le="+Inf"} 4',
+            'x_sum{a="b"} 14',
+            'x_count{a="b"} 4',
+        ])
+
+
+@override_settings(METRICS_TOKEN='scrape')
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='user', password='secret'))
+
+    def test_records_route_queries_and_size(self):
+        self.client.get('/project/projects/')
+        output = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape').content.decode()
+        labels = 'method="GET",route="project/projects/$"'
+        self.assertIn(f'http_requests_total{{{labels},status="200"}} 1', output)
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 1', output)
+        self.assertIn(f'http_request_db_queries_count{{{labels}}} 1', output)
+        self.assertIn(f'http_response_size_bytes_bucket{{{labels},le="256"}} 1', output)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', output)
+
+    def test_only_the_scraper_and_staff_read_metrics(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer guess').status_code, 403)
+        with override_settings(METRICS_TOKEN=None):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer None').status_code, 403)
+        client = APIClient()
+        client.force_login(User.objects.create_user(username='staff', is_staff=True))
+        self.assertEqual(client.get('/metrics').status_code, 200)
+
+    @override_settings(METRICS_QUERY_BUDGET=0)
+    def test_logs_requests_over_budget(self):
+        with self.assertLogs('common.middleware', 'WARNING') as logs:
+            self.client.get('/project/projects/')
+        self.assertIn('Request over budget: GET /project/projects/', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+
+class ScaleDataAndBenchmarkTests(TestCase):
+    @override_settings(METRICS_QUERY_BUDGET=10 ** 6, METRICS_LATENCY_BUDGET_MS=10 ** 6)
+    def test_generate_and_benchmark(self):
+        from django.core.management import call_command
+        from common.benchmark import run_endpoint_benchmarks
+        from project.models import Project, Gig
+        from user.models import Freelancer
+
+        call_command('generate_scale_data', users=40, chunk_size=7, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 40)
+        self.assertEqual(Freelancer.objects.count(), 36)
+        self.assertTrue(Project.objects.exists())
+        self.assertTrue(Gig.objects.exists())
+
+        user = Freelancer.objects.first().user
+        results = run_endpoint_benchmarks(user, runs=2, warmup=0)
+        self.assertIn('project-list', results)
+        self.assertIn('gig-detail', results)
+        self.assertEqual(results['project-list']['runs'], 2)
+        self.assertGreaterEqual(results['project-list']['queries'], 1)
+
+        profiles = profile_loading(limit=20, runs=1)
+        self.assertEqual(profiles['full']['rows'], profiles['summary']['rows'])
+        self.assertGreater(profiles['json_bytes'], 0)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        profiling.store.clear()
+        self.staff = User.objects.create_user(username='staff', password='secret', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def test_signed_header_profiles_request(self):
+        response = self.client.get('/project/projects/', HTTP_X_PROFILE=make_profile_token())
+        profile_id = int(response['X-Profile-Id'])
+
+        listing = self.client.get('/common/profiles/').data
+        self.assertEqual([profile['id'] for profile in listing], [profile_id])
+        profile = self.client.get(f'/common/profiles/{profile_id}/').data
+        self.assertEqual(profile['path'], '/project/projects/')
+        # The request transaction is a savepoint inside the test case's transaction.
+        statements = [query['sql'] for query in profile['queries'] if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(len(statements), 1)
+        self.assertIn('SELECT', statements[0])
+        self.assertIn('cumulative', profile['stats'])
+
+    def test_unsigned_header_is_ignored(self):
+        response = self.client.get('/project/projects/', HTTP_X_PROFILE='profile')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(profiling.store.list(), [])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_sampling(self):
+        self.assertIn('X-Profile-Id', self.client.get('/project/projects/'))
+
+    def test_ring_buffer_is_bounded(self):
+        store = profiling.ProfileStore(2)
+        for index in range(3):
+            store.add({'index': index})
+        self.assertEqual([profile['index'] for profile in store.list()], [2, 1])
+        self.assertIsNone(store.get(1))
+
+    def test_staff_only(self):
+        self.client.force_authenticate(User.objects.create_user(username='user', password='secret'))
+        self.assertEqual(self.client.get('/common/profiles/').status_code, 403)
+
+
+class AdminPaginatorTests(TestCase):
+    def setUp(self):
+        User.objects.bulk_create([User(username=f'user{index}') for index in range(25)])
+
+    @override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=10)
+    def test_keyset_pages_match_offset_pages(self):
+        queryset = User.objects.order_by('-pk')
+        keyset = KeysetPaginator(queryset, 10)
+        offset = Paginator(queryset, 10)
+        self.assertEqual(keyset.count, 25)
+        self.assertTrue(keyset.uses_keyset())
+        for number in (1, 2, 3):
+            self.assertEqual(list(keyset.page(number).object_list), list(offset.page(number).object_list))
+
+    def test_keyset_pages_with_gaps_in_the_keys(self):
+        User.objects.filter(username__in=['user4', 'user11', 'user12']).delete()
+        queryset = User.objects.order_by('-pk')
+        keyset = KeysetPaginator(queryset, 3)
+        offset = Paginator(queryset, 3)
+        self.assertTrue(keyset.uses_keyset())
+        for number in offset.page_range:
+            self.assertEqual(list(keyset.page(number).object_list), list(offset.page(number).object_list))
+
+    @override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=10)
+    def test_filtered_querysets_use_exact_counts_and_offsets(self):
+        queryset = User.objects.filter(username__startswith='user1').order_by('-pk')
+        paginator = KeysetPaginator(queryset, 5)
+        self.assertFalse(paginator.uses_keyset())
+        self.assertEqual(paginator.count, 11)
+
+    def test_small_tables_use_exact_counts(self):
+        User.objects.filter(username='user24').delete()
+        self.assertEqual(EstimatedCountPaginator(User.objects.order_by('-pk'), 10).count, 24)
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='secret')
+
+    def events(self, model):
+        return list(OutboxEvent.objects.filter(model=model).order_by('id').values_list('action', 'payload'))
+
+    def test_saves_and_deletes_append_events(self):
+        project = make_project(self.owner, status='open')
+        project.status = 'closed'
+        project.save()
+        project_id = project.pk
+        project.delete()
+        self.assertEqual([action for action, _ in self.events('project.project')], ['created', 'updated', 'deleted'])
+        self.assertEqual(self.events('project.project')[1][1]['status'], 'closed')
+        self.assertEqual(OutboxEvent.objects.filter(model='project.project').last().object_id, project_id)
+
+    def test_rolled_back_changes_leave_no_events(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            make_project(self.owner)
+            raise RuntimeError('rollback')
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_queryset_updates_append_events(self):
+        gig = make_gig(make_project(self.owner))
+        freelancer = Freelancer.objects.create(user=User.objects.create_user(username='free'), hourly_rate=10)
+        application = GigApplication.objects.create(freelancer=freelancer, gig=gig, status=0)
+        GigApplication.objects.accept(application)
+        GigApplication.objects.reject([application.pk])
+        statuses = [payload['status'] for _, payload in self.events('project.gigapplication')]
+        self.assertEqual(statuses, [0, 1, 2])
+        # The gig's slot counter moves with them.
+        self.assertEqual([payload['accepted_count'] for _, payload in self.events('project.gig')], [0, 1, 0])
+
+        GigApplication.objects.filter(pk=application.pk).update(status=1)
+        Gig.objects.recount_accepted()
+        self.assertEqual(self.events('project.gig')[-1], ('updated', {
+            'project_id': gig.project_id, 'user_id': None, 'status': '', 'accepted_count': 1}))
+        Gig.objects.recount_accepted()
+        self.assertEqual(len(self.events('project.gig')), 4)
+
+    def test_feed_pages_by_cursor(self):
+        for index in range(5):
+            make_project(self.owner, title=f'project {index}')
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser(username='admin', password='secret'))
+        first = client.get('/common/events/', {'limit': 3, 'model': 'project.project'}).json()
+        second = client.get('/common/events/', {'after': first['cursor'], 'model': 'project.project'}).json()
+        self.assertEqual(len(first['events']) + len(second['events']), 5)
+        self.assertEqual(client.get('/common/events/', {'after': second['cursor']}).json()['events'], [])
+        self.assertEqual(client.get('/common/events/', {'after': 'x'}).status_code, 400)
+
+    def test_prune(self):
+        for index in range(6):
+            make_project(self.owner, title=f'project {index}')
+        self.assertEqual(prune_events(retention_days=30, max_events=4, chunk_size=1), 2)
+        newest = OutboxEvent.objects.latest('id')
+        OutboxEvent.objects.filter(id=newest.id).update(created_at=timezone.now() - timedelta(days=31))
+        # Everything up to the newest expired event goes.
+        self.assertEqual(prune_events(retention_days=30, max_events=100), 4)
+
+
+class EventStreamTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username='owner', password='secret')
+        self.freelancer = Freelancer.objects.create(user=User.objects.create_user(username='free'), hourly_rate=10)
+        self.application = GigApplication.objects.create(freelancer=self.freelancer,
+                                                         gig=make_gig(make_project(owner)), status=0)
+
+    def accept(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            GigApplication.objects.accept(self.application)
+
+    async def test_status_change_reaches_the_freelancer(self):
+        events = streams.stream(self.freelancer.user_id, heartbeat=5)
+        self.assertTrue((await anext(events)).startswith('retry:'))
+        await sync_to_async(self.accept)()
+        chunk = await asyncio.wait_for(anext(events), 5)
+        self.assertIn('event: status', chunk)
+        self.assertIn('"type": "gig_application"', chunk)
+        self.assertIn('"status": 1', chunk)
+        await events.aclose()
+        self.assertEqual(len(streams.broker), 0)
+
+    async def test_slow_clients_drop_the_oldest_events(self):
+        subscription = streams.broker.subscribe(user_id=0, maxsize=2)
+        for index in range(3):
+            subscription.offer({'id': index})
+        self.assertEqual([(await subscription.get(1))['id'] for _ in range(2)], [1, 2])
+        self.assertEqual(subscription.dropped, 1)
+        self.assertIsNone(await subscription.get(0.01))
+        streams.broker.unsubscribe(subscription)
+
+    def test_requires_a_token(self):
+        self.assertEqual(self.client.get('/common/stream/').status_code, 401)
+        self.assertEqual(self.client.get('/common/stream/', {'token': 'invalid'}).status_code, 401)
+        token = AccessToken.for_user(self.freelancer.user)
+        response = self.client.get('/common/stream/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+    def test_wsgi_fallback_streams_events_and_ends(self):
+        token = streams.make_stream_token(self.freelancer.user_id)
+        response = self.client.get('/common/stream/', {'token': token})
+        chunks = iter(response.streaming_content)
+        self.assertTrue(next(chunks).startswith(b'retry:'))
+        self.accept()
+        chunk = next(chunks)
+        self.assertIn(b'event: status', chunk)
+        self.assertIn(b'"status": 1', chunk)
+        response.close()
+        self.assertEqual(len(streams.broker), 0)
+
+        with override_settings(SSE_HEARTBEAT_SECONDS=0.05, SSE_SYNC_STREAM_SECONDS=0.2):
+            response = self.client.get('/common/stream/', {'token': token})
+            chunks = list(response.streaming_content)
+        self.assertTrue(chunks[0].startswith(b'retry:'))
+        self.assertIn(b': keep-alive\n\n', chunks)
+        self.assertEqual(len(streams.broker), 0)
+
+    def test_query_token_is_a_short_lived_stream_token(self):
+        access = AccessToken.for_user(self.freelancer.user)
+        self.assertEqual(self.client.get('/common/stream/', {'token': str(access)}).status_code, 401)
+        client = APIClient()
+        client.force_authenticate(self.freelancer.user)
+        token = client.post('/common/stream/token/').data['token']
+        self.assertEqual(self.client.get('/common/stream/', {'token': token})['Content-Type'], 'text/event-stream')
+        with override_settings(SSE_TOKEN_MAX_AGE=-1):
+            self.assertEqual(self.client.get('/common/stream/', {'token': token}).status_code, 401)
+
+    def test_asgi_stream_sends_cors_headers(self):
+        async def request(method, origin):
+            messages = []
+
+            async def receive():
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                messages.append(message)
+
+            scope = {'type': 'http', 'method': method, 'path': '/common/stream/', 'query_string': b'token=x',
+                     'headers': [(b'origin', origin)]}
+            await streams.EventStreamApplication()(scope, receive, send)
+            return messages[0]['status'], dict(messages[0]['headers'])
+
+        status, headers = asyncio.run(request('GET', b'http://localhost:3000'))
+        self.assertEqual((status, headers[b'access-control-allow-origin']), (401, b'http://localhost:3000'))
+        status, headers = asyncio.run(request('OPTIONS', b'http://localhost:3000'))
+        self.assertEqual(status, 200)
+        self.assertIn(b'authorization', headers[b'access-control-allow-headers'])
+        status, headers = asyncio.run(request('GET', b'http://evil.example'))
+        self.assertNotIn(b'access-control-allow-origin', headers)
+
+
+class EventStreamLoadTests(SimpleTestCase):
+    def test_idle_connections_are_cheap(self):
+        result = asyncio.run(hold_streams(streams.make_stream_token(1), connections=2000))
+        self.assertEqual((result['connections'], result['statuses'], result['remaining']), (2000, [200], 0))
+        self.assertLess(result['bytes_per_connection'], 16 * 1024)
+
+
+def project_payload(user, **kwargs):
+    payload = {'title': 'Batch project', 'description': 'Created in a batch', 'text_requirements': 'Python',
+               'hourly_rate': 40, 'category': 'software', 'status': 'open', 'associated_user': user.pk,
+               'start_date': '2024-01-01', 'end_date': '2024-02-01'}
+    payload.update(kwargs)
+    return payload
+
+
+@override_settings(BATCH_MAX_WORKERS=1)
+class BatchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='secret')
+        make_project(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def batch(self, requests, **extra):
+        return self.client.post('/common/batch/', dict(requests=requests, **extra), format='json')
+
+    def test_each_sub_request_gets_its_own_status(self):
+        with mock.patch.object(JWTAuthentication, 'authenticate', autospec=True,
+                               side_effect=JWTAuthentication.authenticate) as authenticate:
+            response = self.batch([{'id': 'me', 'path': '/auth/user-id/'},
+                                   {'path': '/project/projects/?status=open'},
+                                   {'path': '/project/missing/'}])
+        self.assertEqual(authenticate.call_count, 1)
+        responses = response.data['responses']
+        self.assertEqual([(item['id'], item['status']) for item in responses], [('me', 200), (1, 200), (2, 404)])
+        self.assertEqual(responses[0]['body'], {'user_id': self.user.pk})
+        self.assertEqual(len(responses[1]['body']), 1)
+
+    def test_atomic_batch_rolls_back_on_failure(self):
+        response = self.batch([{'method': 'POST', 'path': '/project/projects/', 'body': project_payload(self.user)},
+                               {'method': 'POST', 'path': '/project/projects/', 'body': {'title': 'incomplete'}},
+                               {'path': '/auth/user-id/'}], atomic=True)
+        self.assertEqual([item['status'] for item in response.data['responses']], [201, 400, 424])
+        self.assertEqual(Project.objects.count(), 1)
+
+    def test_non_atomic_batch_keeps_successful_writes(self):
+        response = self.batch([{'method': 'POST', 'path': '/project/projects/', 'body': project_payload(self.user)},
+                               {'method': 'POST', 'path': '/project/projects/', 'body': {'title': 'incomplete'}}])
+        self.assertEqual([item['status'] for item in response.data['responses']], [201, 400])
+        self.assertEqual(Project.objects.count(), 2)
+
+    def test_malformed_batches(self):
+        self.assertEqual(self.batch([]).status_code, 400)
+        self.assertEqual(self.batch([{'path': 'no-slash'}]).status_code, 400)
+        self.assertEqual(self.batch([{'path': '/auth/user-id/', 'method': 'TRACE'}]).status_code, 400)
+        with override_settings(BATCH_MAX_REQUESTS=1):
+            self.assertEqual(self.batch([{'path': '/auth/user-id/'}] * 2).status_code, 400)
+        nested = self.batch([{'method': 'POST', 'path': '/common/batch/', 'body': {'requests': []}}])
+        self.assertEqual(nested.data['responses'][0]['status'], 400)
+
+    def test_non_api_routes_and_failing_views_only_fail_their_entry(self):
+        from project.views import ProjectViewSet
+        with mock.patch.object(ProjectViewSet, 'list', side_effect=RuntimeError('boom')), \
+                self.assertLogs('common.batch', 'ERROR'):
+            response = self.batch([{'path': '/common/stream/'}, {'path': '/project/projects/'},
+                                   {'path': '/auth/user-id/'}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['status'] for item in response.data['responses']], [400, 500, 200])
+
+
+class BatchConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Threads need a database they can share, not an in-memory SQLite one.')
+        self.user = User.objects.create_user(username='owner', password='secret')
+        make_project(self.user)
+
+    def test_reads_run_concurrently(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        threads = set()
+        dispatch = common_batch.dispatch
+
+        def record_thread(request, sub_request):
+            threads.add(threading.get_ident())
+            time.sleep(0.05)
+            return dispatch(request, sub_request)
+
+        with mock.patch.object(common_batch, 'dispatch', side_effect=record_thread):
+            response = client.post('/common/batch/', {'requests': [{'path': '/project/projects/'}] * 4},
+                                   format='json')
+        self.assertEqual([item['status'] for item in response.data['responses']], [200] * 4)
+        self.assertEqual({len(item['body']) for item in response.data['responses']}, {1})
+        self.assertGreater(len(threads), 1)
+
+
+class OpenAPISchemaTests(TestCase):
+    def setUp(self):
+        schema.schema_document.cache_clear()
+        self.addCleanup(schema.schema_document.cache_clear)
+
+    def test_schema_is_generated_once_and_served_with_an_etag(self):
+        with mock.patch('common.schema.generate_schema', wraps=schema.generate_schema) as generate:
+            response = self.client.get('/swagger.json')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('/project/projects/', response.json()['paths'])
+            etag = response['ETag']
+            self.assertEqual(self.client.get('/swagger/?format=openapi').content, response.content)
+            self.assertEqual(self.client.get('/swagger.json', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(self.client.get('/swagger/').status_code, 200)
+
+    def test_exported_file_is_served(self):
+        import os
+        import tempfile
+        from django.core.management import call_command
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'openapi.json')
+            call_command('export_openapi_schema', output=path, stdout=StringIO())
+            with open(path, 'ab') as handle:
+                handle.write(b'\n')
+            with override_settings(OPENAPI_SCHEMA_FILE=path), \
+                    mock.patch('common.schema.generate_schema') as generate:
+                response = self.client.get('/swagger.json')
+                with open(path, 'rb') as handle:
+                    self.assertEqual(response.content, handle.read())
+            generate.assert_not_called()
+
+
+class StartupImportTests(SimpleTestCase):
+    def test_parse_importtime(self):
+        report = ('import time: self [us] | cumulative | imported package\n'
+                  'import time:       120 |        120 |   drf_yasg.utils\n'
+                  'import time:      1214 |       1334 | drf_yasg\n')
+        self.assertEqual(list(importtime.parse_importtime(report)),
+                         [('drf_yasg.utils', 120, 120, 1), ('drf_yasg', 1214, 1334, 0)])
+
+    def test_startup_stays_within_budget(self):
+        from django.conf import settings
+        report = importtime.measure_startup()
+        self.assertEqual(report['eager_deferred'], [])
+        self.assertLessEqual(report['total_ms'], settings.STARTUP_IMPORT_BUDGET_MS, report['packages'])
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        from common.models import Document
+        from finance.models import Invoice
+        from project.models import GigReport
+        from user.models import Company
+        self.owner = User.objects.create_user(username='owner', password='secret')
+        company = Company.objects.create(owner=self.owner, company_name='Acme')
+        long_ago = date.today() - timedelta(days=800)
+        self.closed_gig = make_gig(make_project(self.owner, status='closed', start_date=long_ago,
+                                                end_date=long_ago + timedelta(days=30)), user=company)
+        self.open_gig = make_gig(make_project(self.owner), user=company)
+        self.freelancer = Freelancer.objects.create(user=User.objects.create_user(username='free'), hourly_rate=10)
+
+        self.document = Document.objects.create(user=self.freelancer.user, document='documents/report.pdf')
+        self.reports = []
+        for gig in (self.closed_gig, self.closed_gig, self.open_gig):
+            report = GigReport.objects.create(freelancer=self.freelancer, gig=gig, start_time=timezone.now(),
+                                              end_time=timezone.now() + timedelta(hours=1), status='approved',
+                                              review={'rating': 4})
+            report.document.add(self.document)
+            self.reports.append(report)
+        self.applications = [GigApplication.objects.create(freelancer=self.freelancer, gig=gig, status=1)
+                             for gig in (self.closed_gig, self.open_gig)]
+        Invoice.objects.update(status='paid', paid_at=timezone.now())
+        self.old_invoice = Invoice.objects.filter(gig=self.closed_gig).first()
+        Invoice.objects.filter(pk=self.old_invoice.pk).update(paid_at=timezone.now() - timedelta(days=400))
+
+    def test_rows_move_in_batches_with_their_links(self):
+        from finance.models import Invoice, ArchivedInvoice
+        from project.models import GigReport, ArchivedGigReport, ArchivedGigApplication, FreelancerRating
+        from project.ratings import rebuild_ratings
+        from common.archive import archive_rows
+        ratings = list(FreelancerRating.objects.values_list('kind', 'key', 'count', 'total'))
+        events = OutboxEvent.objects.count()
+
+        self.assertEqual(sum(archive_rows(days=1000).values()), 0)
+        moved = archive_rows(days=365, batch_size=1)
+        self.assertEqual(moved, {'project.gigreport': 2, 'project.gigapplication': 1, 'finance.invoice': 1})
+
+        self.assertEqual(list(GigReport.objects.values_list('pk', flat=True)), [self.reports[2].pk])
+        self.assertEqual(sorted(ArchivedGigReport.objects.values_list('pk', flat=True)),
+                         [self.reports[0].pk, self.reports[1].pk])
+        archived = ArchivedGigReport.objects.get(pk=self.reports[0].pk)
+        self.assertEqual((archived.submitted_at, archived.rated_stars, archived.review),
+                         (self.reports[0].submitted_at, 4, {'rating': 4}))
+        self.assertEqual(list(archived.document.all()), [self.document])
+        self.assertFalse(GigReport.document.through.objects.filter(gigreport_id=self.reports[0].pk).exists())
+        self.assertEqual(list(ArchivedGigApplication.objects.values_list('pk', flat=True)), [self.applications[0].pk])
+        self.assertEqual(list(ArchivedInvoice.objects.values_list('pk', flat=True)), [self.old_invoice.pk])
+        self.assertFalse(Invoice.objects.filter(pk=self.old_invoice.pk).exists())
+
+        # Archiving is not deleting: no tombstones, the ratings keep counting.
+        self.assertEqual(OutboxEvent.objects.count(), events)
+        self.assertEqual(list(FreelancerRating.objects.values_list('kind', 'key', 'count', 'total')), ratings)
+        self.assertEqual(rebuild_ratings(), 3)
+        self.assertEqual(list(FreelancerRating.objects.values_list('kind', 'key', 'count', 'total')), ratings)
+
+        # Archived rows cascade with their parents.
+        self.closed_gig.delete()
+        self.assertFalse(ArchivedGigReport.objects.exists())
+        self.assertFalse(ArchivedInvoice.objects.exists())
+        self.assertEqual(FreelancerRating.objects.get(kind='overall').count, 1)
+
+    def test_archived_applications_keep_their_slots(self):
+        from common.archive import archive_rows
+        from project.models import Gig
+        Gig.objects.filter(pk=self.closed_gig.pk).update(number_of_freelancers=1)
+        archive_rows(days=365)
+        self.assertEqual(Gig.objects.recount_accepted(), 0)
+        self.assertFalse(Gig.objects.with_free_slots().filter(pk=self.closed_gig.pk).exists())
+
+        Gig.objects.filter(pk=self.closed_gig.pk).update(number_of_freelancers=2)
+        client = APIClient()
+        client.force_authenticate(self.freelancer.user)
+        # The freelancer applied to the closed gig before it was archived.
+        self.assertNotIn(self.closed_gig.pk, [row['id'] for row in client.get('/project/gigs/').json()])
+
+    def test_invoice_totals_cover_archived_invoices(self):
+        from common.archive import archive_rows
+        from finance.models import Invoice
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        totals = client.get('/finance/invoices/totals/').json()
+        self.assertEqual(totals[0]['invoices'], 3)
+        archive_rows(days=365)
+        self.assertEqual(client.get('/finance/invoices/totals/').json(), totals)
+        # Invoice filters apply to the archived invoices as well.
+        Invoice.objects.update(status='approved')
+        totals = client.get('/finance/invoices/totals/', {'status': 'paid'}).json()
+        self.assertEqual(totals[0]['invoices'], 1)
+
+    def test_include_archived_pages(self):
+        from rest_framework.pagination import LimitOffsetPagination
+        from common.archive import archive_rows
+        from project.views import GigApplicationViewSet
+        archive_rows(days=365)
+        client = APIClient()
+        client.force_authenticate(self.freelancer.user)
+        archived, live = self.applications
+        with mock.patch.object(GigApplicationViewSet, 'pagination_class', LimitOffsetPagination):
+            page = client.get('/project/gig-applications/', {'include_archived': 'true', 'limit': 1,
+                                                              'offset': 1}).json()
+        self.assertEqual((page['count'], [row['id'] for row in page['results']]), (2, [archived.pk]))
+
+    def test_include_archived(self):
+        from common.archive import archive_rows
+        archive_rows(days=365)
+        client = APIClient()
+        client.force_authenticate(self.freelancer.user)
+        archived, live = self.applications
+
+        listed = client.get('/project/gig-applications/').json()
+        self.assertEqual([row['id'] for row in listed], [live.pk])
+        listed = client.get('/project/gig-applications/', {'include_archived': 'true'}).json()
+        self.assertEqual([row['id'] for row in listed], [live.pk, archived.pk])
+        listed = client.get('/project/gig-applications/', {'include_archived': 'true', 'gig': self.closed_gig.pk})
+        self.assertEqual([row['id'] for row in listed.json()], [archived.pk])
+
+        url = f'/project/gig-applications/{archived.pk}/'
+        self.assertEqual(client.get(url).status_code, 404)
+        self.assertEqual(client.get(url, {'include_archived': 'true'}).json()['gig'], self.closed_gig.pk)
+        # Archived rows are read-only.
+        self.assertEqual(client.delete(url + '?include_archived=true').status_code, 404)
+
+        invoices = client.get('/finance/invoices/', {'include_archived': '1', 'status': 'paid'}).json()
+        self.assertIn(self.old_invoice.pk, [row['id'] for row in invoices])
+        outsider = APIClient()
+        outsider.force_authenticate(User.objects.create_user(username='outsider'))
+        self.assertEqual(outsider.get(url, {'include_archived': 'true'}).status_code, 404)
+        self.assertEqual(outsider.get('/finance/invoices/', {'include_archived': '1'}).json(), [])
+
+
+class SchedulerTests(TestCase):
+    def setUp(self):
+        from common import scheduler
+        self.calls = []
+        patcher = mock.patch.dict(scheduler.jobs, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        scheduler.register('every_hour', timedelta(hours=1), lambda: self.calls.append('hourly') or 7)
+        scheduler.register('broken', timedelta(minutes=5), lambda: 1 / 0)
+
+    def test_only_the_lease_holder_runs_jobs(self):
+        from common.models import SchedulerLease
+        from common.scheduler import Scheduler
+        leader, follower = Scheduler(holder='a', lease_seconds=60), Scheduler(holder='b', lease_seconds=60)
+        self.assertTrue(leader.acquire())
+        self.assertTrue(leader.acquire())
+        self.assertFalse(follower.acquire())
+        self.assertEqual(follower.tick(), [])
+        self.assertEqual(self.calls, [])
+
+        # A leader that stops renewing loses the lease once it expires.
+        SchedulerLease.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(follower.acquire())
+        self.assertFalse(leader.acquire())
+        follower.release()
+        self.assertTrue(leader.acquire())
+
+    def test_due_jobs_run_and_are_recorded(self):
+        from common.models import JobRun
+        from common.scheduler import Scheduler, prune_runs
+        scheduler = Scheduler(holder='a')
+        with self.assertLogs('common.scheduler', 'ERROR'):
+            runs = {run.job: run for run in scheduler.tick()}
+        self.assertEqual((runs['every_hour'].succeeded, runs['every_hour'].rows), (True, 7))
+        self.assertFalse(runs['broken'].succeeded)
+        self.assertIn('ZeroDivisionError', runs['broken'].error)
+        self.assertEqual(scheduler.tick(), [])
+        self.assertEqual(self.calls, ['hourly'])
+
+        JobRun.objects.update(started_at=timezone.now() - timedelta(minutes=10))
+        with self.assertLogs('common.scheduler', 'ERROR'):
+            self.assertEqual([run.job for run in scheduler.tick()], ['broken'])
+
+        client = APIClient()
+        client.force_login(User.objects.create_user(username='staff', is_staff=True))
+        output = client.get('/metrics').content.decode()
+        self.assertIn('scheduler_job_last_rows{job="every_hour"} 7.0', output)
+        self.assertIn('scheduler_job_last_success{job="broken"} 0.0', output)
+
+        JobRun.objects.filter(job='every_hour').update(started_at=timezone.now() - timedelta(days=90))
+        self.assertEqual(prune_runs(retention_days=30), 1)
+
+
+class ScheduledJobsTests(TestCase):
+    def test_apps_register_their_jobs(self):
+        from django.core.management import call_command
+        from common import scheduler
+        self.assertTrue({'finance.mark_overdue_invoices', 'outbox.prune_events', 'archive.archive_rows',
+                         'scheduler.prune_runs', 'user.flush_expired_tokens'} <= set(scheduler.jobs))
+        out = StringIO()
+        call_command('run_scheduler', once=True, stdout=out)
+        self.assertIn('finance.mark_overdue_invoices: 0 rows', out.getvalue())
@@ -0,0 +1,13 @@
+from django.urls import path
+
+from common.views import ProfileListView, ProfileDetailView, EventFeedView, event_stream, StreamTokenView, \
+    BatchView
+
+urlpatterns = [
+    path('profiles/', ProfileListView.as_view(), name='profile-list'),
+    path('profiles/<int:pk>/', ProfileDetailView.as_view(), name='profile-detail'),
+    path('events/', EventFeedView.as_view(), name='event-feed'),
+    path('stream/', event_stream, name='event-stream'),
+    path('stream/token/', StreamTokenView.as_view(), name='event-stream-token'),
+    path('batch/', BatchView.as_view(), name='batch'),
+]
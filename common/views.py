@@ -1,3 +1,179 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from . import profiling, outbox, streams, scheduler
+from .batch import parse_batch, run_batch, BatchError
+from .metrics import registry
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint for the in-process request metrics and the scheduled job runs.
+
+    Scrapers send ``Authorization: Bearer <METRICS_TOKEN>``; staff users can
+    read it with their session.
+
+    Returns:
+    - 200 OK with the metrics in the Prometheus text format.
+    - 403 Forbidden without the token or a staff session.
+    """
+    token = settings.METRICS_TOKEN
+    scraper = bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not (scraper or request.user.is_staff):
+        return JsonResponse({"error": "The metrics token or a staff session is required."}, status=403)
+    return HttpResponse(registry.render() + scheduler.render_metrics(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def openapi_schema(request):
+    """
+    The OpenAPI schema as JSON, generated once per process (see common/schema.py).
+
+    Returns:
+    - 200 OK with the schema and its ETag.
+    - 304 Not Modified if ``If-None-Match`` carries the current ETag.
+    """
+    from .schema import serve_schema
+    return serve_schema(request)
+
+
+def swagger_ui(request, *args, **kwargs):
+    """Swagger UI. drf_yasg is imported on the first request, see common/schema.py."""
+    from .schema import swagger_ui_view
+    return swagger_ui_view(request, *args, **kwargs)
+
+
+@transaction.non_atomic_requests
+def event_stream(request):
+    """
+    Server-sent events with the status changes of the user's gig applications,
+    project applications and gig reports.
+
+    Authenticate with ``Authorization: Bearer <access token>`` or with
+    ``?token=<stream token>`` from ``StreamTokenView``. Under ASGI this path is
+    served by ``streams.EventStreamApplication``; this view is the WSGI
+    fallback and closes the stream after ``SSE_SYNC_STREAM_SECONDS``.
+
+    Returns:
+    - 200 OK with a ``text/event-stream``; ``status`` events carry ``type``,
+      ``object_id`` and ``status``.
+    - 401 Unauthorized without a valid access or stream token.
+    """
+    user_id = streams.authenticate_request(request)
+    if user_id is None:
+        return JsonResponse({"error": "A valid access or stream token is required."}, status=401)
+    response = StreamingHttpResponse(streams.sync_stream(user_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+class StreamTokenView(APIView):
+    """
+    A token for ``/common/stream/?token=``, for clients such as EventSource
+    that cannot send the Authorization header. It only opens the event stream
+    and expires after ``SSE_TOKEN_MAX_AGE`` seconds; fetch a new one before
+    reconnecting.
+
+    Returns:
+    - 200 OK with ``token`` and ``expires_in`` (seconds).
+    """
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request):
+        return Response({'token': streams.make_stream_token(request.user.pk),
+                         'expires_in': settings.SSE_TOKEN_MAX_AGE})
+
+
+class ProfileListView(APIView):
+    """
+    Recent request profiles, newest first, without the profile bodies.
+
+    Returns:
+    - 200 OK with the profiles kept in the ring buffer.
+    - 403 Forbidden for non-staff users.
+    """
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        summary_fields = ('id', 'method', 'path', 'status', 'started_at', 'duration_ms', 'query_count')
+        return Response([{field: profile[field] for field in summary_fields} for profile in profiling.store.list()])
+
+
+class ProfileDetailView(APIView):
+    """
+    A single request profile with its cProfile statistics and SQL log.
+
+    Returns:
+    - 200 OK with the profile.
+    - 403 Forbidden for non-staff users.
+    - 404 Not Found if the profile was evicted from the ring buffer.
+    """
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, pk):
+        profile = profiling.store.get(pk)
+        if profile is None:
+            return Response({"error": "Profile not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(profile)
+
+
+class EventFeedView(APIView):
+    """
+    Outbox change feed, oldest first.
+
+    Ids are allocated when a transaction inserts its events, not when it
+    commits, so a slow transaction can commit events below a cursor that was
+    already handed out. Consumers that must see every event re-read a window
+    behind their cursor (the events of the last few seconds, say) and skip ids
+    they have processed.
+
+    Query params:
+    - after: cursor returned by the previous page (defaults to 0)
+    - limit: page size, at most OUTBOX_BATCH_SIZE
+    - model: restrict to one or more models (``project.gig``), repeatable
+
+    Returns:
+    - 200 OK with the events and the cursor for the next page.
+    - 400 Bad Request for a non-integer cursor or limit.
+    - 403 Forbidden for non-staff users.
+    """
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        try:
+            after = int(request.query_params.get('after', 0))
+            limit = min(int(request.query_params.get('limit', settings.OUTBOX_BATCH_SIZE)),
+                        settings.OUTBOX_BATCH_SIZE)
+        except ValueError:
+            return Response({"error": "after and limit must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        events, cursor = outbox.read_events(after, max(limit, 1), request.query_params.getlist('model'))
+        return Response({'events': [outbox.serialize_event(event) for event in events], 'cursor': cursor})
+
+
+class BatchView(APIView):
+    """
+    Run several API calls in one HTTP request.
+
+    Body: ``{"atomic": false, "requests": [{"id": "me", "method": "GET", "path": "/user/...", "body": {...}}]}``
+    (``method`` defaults to GET, ``id`` to the position). With ``atomic`` the
+    sub-requests run in order in one transaction that is rolled back when one
+    fails; otherwise read-only batches run concurrently.
+
+    Returns:
+    - 200 OK with ``{"responses": [{"id", "status", "body"}, ...]}`` in request order.
+    - 400 Bad Request for a malformed batch.
+    """
+
+    def post(self, request):
+        try:
+            atomic, sub_requests = parse_batch(request.data)
+        except BatchError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'responses': run_batch(request, sub_requests, atomic=atomic)})
@@ -1,4 +1,6 @@
 from django.contrib import admin
+
+from common.admin_utils import KeysetPaginator, CachedAllValuesFieldListFilter
 from .models import Invoice
 # Register your models here.
 
@@ -7,13 +9,17 @@ class InvoiceAdmin(admin.ModelAdmin):
         'invoice_number', 'company', 'freelancer', 'project', 'gig',
         'amount', 'paid_amount', 'status', 'due_date', 'created_at', 'paid_at'
     )
+    list_select_related = ('company', 'freelancer__user', 'project', 'gig')
+    paginator = KeysetPaginator
+    show_full_result_count = False
     search_fields = (
         'invoice_number', 'company__company_name', 'freelancer__user__first_name',
         'freelancer__user__last_name', 'project__title', 'gig__title'
     )
     list_filter = (
-        'status', 'due_date', 'created_at', 'paid_at',
-        'paid_currency', 'received_currency', 'transaction_fee_currency'
+        ('status', CachedAllValuesFieldListFilter), 'due_date', 'created_at', 'paid_at',
+        ('paid_currency', CachedAllValuesFieldListFilter), ('received_currency', CachedAllValuesFieldListFilter),
+        ('transaction_fee_currency', CachedAllValuesFieldListFilter)
     )
     readonly_fields = ('created_at', 'updated_at', 'paid_at')
     fieldsets = (
@@ -1,6 +1,23 @@
+from datetime import timedelta
+
 from django.apps import AppConfig
+from django.db.models import Q
 
 
 class FinanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'finance'
+
+    def ready(self):
+        from common import archive, outbox, scheduler
+        from .models import Invoice, ArchivedInvoice
+        from .overdue import mark_overdue_invoices
+
+        outbox.track(Invoice, ('company_id', 'freelancer_id', 'status', 'invoice_number', 'amount'), owned_by={
+            'owner_id': 'company__owner_id', 'freelancer_user_id': 'freelancer__user_id'})
+
+        def settled(cutoff):
+            return Q(status='paid') & (Q(paid_at__lt=cutoff) | Q(paid_at=None, updated_at__lt=cutoff))
+
+        archive.register(Invoice, ArchivedInvoice, settled)
+        scheduler.register('finance.mark_overdue_invoices', timedelta(minutes=15), mark_overdue_invoices)
@@ -0,0 +1,16 @@
+from django_filters import rest_framework as filters
+
+from .models import Invoice
+
+
+class InvoiceFilter(filters.FilterSet):
+    ordering = filters.OrderingFilter(fields=('due_date', 'created_at'))
+
+    class Meta:
+        model = Invoice
+        fields = {
+            'status': ['exact'],
+            'company': ['exact'],
+            'freelancer': ['exact'],
+            'due_date': ['gte', 'lte'],
+        }
@@ -0,0 +1,22 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from finance.payouts import create_payout_run, payout_csv
+
+
+class Command(BaseCommand):
+    help = 'Pay every approved, unpaid invoice in one payout run and optionally write the payout file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Write the payout CSV to this file.')
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        run = create_payout_run()
+        self.stdout.write(self.style.SUCCESS(
+            f'Payout run {run.pk}: {run.invoice_count} invoices in {run.batch_count} batches '
+            f'({perf_counter() - start:.2f}s).'))
+        if options['output']:
+            with open(options['output'], 'w', newline='') as handle:
+                handle.writelines(payout_csv(run))
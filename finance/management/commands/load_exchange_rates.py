@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from finance.rates import read_rate_file, load_rates
+
+
+class Command(BaseCommand):
+    help = 'Load exchange rates from CSV (currency,date,rate) or JSON files into ExchangeRate.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for path in options['paths']:
+            loaded = load_rates(read_rate_file(path), batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Loaded {loaded} rates from {path}.'))
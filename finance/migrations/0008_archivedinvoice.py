@@ -0,0 +1,45 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0002_initial'),
+        ('finance', '0007_invoice_updated_idx'),
+        ('project', '0010_gig_freelancers_gig_number_of_freelancers'),
+        ('user', '0005_alter_freelancer_certification_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedInvoice',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('amount', models.IntegerField()),
+                ('paid_amount', models.IntegerField(blank=True, null=True)),
+                ('received_amount', models.IntegerField(blank=True, null=True)),
+                ('transaction_fee', models.IntegerField(blank=True, null=True)),
+                ('status', models.CharField(blank=True, max_length=100)),
+                ('due_date', models.DateField()),
+                ('notes', models.TextField(blank=True)),
+                ('invoice_number', models.CharField(blank=True, db_index=True, max_length=100)),
+                ('tax', models.IntegerField(blank=True, null=True)),
+                ('paid_currency', models.CharField(blank=True, max_length=100)),
+                ('received_currency', models.CharField(blank=True, max_length=100)),
+                ('transaction_fee_currency', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('paid_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField()),
+                ('company', models.ForeignKey(blank=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_invoices', to='user.company')),
+                ('document', models.ManyToManyField(blank=True, related_name='archived_invoice_document', to='common.document')),
+                ('freelancer', models.ForeignKey(blank=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_invoices', to='user.freelancer')),
+                ('gig', models.ForeignKey(blank=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_invoices', to='project.gig')),
+                ('project', models.ForeignKey(blank=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_invoices', to='project.project')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['company', 'status'], name='archinvoice_company_status_idx'), models.Index(fields=['freelancer', 'status'], name='archinvoice_freelancer_idx')],
+            },
+        ),
+    ]
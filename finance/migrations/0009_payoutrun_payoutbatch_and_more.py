@@ -0,0 +1,53 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0008_archivedinvoice'),
+        ('user', '0005_alter_freelancer_certification_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayoutRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('invoice_count', models.IntegerField(default=0)),
+                ('batch_count', models.IntegerField(default=0)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payout_runs', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PayoutBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(blank=True, max_length=100)),
+                ('invoice_count', models.IntegerField(default=0)),
+                ('gross', models.BigIntegerField(default=0)),
+                ('fees', models.BigIntegerField(default=0)),
+                ('tax', models.BigIntegerField(default=0)),
+                ('net', models.BigIntegerField(default=0)),
+                ('freelancer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payout_batches', to='user.freelancer')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batches', to='finance.payoutrun')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='payoutbatch',
+            constraint=models.UniqueConstraint(fields=('run', 'freelancer', 'currency'), name='payout_batch_unique'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='payout_batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='invoices', to='finance.payoutbatch'),
+        ),
+        migrations.AddField(
+            model_name='archivedinvoice',
+            name='payout_batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='archived_invoices', to='finance.payoutbatch'),
+        ),
+    ]
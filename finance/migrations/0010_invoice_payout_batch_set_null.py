@@ -0,0 +1,22 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0009_payoutrun_payoutbatch_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invoice',
+            name='payout_batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invoices', to='finance.payoutbatch'),
+        ),
+        migrations.AlterField(
+            model_name='archivedinvoice',
+            name='payout_batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_invoices', to='finance.payoutbatch'),
+        ),
+    ]
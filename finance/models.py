@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
 
 
 # Create your models here.
@@ -21,7 +23,7 @@ class Invoice(models.Model):
     due_date = models.DateField()
     notes = models.TextField(blank=True)
     document = models.ManyToManyField('common.Document', related_name='invoice_document', blank=True)
-    invoice_number = models.CharField(max_length=100, blank=True)
+    invoice_number = models.CharField(max_length=100, blank=True, db_index=True)
     tax = models.IntegerField(blank=True, null=True)
 
     # Currency details
@@ -33,3 +35,138 @@ class Invoice(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     paid_at = models.DateTimeField(blank=True, null=True)
+
+    # Set when the invoice is paid out, see finance.payouts. Deleting a batch (with its run or
+    # freelancer) unlinks the invoice; paid_at and paid_amount keep the payment.
+    payout_batch = models.ForeignKey('PayoutBatch', on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='invoices')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'due_date'], name='invoice_status_due_idx'),
+            models.Index(fields=['company', 'status'], name='invoice_company_status_idx'),
+            models.Index(fields=['freelancer', 'status'], name='invoice_freelancer_status_idx'),
+            models.Index(fields=['due_date'], name='invoice_due_idx'),
+            models.Index(fields=['updated_at'], name='invoice_updated_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'invoice_number'], condition=~Q(invoice_number=''),
+                                    name='invoice_number_unique_per_company'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.invoice_number or not self.company_id:
+            return super().save(*args, **kwargs)
+        from .numbering import next_invoice_number
+        # The number is taken in the same transaction as the insert, so a failed
+        # insert hands it back and the sequence stays gapless.
+        with transaction.atomic(using=kwargs.get('using')):
+            self.invoice_number = next_invoice_number(self.company_id, timezone.localdate().year,
+                                                      using=kwargs.get('using'))
+            return super().save(*args, **kwargs)
+
+
+class ArchivedInvoice(models.Model):
+    """
+    A paid invoice moved out of ``Invoice`` by ``common.archive``. The columns
+    are ``Invoice``'s, ids included, plus ``archived_at``.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    company = models.ForeignKey('user.Company', on_delete=models.CASCADE, related_name='archived_invoices',
+                                blank=True)
+    freelancer = models.ForeignKey('user.Freelancer', on_delete=models.CASCADE, related_name='archived_invoices',
+                                   blank=True)
+    project = models.ForeignKey('project.Project', on_delete=models.CASCADE, related_name='archived_invoices',
+                                blank=True)
+    gig = models.ForeignKey('project.Gig', on_delete=models.CASCADE, related_name='archived_invoices', blank=True)
+
+    amount = models.IntegerField()
+    paid_amount = models.IntegerField(blank=True, null=True)
+    received_amount = models.IntegerField(blank=True, null=True)
+    transaction_fee = models.IntegerField(blank=True, null=True)
+
+    status = models.CharField(max_length=100, blank=True)
+    due_date = models.DateField()
+    notes = models.TextField(blank=True)
+    document = models.ManyToManyField('common.Document', related_name='archived_invoice_document', blank=True)
+    invoice_number = models.CharField(max_length=100, blank=True, db_index=True)
+    tax = models.IntegerField(blank=True, null=True)
+
+    paid_currency = models.CharField(max_length=100, blank=True)
+    received_currency = models.CharField(max_length=100, blank=True)
+    transaction_fee_currency = models.CharField(max_length=100)
+
+    # Copied as they were, so no auto_now.
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    paid_at = models.DateTimeField(blank=True, null=True)
+    payout_batch = models.ForeignKey('PayoutBatch', on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='archived_invoices')
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'status'], name='archinvoice_company_status_idx'),
+            models.Index(fields=['freelancer', 'status'], name='archinvoice_freelancer_idx'),
+        ]
+
+
+class InvoiceSequence(models.Model):
+    """Last invoice number handed out for a company in a calendar year."""
+    company = models.ForeignKey('user.Company', on_delete=models.CASCADE, related_name='invoice_sequences')
+    year = models.PositiveIntegerField()
+    last_number = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'year'], name='invoice_sequence_company_year'),
+        ]
+
+
+class ExchangeRate(models.Model):
+    """Value of one unit of ``currency`` in ``settings.EXCHANGE_RATE_BASE_CURRENCY`` on ``date``."""
+    currency = models.CharField(max_length=10)
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=20, decimal_places=10)
+
+    class Meta:
+        constraints = [
+            # Also serves the "latest rate on or before a date" lookups.
+            models.UniqueConstraint(fields=['currency', 'date'], name='exchange_rate_currency_date'),
+        ]
+
+    def __str__(self):
+        return f'{self.currency} {self.date}: {self.rate}'
+
+
+class PayoutRun(models.Model):
+    """One payout of every approved, unpaid invoice, made by ``finance.payouts.create_payout_run``."""
+    created_at = models.DateTimeField(auto_now_add=True)
+    created_by = models.ForeignKey('user.User', on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='payout_runs')
+    invoice_count = models.IntegerField(default=0)
+    batch_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'Payout run {self.pk} ({self.created_at:%Y-%m-%d})'
+
+
+class PayoutBatch(models.Model):
+    """
+    What a run pays one freelancer in one currency (an invoice's
+    ``paid_currency``): the sums of the invoices' amounts, transaction fees
+    and tax, and ``net``, the amount less fees and tax.
+    """
+    run = models.ForeignKey(PayoutRun, on_delete=models.CASCADE, related_name='batches')
+    freelancer = models.ForeignKey('user.Freelancer', on_delete=models.CASCADE, related_name='payout_batches')
+    currency = models.CharField(max_length=100, blank=True)
+    invoice_count = models.IntegerField(default=0)
+    gross = models.BigIntegerField(default=0)
+    fees = models.BigIntegerField(default=0)
+    tax = models.BigIntegerField(default=0)
+    net = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'freelancer', 'currency'], name='payout_batch_unique'),
+        ]
@@ -0,0 +1,41 @@
+"""
+Invoice number allocation.
+
+Numbers are sequential per company and calendar year and are kept in
+``InvoiceSequence`` rows, one per company and year. Allocation is a single
+conditional ``UPDATE ... SET last_number = last_number + n``: the row lock it
+takes serializes only writers of the same company and year, and nothing reads
+``max()`` over the invoice table.
+
+``next_invoice_number`` is gapless: ``Invoice.save`` calls it inside the
+transaction that stores the invoice, so a rollback also returns the number.
+"""
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from django.db.models import F
+
+from .models import InvoiceSequence
+
+
+def allocate(company_id, year, count=1, using=None):
+    """Advance the company's counter for ``year`` by ``count`` and return the allocated numbers."""
+    sequences = InvoiceSequence.objects.using(using).filter(company_id=company_id, year=year)
+    with transaction.atomic(using=using):
+        if not sequences.update(last_number=F('last_number') + count):
+            try:
+                with transaction.atomic(using=using):
+                    InvoiceSequence.objects.using(using).create(company_id=company_id, year=year, last_number=count)
+            except IntegrityError:
+                # Another writer created the row first; it is there to update now.
+                sequences.update(last_number=F('last_number') + count)
+        last = sequences.values_list('last_number', flat=True).get()
+    return range(last - count + 1, last + 1)
+
+
+def format_invoice_number(year, number):
+    return getattr(settings, 'INVOICE_NUMBER_FORMAT', '{year}-{number:06d}').format(year=year, number=number)
+
+
+def next_invoice_number(company_id, year, using=None):
+    return format_invoice_number(year, allocate(company_id, year, using=using)[0])
+
@@ -0,0 +1,38 @@
+"""
+Overdue invoices.
+
+``mark_overdue_invoices`` runs as a scheduled job (see ``common.scheduler``).
+It moves unpaid invoices past their due date to ``OVERDUE`` with conditional
+UPDATEs of at most ``INVOICE_OVERDUE_CHUNK_SIZE`` rows, each in its own short
+transaction, walking the ``(status, due_date)`` index. Outbox events are only
+appended for the invoices an UPDATE changed.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from common.outbox import append_events
+from .models import Invoice
+
+OVERDUE = 'overdue'
+# Approved invoices wait for the next payout run (finance.payouts), which pays them.
+UNPAID_STATUSES = ('pending',)
+
+
+def mark_overdue_invoices(chunk_size=None, today=None):
+    """Returns the number of invoices that became overdue."""
+    chunk_size = chunk_size or settings.INVOICE_OVERDUE_CHUNK_SIZE
+    overdue = Invoice.objects.filter(status__in=UNPAID_STATUSES, due_date__lt=today or timezone.localdate())
+    total = 0
+    while True:
+        with transaction.atomic():
+            ids = list(overdue.order_by('due_date', 'pk').values_list('pk', flat=True)[:chunk_size])
+            # Invoices paid in the meantime no longer match and keep their status; the
+            # UPDATE's timestamp tells the changed rows apart for the outbox.
+            now = timezone.now()
+            changed = overdue.filter(pk__in=ids).update(status=OVERDUE, updated_at=now)
+            append_events(Invoice, list(Invoice.objects.filter(pk__in=ids, status=OVERDUE, updated_at=now)
+                                        .values_list('pk', flat=True)))
+        total += changed
+        if len(ids) < chunk_size:
+            return total
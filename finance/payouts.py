@@ -0,0 +1,175 @@
+"""
+Freelancer payouts.
+
+``create_payout_run`` pays every approved, unpaid invoice in one transaction
+with a fixed number of statements, however many invoices there are:
+
+1. one grouped query sums the payable invoices per freelancer and currency
+   (``paid_currency``, blank meaning the base currency),
+2. one INSERT creates a ``PayoutBatch`` per group with those sums,
+3. one UPDATE claims the invoices: it links each to its batch through a
+   correlated subquery and sets ``status``, ``paid_at``, ``paid_currency`` and
+   ``paid_amount``, the amount less ``transaction_fee`` and ``tax``.
+
+A fee in another currency than the invoice is converted with the rates of the
+run's day (``finance.rates``); one small query finds those currency pairs
+first. Invoices whose fee cannot be converted for lack of a rate stay approved
+for a later run, and so do invoices whose fees and tax exceed the amount:
+they would be paid a negative amount. A run logs a warning for either.
+
+Both statements only see invoices last changed before the run started, so
+they agree unless a payable invoice was committed with an older timestamp in
+between; then the batch sums are recomputed from what was claimed. The claim
+only matches invoices without a batch, so concurrent runs never pay an invoice
+twice. The outbox events for the paid invoices are one INSERT ... SELECT.
+
+``payout_csv`` streams the batches of a run as CSV for the payment provider.
+"""
+import csv
+import logging
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Sum, Count, Exists, OuterRef, Subquery, Value, Case, When, IntegerField, \
+    ExpressionWrapper
+from django.db.models.functions import Coalesce, NullIf, Round, Cast
+from django.utils import timezone
+
+from common.outbox import append_queryset_events
+from .models import Invoice, PayoutRun, PayoutBatch
+from .rates import base_currency, get_rate, MissingRate, AMOUNT_FIELD, RATE_FIELD
+
+logger = logging.getLogger(__name__)
+
+PAYABLE_STATUS = 'approved'
+PAID = 'paid'
+
+ZERO = Value(0)
+TAX = Coalesce(F('tax'), ZERO)
+HAS_FEE = Q(transaction_fee__isnull=False) & ~Q(transaction_fee=0)
+
+CSV_HEADER = ('batch', 'freelancer', 'name', 'email', 'currency', 'invoices', 'gross', 'fees', 'tax', 'net')
+
+
+def currency_or_base(expression):
+    """The currency in ``expression``, blank read as the base currency."""
+    return Coalesce(NullIf(expression, Value('')), Value(base_currency()))
+
+
+def payable_invoices():
+    """Unpaid approved invoices, with ``payout_currency`` and ``fee_currency`` aliased."""
+    return Invoice.objects.filter(status=PAYABLE_STATUS, paid_at=None, payout_batch=None).alias(
+        payout_currency=currency_or_base(F('paid_currency')),
+        fee_currency=currency_or_base(F('transaction_fee_currency')))
+
+
+def fee_rates(invoices, on_date):
+    """
+    ``({(fee_currency, payout_currency): rate}, [pairs without a rate])`` for
+    the invoices with a fee in another currency than the invoice.
+    """
+    rates, missing = {}, []
+    pairs = invoices.filter(HAS_FEE).exclude(fee_currency=F('payout_currency')).order_by() \
+        .values_list(F('fee_currency'), F('payout_currency')).distinct()
+    for fee_currency, currency in pairs:
+        try:
+            rates[fee_currency, currency] = get_rate(fee_currency, on_date) / get_rate(currency, on_date)
+        except MissingRate:
+            missing.append((fee_currency, currency))
+    return rates, missing
+
+
+def converted_fees(rates):
+    """The transaction fee in the invoice's currency, for the pairs in ``rates``."""
+    return Coalesce(Case(*(
+        When(fee_currency=fee_currency, payout_currency=currency, then=Cast(Round(ExpressionWrapper(
+            F('transaction_fee') * Value(rate, output_field=RATE_FIELD), output_field=AMOUNT_FIELD)),
+            IntegerField()))
+        for (fee_currency, currency), rate in rates.items()
+    ), default=F('transaction_fee')), ZERO)
+
+
+def batch_sums(invoices, currency, fees):
+    return invoices.order_by().annotate(batch_currency=currency).values('freelancer_id', 'batch_currency').annotate(
+        invoice_count=Count('pk'), gross=Coalesce(Sum('amount'), ZERO), fees=Coalesce(Sum(fees), ZERO),
+        tax=Coalesce(Sum(TAX), ZERO))
+
+
+def create_payout_run(created_by=None, chunk_size=None):
+    """Pay every payable invoice. Returns the ``PayoutRun``."""
+    chunk_size = chunk_size or settings.PAYOUT_CHUNK_SIZE
+    with transaction.atomic():
+        run = PayoutRun.objects.create(created_by=created_by)
+        payable = payable_invoices().filter(updated_at__lte=run.created_at)
+        rates, missing = fee_rates(payable, timezone.localdate(run.created_at))
+        if missing:
+            unconvertible = HAS_FEE & reduce(or_, (Q(fee_currency=fee_currency, payout_currency=currency)
+                                                   for fee_currency, currency in missing))
+            logger.warning('Payout run %s leaves out invoices with fees in %s: no exchange rate.', run.pk,
+                           ', '.join(f'{fee_currency} (invoiced in {currency})' for fee_currency, currency in missing))
+            payable = payable.exclude(unconvertible)
+        fees = converted_fees(rates)
+        payable = payable.alias(deductions=fees + TAX)
+        overdrawn = payable.filter(deductions__gt=F('amount')).count()
+        if overdrawn:
+            logger.warning('Payout run %s leaves out %s invoice(s) whose fees and tax exceed the amount.',
+                           run.pk, overdrawn)
+            payable = payable.exclude(deductions__gt=F('amount'))
+        batches = PayoutBatch.objects.bulk_create([
+            PayoutBatch(run=run, freelancer_id=row['freelancer_id'], currency=row['batch_currency'],
+                        invoice_count=row['invoice_count'], gross=row['gross'], fees=row['fees'], tax=row['tax'],
+                        net=row['gross'] - row['fees'] - row['tax'])
+            for row in batch_sums(payable, F('payout_currency'), fees)
+        ], batch_size=chunk_size)
+
+        run_batches = PayoutBatch.objects.filter(run=run, freelancer_id=OuterRef('freelancer_id'),
+                                                 currency=currency_or_base(OuterRef('paid_currency')))
+        claimed = payable.filter(Exists(run_batches)).update(
+            payout_batch=Subquery(run_batches.values('pk')[:1]), status=PAID, paid_at=run.created_at,
+            paid_currency=F('payout_currency'), paid_amount=F('amount') - fees - TAX, updated_at=timezone.now())
+        if claimed != sum(batch.invoice_count for batch in batches):
+            refresh_batch_sums(run)
+
+        run.invoice_count = claimed
+        run.batch_count = len(batches)
+        run.save(update_fields=['invoice_count', 'batch_count'])
+        append_queryset_events(Invoice.objects.filter(payout_batch__run=run))
+    return run
+
+
+def refresh_batch_sums(run):
+    """Recompute the batch sums of ``run`` from the invoices linked to the batches."""
+    # Claimed invoices carry their currency and, in paid_amount, the converted fee.
+    fees = F('amount') - Coalesce(F('paid_amount'), F('amount')) - TAX
+    sums = {(row['freelancer_id'], row['batch_currency']): row
+            for row in batch_sums(Invoice.objects.filter(payout_batch__run=run), F('paid_currency'), fees)}
+    batches = list(run.batches.all())
+    for batch in batches:
+        row = sums.get((batch.freelancer_id, batch.currency), {})
+        batch.invoice_count = row.get('invoice_count', 0)
+        batch.gross, batch.fees, batch.tax = row.get('gross', 0), row.get('fees', 0), row.get('tax', 0)
+        batch.net = batch.gross - batch.fees - batch.tax
+    PayoutBatch.objects.bulk_update(batches, ['invoice_count', 'gross', 'fees', 'tax', 'net'], batch_size=1000)
+
+
+class Echo:
+    """File-like object for csv.writer that hands each row back instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def payout_csv(run, chunk_size=2000):
+    """Yield the CSV lines of a run's batches, reading them ``chunk_size`` at a time."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    rows = PayoutBatch.objects.filter(run=run).order_by('pk').values_list(
+        'pk', 'freelancer_id', 'freelancer__user__first_name', 'freelancer__user__last_name',
+        'freelancer__user__email', 'currency', 'invoice_count', 'gross', 'fees', 'tax', 'net')
+    currency = base_currency()
+    for pk, freelancer_id, first_name, last_name, email, batch_currency, *amounts in \
+            rows.iterator(chunk_size=chunk_size):
+        yield writer.writerow((pk, freelancer_id, f'{first_name} {last_name}'.strip(), email,
+                               batch_currency or currency, *amounts))
@@ -0,0 +1,136 @@
+"""
+Exchange rates and multi-currency invoice totals.
+
+Rates are loaded from local CSV or JSON files into ``ExchangeRate`` and are
+expressed as the value of one unit of a currency in the base currency
+(``settings.EXCHANGE_RATE_BASE_CURRENCY``). An invoice is converted with the
+latest rate on or before the day it was created.
+
+``get_rate``/``convert`` serve single conversions from an in-process LRU cache.
+Its entries are keyed by the current ``EXCHANGE_RATE_CACHE_SECONDS`` period, so
+rates loaded by another process are picked up within that time; ``load_rates``
+clears the cache of its own process at once.
+``invoice_totals`` converts and sums in SQL: the rate is a correlated subquery
+per invoice, so a whole report is one query no matter how many invoices or
+currencies it covers. Archived invoices (``common.archive``) are summed in the
+same query, through a UNION ALL with the live ones.
+"""
+import csv
+import json
+from decimal import Decimal
+from functools import lru_cache
+from time import time
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery, Case, When, Value, F, Q, Sum, Count, DecimalField, \
+    ExpressionWrapper
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ExchangeRate, Invoice, ArchivedInvoice
+
+RATE_FIELD = DecimalField(max_digits=20, decimal_places=10)
+AMOUNT_FIELD = DecimalField(max_digits=30, decimal_places=10)
+GROUPS = {'company': 'company_id', 'freelancer': 'freelancer_id'}
+
+
+class MissingRate(LookupError):
+    pass
+
+
+def base_currency():
+    return getattr(settings, 'EXCHANGE_RATE_BASE_CURRENCY', 'EUR')
+
+
+def read_rate_file(path):
+    """
+    Yield ``(currency, date, rate)`` rows from a CSV file with a
+    ``currency,date,rate`` header or a JSON list of objects with those keys.
+    """
+    with open(path, newline='') as handle:
+        rows = json.load(handle) if str(path).endswith('.json') else csv.DictReader(handle)
+        for row in rows:
+            yield row['currency'].strip().upper(), row['date'], Decimal(str(row['rate']))
+
+
+def load_rates(rows, batch_size=1000):
+    """Insert or update rates in batches and reset the lookup cache."""
+    rates = [ExchangeRate(currency=currency, date=date, rate=rate) for currency, date, rate in rows]
+    ExchangeRate.objects.bulk_create(rates, batch_size=batch_size, update_conflicts=True,
+                                     unique_fields=['currency', 'date'], update_fields=['rate'])
+    cached_rate.cache_clear()
+    return len(rates)
+
+
+@lru_cache(maxsize=4096)
+def cached_rate(currency, on_date, period):
+    currency = (currency or base_currency()).upper()
+    if currency == base_currency():
+        return Decimal(1)
+    rate = ExchangeRate.objects.filter(currency=currency, date__lte=on_date) \
+        .order_by('-date').values_list('rate', flat=True).first()
+    if rate is None:
+        raise MissingRate(f'No {currency} rate on or before {on_date}.')
+    return rate
+
+
+def get_rate(currency, on_date):
+    """Latest rate for ``currency`` on or before ``on_date``."""
+    return cached_rate(currency, on_date, int(time() // settings.EXCHANGE_RATE_CACHE_SECONDS))
+
+
+def convert(amount, from_currency, to_currency, on_date=None):
+    on_date = on_date or timezone.localdate()
+    return Decimal(amount) * get_rate(from_currency, on_date) / get_rate(to_currency, on_date)
+
+
+def rate_to_base(currency_field, date_field):
+    """Expression for the rate of the row's currency on the row's date; NULL when no rate is known."""
+    latest = ExchangeRate.objects.filter(currency=OuterRef(currency_field), date__lte=OuterRef(date_field)) \
+        .order_by('-date').values('rate')[:1]
+    return Case(
+        When(**{f'{currency_field}__in': ['', base_currency()]}, then=Value(Decimal(1), output_field=RATE_FIELD)),
+        default=Subquery(latest, output_field=RATE_FIELD),
+        output_field=RATE_FIELD,
+    )
+
+
+def group_sums(queryset, group):
+    in_base = ExpressionWrapper(F('amount') * F('rate_to_base'), output_field=AMOUNT_FIELD)
+    return queryset.order_by() \
+        .annotate(invoice_date=TruncDate('created_at')) \
+        .annotate(rate_to_base=rate_to_base('paid_currency', 'invoice_date')) \
+        .values(group) \
+        .annotate(total_in_base=Sum(in_base), invoices=Count('pk'),
+                  converted=Count('pk', filter=Q(rate_to_base__isnull=False)))
+
+
+def invoice_totals(reporting_currency, group_by='company', queryset=None, on_date=None, archived=None):
+    """
+    Sum invoice amounts per company or freelancer, converted into
+    ``reporting_currency``. ``archived`` is an ``ArchivedInvoice`` queryset to
+    sum with ``queryset``; without either, all live and archived invoices are
+    summed. Invoices without a known rate are counted in ``unconverted`` and
+    left out of the total.
+    """
+    if queryset is None:
+        queryset = Invoice.objects.all()
+        archived = ArchivedInvoice.objects.all() if archived is None else archived
+    group = GROUPS[group_by]
+    reporting_rate = get_rate(reporting_currency, on_date or timezone.localdate())
+    rows = group_sums(queryset, group)
+    if archived is not None:
+        rows = rows.union(group_sums(archived, group), all=True)
+    sums = {}
+    for row in rows:
+        total = sums.setdefault(row[group], {'total_in_base': Decimal(0), 'invoices': 0, 'converted': 0})
+        total['total_in_base'] += row['total_in_base'] or 0
+        total['invoices'] += row['invoices']
+        total['converted'] += row['converted']
+    return [{
+        group_by: key,
+        'currency': reporting_currency.upper(),
+        'total': round(total['total_in_base'] / reporting_rate, 2),
+        'invoices': total['invoices'],
+        'unconverted': total['invoices'] - total['converted'],
+    } for key, total in sorted(sums.items())]
@@ -0,0 +1,16 @@
+from rest_framework import serializers
+
+from .models import Invoice, PayoutRun
+
+
+class InvoiceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Invoice
+        fields = '__all__'
+
+
+class PayoutRunSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PayoutRun
+        fields = '__all__'
+        read_only_fields = ('created_by', 'invoice_count', 'batch_count')
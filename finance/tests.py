@@ -1,3 +1,386 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from finance.filters import InvoiceFilter
+from finance.models import Invoice, ExchangeRate
+from finance.rates import read_rate_file, load_rates, get_rate, cached_rate, invoice_totals
+from common.test_utils import assert_filters_use_indexes, make_project, make_gig, viewset_queryset
+from user.models import Company, Freelancer
+
+User = get_user_model()
+
+
+class InvoiceFilterPlanTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(owner=owner, company_name='Acme')
+        self.freelancer = Freelancer.objects.create(user=User.objects.create_user(username='free'), hourly_rate=10)
+
+    def test_invoice_filters(self):
+        values = {'status': 'pending', 'company': self.company.pk, 'freelancer': self.freelancer.pk,
+                  'due_date__gte': '2024-01-01', 'due_date__lte': '2024-01-01'}
+        from finance.views import InvoiceViewSet
+        assert_filters_use_indexes(self, InvoiceFilter, viewset_queryset(InvoiceViewSet, self.company.owner),
+                                   values)
+
+
+class InvoiceAdminTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username='owner', password='secret')
+        company = Company.objects.create(owner=owner, company_name='Acme')
+        project = make_project(owner)
+        gig = make_gig(project, user=company)
+        self.invoice_kwargs = {'company': company, 'project': project, 'gig': gig, 'amount': 100,
+                               'status': 'pending', 'due_date': '2024-01-01', 'transaction_fee_currency': 'EUR'}
+        self.admin = User.objects.create_superuser(username='admin', password='secret', email='admin@example.com')
+        self.client.force_login(self.admin)
+
+    def add_invoices(self, count):
+        start = Freelancer.objects.count()
+        for index in range(start, start + count):
+            freelancer = Freelancer.objects.create(user=User.objects.create_user(username=f'free{index}'),
+                                                   hourly_rate=10)
+            Invoice.objects.create(freelancer=freelancer, **self.invoice_kwargs)
+
+    def test_changelist_query_count_is_constant(self):
+        self.add_invoices(2)
+        self.assertEqual(self.client.get('/admin/finance/invoice/').status_code, 200)  # warms the filter cache
+        with CaptureQueriesContext(connection) as few:
+            self.client.get('/admin/finance/invoice/')
+        self.add_invoices(10)
+        with self.assertNumQueries(len(few)):
+            self.client.get('/admin/finance/invoice/')
+
+    def test_search(self):
+        self.add_invoices(1)
+        self.assertContains(self.client.get('/admin/finance/invoice/', {'q': 'cme'}), '1 result')
+        User.objects.filter(username='free0').update(first_name='Grace')
+        self.assertContains(self.client.get('/admin/finance/invoice/', {'q': 'Grace'}), '1 result')
+        self.assertContains(self.client.get('/admin/finance/invoice/', {'q': 'Nobody'}), '0 results')
+
+
+class InvoiceNumberTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(owner=owner, company_name='Acme')
+        self.other = Company.objects.create(owner=User.objects.create_user(username='other'), company_name='Other')
+        project = make_project(owner)
+        freelancer = Freelancer.objects.create(user=User.objects.create_user(username='free'), hourly_rate=10)
+        self.invoice_kwargs = {'freelancer': freelancer, 'project': project, 'gig': make_gig(project),
+                               'amount': 100, 'due_date': '2024-01-01', 'transaction_fee_currency': 'EUR'}
+
+    def test_numbers_are_sequential_per_company(self):
+        year = timezone.localdate().year
+        numbers = [Invoice.objects.create(company=company, **self.invoice_kwargs).invoice_number
+                   for company in (self.company, self.company, self.other, self.company)]
+        self.assertEqual(numbers, [f'{year}-000001', f'{year}-000002', f'{year}-000001', f'{year}-000003'])
+
+    def test_rolled_back_insert_returns_its_number(self):
+        Invoice.objects.create(company=self.company, **self.invoice_kwargs)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Invoice.objects.create(company=self.company, **self.invoice_kwargs)
+            raise RuntimeError('insert failed')
+        self.assertTrue(Invoice.objects.create(company=self.company, **self.invoice_kwargs)
+                        .invoice_number.endswith('-000002'))
+
+    def test_explicit_numbers_are_kept(self):
+        invoice = Invoice.objects.create(company=self.company, invoice_number='LEGACY-1', **self.invoice_kwargs)
+        self.assertEqual(invoice.invoice_number, 'LEGACY-1')
+
+
+class ExchangeRateTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(owner=owner, company_name='Acme')
+        project = make_project(owner)
+        self.freelancer = Freelancer.objects.create(user=User.objects.create_user(username='free'), hourly_rate=10)
+        self.invoice_kwargs = {'company': self.company, 'freelancer': self.freelancer, 'project': project,
+                               'gig': make_gig(project), 'due_date': '2024-01-01', 'transaction_fee_currency': 'EUR'}
+        today = timezone.localdate()
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write('currency,date,rate\n')
+            handle.write(f'usd,{today - timedelta(days=10)},0.5\n')
+            handle.write(f'USD,{today - timedelta(days=1)},0.8\n')
+            handle.write(f'GBP,{today - timedelta(days=1)},1.25\n')
+        self.addCleanup(os.unlink, handle.name)
+        self.assertEqual(load_rates(read_rate_file(handle.name)), 3)
+        self.client = APIClient()
+        self.client.force_authenticate(owner)
+
+    def test_latest_rate_is_used_and_cached(self):
+        self.assertEqual(get_rate('USD', timezone.localdate()), Decimal('0.8'))
+        with self.assertNumQueries(0):
+            get_rate('USD', timezone.localdate())
+            get_rate('EUR', timezone.localdate())
+        load_rates([('USD', timezone.localdate(), Decimal('0.9'))])
+        self.assertEqual(ExchangeRate.objects.filter(currency='USD').count(), 3)
+        self.assertEqual(get_rate('USD', timezone.localdate()), Decimal('0.9'))
+
+    def test_rates_loaded_by_another_process_apply_after_the_cache_period(self):
+        today = timezone.localdate()
+        with mock.patch('finance.rates.time', return_value=1000.0):
+            self.assertEqual(get_rate('USD', today), Decimal('0.8'))
+            ExchangeRate.objects.filter(currency='USD', date__lte=today).update(rate=Decimal('0.7'))
+            self.assertEqual(get_rate('USD', today), Decimal('0.8'))
+        with mock.patch('finance.rates.time', return_value=1000.0 + settings.EXCHANGE_RATE_CACHE_SECONDS):
+            self.assertEqual(get_rate('USD', today), Decimal('0.7'))
+
+    def test_totals_are_one_query(self):
+        for amount, currency in ((100, 'USD'), (100, 'GBP'), (50, ''), (10, 'JPY')):
+            Invoice.objects.create(amount=amount, paid_currency=currency, **self.invoice_kwargs)
+        get_rate('USD', timezone.localdate())
+        with self.assertNumQueries(1):
+            rows = invoice_totals('USD', group_by='freelancer')
+        # (100 * 0.8 + 100 * 1.25 + 50) / 0.8; the JPY invoice has no rate.
+        self.assertEqual(rows, [{'freelancer': self.freelancer.pk, 'currency': 'USD', 'total': Decimal('318.75'),
+                                 'invoices': 4, 'unconverted': 1}])
+
+    def test_totals_endpoint(self):
+        Invoice.objects.create(amount=100, paid_currency='GBP', **self.invoice_kwargs)
+        response = self.client.get('/finance/invoices/totals/', {'currency': 'EUR'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['company'], self.company.pk)
+        self.assertEqual(Decimal(str(response.json()[0]['total'])), Decimal('125'))
+        self.assertEqual(self.client.get('/finance/invoices/totals/', {'currency': 'JPY'}).status_code, 400)
+        self.assertEqual(self.client.get('/finance/invoices/totals/', {'group_by': 'gig'}).status_code, 400)
+
+
+class OverdueInvoiceTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username='owner', password='secret')
+        company = Company.objects.create(owner=owner, company_name='Acme')
+        project = make_project(owner)
+        freelancer = Freelancer.objects.create(user=User.objects.create_user(username='free'), hourly_rate=10)
+        self.invoice_kwargs = {'company': company, 'freelancer': freelancer, 'project': project,
+                               'gig': make_gig(project), 'amount': 100, 'transaction_fee_currency': 'EUR'}
+
+    def test_unpaid_invoices_past_due_become_overdue_in_chunks(self):
+        from common.models import OutboxEvent
+        from finance.overdue import mark_overdue_invoices
+        today = timezone.localdate()
+        invoices = {(status, days): Invoice.objects.create(status=status, due_date=today + timedelta(days=days),
+                                                           **self.invoice_kwargs)
+                    for status in ('pending', 'approved', 'paid') for days in (-3, -1, 0)}
+        events = OutboxEvent.objects.count()
+
+        self.assertEqual(mark_overdue_invoices(chunk_size=1), 2)
+        self.assertEqual(sorted(Invoice.objects.filter(status='overdue').values_list('pk', flat=True)),
+                         [invoices['pending', -3].pk, invoices['pending', -1].pk])
+        self.assertEqual(OutboxEvent.objects.count(), events + 2)
+        self.assertEqual(mark_overdue_invoices(), 0)
+
+    def test_only_invoices_that_became_overdue_get_events(self):
+        from django.db.models import QuerySet
+        from common.models import OutboxEvent
+        from finance.overdue import mark_overdue_invoices
+        due_date = timezone.localdate() - timedelta(days=1)
+        paid, unpaid = [Invoice.objects.create(status='pending', due_date=due_date, **self.invoice_kwargs)
+                        for _ in range(2)]
+        last_event = OutboxEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        update = QuerySet.update
+
+        def paid_in_between(queryset, **kwargs):
+            if kwargs.get('status') == 'overdue':
+                update(Invoice.objects.filter(pk=paid.pk), status='paid')
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', paid_in_between):
+            self.assertEqual(mark_overdue_invoices(), 1)
+        self.assertEqual(list(OutboxEvent.objects.filter(pk__gt=last_event).values_list('object_id', 'payload__status')),
+                         [(unpaid.pk, 'overdue')])
+
+
+class PayoutTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username='owner', password='secret')
+        company = Company.objects.create(owner=owner, company_name='Acme')
+        project = make_project(owner)
+        self.alice, self.bob = [
+            Freelancer.objects.create(user=User.objects.create_user(username=name, first_name=name.title(),
+                                                                    email=f'{name}@example.com'), hourly_rate=10)
+            for name in ('alice', 'bob')]
+        self.invoice_kwargs = {'company': company, 'project': project, 'gig': make_gig(project),
+                               'due_date': timezone.localdate(), 'transaction_fee_currency': 'EUR'}
+
+    def invoice(self, freelancer, amount, currency='', status='approved', **kwargs):
+        return Invoice.objects.create(freelancer=freelancer, amount=amount, paid_currency=currency, status=status,
+                                      **dict(self.invoice_kwargs, **kwargs))
+
+    def test_run_batches_invoices_per_freelancer_and_currency(self):
+        from common.models import OutboxEvent
+        from finance.models import PayoutBatch
+        from finance.payouts import create_payout_run
+        first = self.invoice(self.alice, 100, transaction_fee=2, tax=10)
+        self.invoice(self.alice, 50)
+        self.invoice(self.alice, 70, 'USD', tax=7)
+        self.invoice(self.bob, 30, transaction_fee=1)
+        pending = self.invoice(self.bob, 40, status='pending')
+        paid = self.invoice(self.bob, 60, status='paid', paid_at=timezone.now())
+        events = OutboxEvent.objects.count()
+
+        run = create_payout_run(chunk_size=3)
+        self.assertEqual((run.invoice_count, run.batch_count), (4, 3))
+        batches = {(batch.freelancer_id, batch.currency): (batch.invoice_count, batch.gross, batch.fees, batch.tax,
+                                                           batch.net)
+                   for batch in PayoutBatch.objects.filter(run=run)}
+        self.assertEqual(batches, {(self.alice.pk, 'EUR'): (2, 150, 2, 10, 138),
+                                   (self.alice.pk, 'USD'): (1, 70, 0, 7, 63), (self.bob.pk, 'EUR'): (1, 30, 1, 0, 29)})
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.paid_amount, first.paid_at, first.payout_batch.run_id),
+                         ('paid', 88, run.created_at, run.pk))
+        self.assertEqual(Invoice.objects.get(pk=pending.pk).payout_batch, None)
+        self.assertEqual(Invoice.objects.get(pk=paid.pk).payout_batch, None)
+        self.assertEqual(OutboxEvent.objects.count(), events + 4)
+        self.assertEqual(OutboxEvent.objects.filter(model='finance.invoice', object_id=first.pk).last().payload,
+                         {'company_id': first.company_id, 'freelancer_id': self.alice.pk, 'status': 'paid',
+                          'invoice_number': first.invoice_number, 'amount': 100})
+        self.assertEqual(create_payout_run().invoice_count, 0)
+
+    def test_paid_out_freelancers_can_be_deleted(self):
+        from finance.models import PayoutBatch
+        from finance.payouts import create_payout_run
+        self.invoice(self.alice, 100)
+        kept = self.invoice(self.bob, 50)
+        run = create_payout_run()
+        self.alice.user.delete()
+        self.assertEqual(list(PayoutBatch.objects.filter(run=run).values_list('freelancer_id', flat=True)),
+                         [self.bob.pk])
+        # Deleting a run unlinks its invoices; they stay paid.
+        run.delete()
+        kept.refresh_from_db()
+        self.assertEqual((kept.status, kept.payout_batch), ('paid', None))
+
+    def test_invoices_whose_deductions_exceed_the_amount_are_left_out(self):
+        from finance.payouts import create_payout_run
+        overdrawn = self.invoice(self.alice, 10, transaction_fee=6, tax=5)
+        self.invoice(self.alice, 100, transaction_fee=6, tax=5)
+        with self.assertLogs('finance.payouts', 'WARNING') as logs:
+            run = create_payout_run()
+        self.assertIn('1 invoice', logs.output[0])
+        self.assertEqual(run.invoice_count, 1)
+        overdrawn.refresh_from_db()
+        self.assertEqual((overdrawn.status, overdrawn.payout_batch, overdrawn.paid_amount), ('approved', None, None))
+
+    def test_blank_currency_is_the_base_currency(self):
+        from finance.models import PayoutBatch
+        from finance.payouts import create_payout_run
+        blank = self.invoice(self.alice, 100)
+        self.invoice(self.alice, 50, 'EUR')
+        run = create_payout_run()
+        self.assertEqual(list(PayoutBatch.objects.filter(run=run).values_list('currency', 'invoice_count', 'gross')),
+                         [('EUR', 2, 150)])
+        blank.refresh_from_db()
+        self.assertEqual((blank.paid_currency, blank.payout_batch.currency), ('EUR', 'EUR'))
+
+    def test_fees_in_another_currency_are_converted(self):
+        from finance.models import PayoutBatch
+        from finance.payouts import create_payout_run
+        load_rates([('USD', timezone.localdate(), Decimal('0.5'))])
+        self.addCleanup(cached_rate.cache_clear)
+        converted = self.invoice(self.alice, 100, transaction_fee=4, transaction_fee_currency='USD')
+        unconvertible = self.invoice(self.bob, 100, transaction_fee=4, transaction_fee_currency='GBP')
+        self.invoice(self.bob, 30, transaction_fee=0, transaction_fee_currency='GBP')
+
+        with self.assertLogs('finance.payouts', 'WARNING'):
+            run = create_payout_run()
+        self.assertEqual(run.invoice_count, 2)
+        converted.refresh_from_db()
+        self.assertEqual(converted.paid_amount, 98)
+        self.assertEqual(PayoutBatch.objects.get(run=run, freelancer=self.alice).fees, 2)
+        unconvertible.refresh_from_db()
+        self.assertEqual((unconvertible.status, unconvertible.payout_batch), ('approved', None))
+
+    def test_statements_do_not_grow_with_invoices(self):
+        from finance.payouts import create_payout_run
+
+        def statements(count):
+            for index in range(count):
+                self.invoice((self.alice, self.bob)[index % 2], 10, ('', 'USD')[index % 3 == 0])
+            with CaptureQueriesContext(connection) as queries:
+                create_payout_run(chunk_size=1000)
+            return len(queries)
+
+        self.assertEqual(statements(4), statements(40))
+
+    def test_batch_sums_follow_the_claimed_invoices(self):
+        from finance.models import PayoutBatch
+        from finance.payouts import create_payout_run, refresh_batch_sums
+        self.invoice(self.alice, 100, tax=5)
+        run = create_payout_run()
+        PayoutBatch.objects.filter(run=run).update(invoice_count=9, gross=0, net=0)
+        refresh_batch_sums(run)
+        self.assertEqual(PayoutBatch.objects.filter(run=run).values_list('invoice_count', 'gross', 'tax', 'net').get(),
+                         (1, 100, 5, 95))
+
+    def test_payout_file_is_streamed_to_admins(self):
+        self.invoice(self.alice, 100, transaction_fee=2)
+        self.invoice(self.bob, 30, 'USD')
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser(username='admin', password='secret'))
+        response = client.post('/finance/payouts/')
+        self.assertEqual((response.status_code, response.data['invoice_count']), (201, 2))
+
+        response = client.get(f'/finance/payouts/{response.data["id"]}/csv/')
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'batch,freelancer,name,email,currency,invoices,gross,fees,tax,net')
+        self.assertEqual([line.split(',')[2:] for line in lines[1:]],
+                         [['Alice', 'alice@example.com', 'EUR', '1', '100', '2', '0', '98'],
+                          ['Bob', 'bob@example.com', 'USD', '1', '30', '0', '0', '30']])
+
+        client.force_authenticate(self.alice.user)
+        self.assertEqual(client.post('/finance/payouts/').status_code, 403)
+
+
+class InvoiceNumberConcurrencyTests(TransactionTestCase):
+    writers = 8
+    invoices_per_writer = 25
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Parallel writers need a database that allows concurrent connections.')
+        owner = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(owner=owner, company_name='Acme')
+        project = make_project(owner)
+        freelancer = Freelancer.objects.create(user=User.objects.create_user(username='free'), hourly_rate=10)
+        self.invoice_kwargs = {'company': self.company, 'freelancer': freelancer, 'project': project,
+                               'gig': make_gig(project), 'amount': 100, 'due_date': '2024-01-01',
+                               'transaction_fee_currency': 'EUR'}
+
+    def run_writers(self, write):
+        errors = []
+
+        def writer():
+            try:
+                for _ in range(self.invoices_per_writer):
+                    write()
+            except Exception as error:  # surfaced in the main thread below
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer) for _ in range(self.writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_parallel_writers_get_gapless_unique_numbers(self):
+        self.run_writers(lambda: Invoice.objects.create(**self.invoice_kwargs))
+        total = self.writers * self.invoices_per_writer
+        year = timezone.localdate().year
+        self.assertEqual(sorted(Invoice.objects.values_list('invoice_number', flat=True)),
+                         [f'{year}-{number:06d}' for number in range(1, total + 1)])
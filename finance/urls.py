@@ -0,0 +1,12 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+
+from finance.views import InvoiceViewSet, PayoutRunViewSet
+
+router = DefaultRouter()
+router.register(r'invoices', InvoiceViewSet)
+router.register(r'payouts', PayoutRunViewSet)
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
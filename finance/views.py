@@ -1,3 +1,95 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from rest_framework import viewsets, mixins, status
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.response import Response
 
-# Create your views here.
+from common.archive import IncludeArchivedMixin
+from common.sync import DeltaSyncMixin
+from .filters import InvoiceFilter
+from .models import Invoice, ArchivedInvoice, PayoutRun
+from .payouts import create_payout_run, payout_csv
+from .rates import invoice_totals, MissingRate, GROUPS
+from .serializers import InvoiceSerializer, PayoutRunSerializer
+
+
+def visible_to(user):
+    # Invoices are visible to the company owner and to the invoiced freelancer
+    return Q(company__owner=user) | Q(freelancer__user=user)
+
+
+class InvoiceViewSet(IncludeArchivedMixin, DeltaSyncMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Invoice.objects.all()
+    serializer_class = InvoiceSerializer
+    filterset_class = InvoiceFilter
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):  # schema generation, see common/schema.py
+            return Invoice.objects.none()
+        return Invoice.objects.filter(visible_to(self.request.user))
+
+    def get_archived_queryset(self):
+        return ArchivedInvoice.objects.filter(visible_to(self.request.user))
+
+    @action(detail=False, methods=['get'])
+    def totals(self, request):
+        """
+        Invoice totals converted into a reporting currency, computed in one query.
+
+        Query params:
+        - currency: reporting currency (defaults to the base currency)
+        - group_by: "company" or "freelancer" (defaults to "company")
+        - the usual invoice filters narrow the invoices that are summed
+
+        Archived invoices are always summed: totals cover the whole history.
+
+        Returns:
+        - 200 OK with one row per company/freelancer
+        - 400 Bad Request for an unknown grouping or a currency without a rate
+        """
+        group_by = request.query_params.get('group_by', 'company')
+        if group_by not in GROUPS:
+            return Response({"error": "group_by must be one of: " + ", ".join(GROUPS)},
+                            status=status.HTTP_400_BAD_REQUEST)
+        currency = request.query_params.get('currency') or settings.EXCHANGE_RATE_BASE_CURRENCY
+        queryset = self.filter_queryset(self.get_queryset())
+        archived = self.filter_archived_queryset(self.get_archived_queryset())
+        try:
+            rows = invoice_totals(currency, group_by=group_by, queryset=queryset, archived=archived)
+        except MissingRate as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(rows)
+
+
+class PayoutRunViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = PayoutRun.objects.order_by('-created_at')
+    serializer_class = PayoutRunSerializer
+    permission_classes = [IsAdminUser]
+
+    def create(self, request, *args, **kwargs):
+        """
+        Pay every approved, unpaid invoice, batched per freelancer and currency.
+
+        Returns:
+        - 201 Created with the run
+        """
+        run = create_payout_run(created_by=request.user)
+        return Response(self.get_serializer(run).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def csv(self, request, pk=None):
+        """
+        The run's payout file: one CSV line per freelancer and currency,
+        streamed as it is read.
+
+        Returns:
+        - 200 OK with the CSV
+        - 404 Not Found for an unknown run
+        """
+        run = self.get_object()
+        response = StreamingHttpResponse(payout_csv(run), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="payout-{run.pk}.csv"'
+        return response
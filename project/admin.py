@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.admin import DateFieldListFilter
 
+from common.admin_utils import KeysetPaginator
 from .models import Gig, Project, ProjectReport, GigReport, GigApplication, ProjectApplication
 
 # Register your models here.
@@ -13,6 +14,9 @@ admin.site.register(ProjectApplication)
 class GigReportAdmin(admin.ModelAdmin):
     list_display = (
         'freelancer', 'gig', 'submitted_at', 'start_time', 'end_time', 'status', 'reviewed_by', 'hours_spent')
+    list_select_related = ('freelancer__user', 'gig', 'reviewed_by')
+    paginator = KeysetPaginator
+    show_full_result_count = False
     readonly_fields = ('hours_spent', 'submitted_at')
     fields = (
         'freelancer', 'gig', 'document', 'text', 'start_time', 'end_time', 'status', 'reviewed_by',
@@ -28,6 +32,9 @@ class GigReportAdmin(admin.ModelAdmin):
 class GigApplicationAdmin(admin.ModelAdmin):
     list_display = ('freelancer', 'gig', 'status', 'created_at')
     list_filter = ('status',('created_at', DateFieldListFilter))
+    list_select_related = ('freelancer__user', 'gig')
+    paginator = KeysetPaginator
+    show_full_result_count = False
 
 
 admin.site.register(GigApplication, GigApplicationAdmin)
@@ -1,6 +1,30 @@
 from django.apps import AppConfig
+from django.db.models import Q
+from django.db.models.signals import post_migrate
 
 
 class ProjectConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'project'
+
+    def ready(self):
+        from common import archive, outbox
+        from . import search, ratings  # noqa: F401  register the search index and rating signal handlers
+        from .models import Project, Gig, GigApplication, ProjectApplication, GigReport, ArchivedGigReport, \
+            ArchivedGigApplication
+
+        post_migrate.connect(search.create_search_index, sender=self)
+
+        outbox.track(Project, ('associated_user_id', 'status', 'category'))
+        outbox.track(Gig, ('project_id', 'user_id', 'status', 'accepted_count'))
+        outbox.track(GigApplication, ('gig_id', 'freelancer_id', 'status'), owned_by={
+            'owner_id': 'gig__project__associated_user_id', 'applicant_id': 'freelancer__user_id'})
+        outbox.track(ProjectApplication, ('project_id', 'freelancer_id', 'status'), owned_by={
+            'owner_id': 'project__associated_user_id', 'applicant_id': 'freelancer__user_id'})
+        outbox.track(GigReport, ('gig_id', 'freelancer_id', 'status'))
+
+        def closed_project(cutoff):
+            return Q(gig__project__status='closed', gig__project__end_date__lt=cutoff.date())
+
+        archive.register(GigReport, ArchivedGigReport, closed_project)
+        archive.register(GigApplication, ArchivedGigApplication, closed_project)
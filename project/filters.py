@@ -0,0 +1,51 @@
+from django_filters import rest_framework as filters
+
+from .models import Project, Gig, GigApplication, ProjectApplication
+
+
+class ProjectFilter(filters.FilterSet):
+    ordering = filters.OrderingFilter(fields=('start_date', 'created_at'))
+
+    class Meta:
+        model = Project
+        fields = {
+            'status': ['exact'],
+            'category': ['exact'],
+            'start_date': ['exact', 'gte', 'lte'],
+        }
+
+
+class GigFilter(filters.FilterSet):
+    ordering = filters.OrderingFilter(fields=('start', 'created_at'))
+
+    class Meta:
+        model = Gig
+        fields = {
+            'status': ['exact'],
+            'project': ['exact'],
+            'start': ['gte', 'lte'],
+        }
+
+
+class GigApplicationFilter(filters.FilterSet):
+    ordering = filters.OrderingFilter(fields=('created_at',))
+
+    class Meta:
+        model = GigApplication
+        fields = {
+            'status': ['exact'],
+            'gig': ['exact'],
+            'freelancer': ['exact'],
+        }
+
+
+class ProjectApplicationFilter(filters.FilterSet):
+    ordering = filters.OrderingFilter(fields=('updated_at',))
+
+    class Meta:
+        model = ProjectApplication
+        fields = {
+            'status': ['exact'],
+            'project': ['exact'],
+            'freelancer': ['exact'],
+        }
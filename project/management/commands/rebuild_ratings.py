@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from project.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute the freelancer ratings and leaderboards from the approved gig reports.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Number of reports read and ratings written per batch.')
+
+    def handle(self, *args, **options):
+        total = rebuild_ratings(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Counted {total} reviews.'))
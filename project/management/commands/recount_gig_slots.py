@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from project.models import Gig
+
+
+class Command(BaseCommand):
+    help = 'Recompute Gig.accepted_count from the accepted applications, e.g. after a bulk import.'
+
+    def handle(self, *args, **options):
+        updated = Gig.objects.recount_accepted()
+        self.stdout.write(self.style.SUCCESS(f'Recounted {updated} gigs.'))
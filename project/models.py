@@ -1,9 +1,13 @@
 from datetime import timedelta, date
 
-from django.db import models
-from django.db.models.signals import post_save
+from django.db import models, transaction
+from django.db.models import F, Q, Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 
+from common.outbox import append_event, append_events, append_queryset_events, UPDATED
 from finance.models import Invoice
 
 DOCUMENT_MODEL = 'common.Document'
@@ -12,6 +16,113 @@ FREELANCER_MODEL = 'user.Freelancer'
 COMPANY_MODEL = 'user.Company'
 
 
+class OwnedQuerySet(models.QuerySet):
+    """
+    Queryset for rows owned through a relation path to a user. Ownership is
+    resolved in SQL, so a whole page or batch is checked in the same query.
+    """
+    owner_lookup = None
+
+    def with_owner(self):
+        """Annotate ``owner_id`` so permission checks need no related rows."""
+        return self.annotate(owner_id=F(self.owner_lookup))
+
+    def owned_by(self, user):
+        return self.filter(**{self.owner_lookup: user})
+
+    def owner_id_of(self, pk):
+        return self.filter(pk=pk).values_list(self.owner_lookup, flat=True).first()
+
+
+ACCEPTED = 'accepted'
+ALREADY_ACCEPTED = 'already_accepted'
+GIG_FULL = 'gig_full'
+
+
+class GigQuerySet(models.QuerySet):
+    def with_free_slots(self):
+        return self.filter(Q(number_of_freelancers__isnull=True) | Q(accepted_count__lt=F('number_of_freelancers')))
+
+    def recount_accepted(self):
+        """
+        Recompute ``accepted_count`` from the applications, e.g. after bulk
+        loads. Archived applications still hold their slots.
+        """
+        def accepted(model):
+            return Coalesce(Subquery(model.objects.filter(gig=OuterRef('pk'), status=1).order_by()
+                                     .values('gig').annotate(count=Count('pk')).values('count')), Value(0))
+
+        actual = accepted(GigApplication) + accepted(ArchivedGigApplication)
+        # Only stale rows are written, so delta sync clients and the outbox see just the corrected gigs.
+        now = timezone.now()
+        updated = self.alias(actual=actual).exclude(accepted_count=F('actual')) \
+            .update(accepted_count=actual, updated_at=now)
+        if updated:
+            append_queryset_events(self.filter(updated_at=now))
+        return updated
+
+
+class BaseGigApplicationQuerySet(OwnedQuerySet):
+    owner_lookup = 'gig__project__associated_user'
+
+    def visible_to(self, user):
+        # The owner of the gig or the freelancer who submitted the application
+        return self.filter(Q(gig__project__associated_user=user) | Q(freelancer__user=user))
+
+
+class GigApplicationQuerySet(BaseGigApplicationQuerySet):
+    def accept(self, application):
+        """
+        Accept an application if its gig has a free slot.
+
+        Both steps are conditional UPDATEs, so concurrent accepts never overfill
+        a gig and never read-modify-write the counter. Returns ``ACCEPTED``,
+        ``ALREADY_ACCEPTED`` or ``GIG_FULL``.
+        """
+        with transaction.atomic(using=self.db):
+            now = timezone.now()
+            if not self.filter(pk=application.pk).exclude(status=1).update(status=1, updated_at=now):
+                return ALREADY_ACCEPTED
+            reserved = Gig.objects.using(self.db).filter(pk=application.gig_id).with_free_slots() \
+                .update(accepted_count=F('accepted_count') + 1, updated_at=now)
+            if not reserved:
+                transaction.set_rollback(True, using=self.db)
+                return GIG_FULL
+            application.status = 1  # Accepted
+            append_event(application, UPDATED, using=self.db)
+            append_queryset_events(Gig.objects.using(self.db).filter(pk=application.gig_id))
+        return ACCEPTED
+
+    def reject(self, ids):
+        """Reject the applications with the given ids, releasing the slots of accepted ones."""
+        with transaction.atomic(using=self.db):
+            now = timezone.now()
+            released = []
+            for pk, gig_id in self.filter(pk__in=ids, status=1).values_list('pk', 'gig_id'):
+                # Only the writer that flips the status releases the slot.
+                if self.filter(pk=pk, status=1).update(status=2, updated_at=now):
+                    if Gig.objects.using(self.db).filter(pk=gig_id, accepted_count__gt=0) \
+                            .update(accepted_count=F('accepted_count') - 1, updated_at=now):
+                        released.append(gig_id)
+            self.filter(pk__in=ids).exclude(status=1).update(status=2, updated_at=now)
+            append_events(self.model, ids, using=self.db)
+            if released:
+                append_queryset_events(Gig.objects.using(self.db).filter(pk__in=released))
+
+
+class ProjectApplicationQuerySet(OwnedQuerySet):
+    owner_lookup = 'project__associated_user'
+
+    def visible_to(self, user):
+        # The owner of the project or the freelancer who submitted the application
+        return self.filter(Q(project__associated_user=user) | Q(freelancer__user=user))
+
+    def reject(self, ids):
+        with transaction.atomic(using=self.db):
+            self.filter(pk__in=ids).update(status=2, updated_at=timezone.now())  # Rejected
+            append_events(self.model, ids, using=self.db)
+
+
 # Create your models here.
 class Project(models.Model):
     title = models.CharField(max_length=100)
@@ -31,6 +142,14 @@ class Project(models.Model):
     freelancers = models.ManyToManyField(FREELANCER_MODEL, related_name='freelancers', blank=True)
     reports = models.ManyToManyField(DOCUMENT_MODEL, related_name='project_reports', blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'start_date'], name='project_status_start_idx'),
+            models.Index(fields=['category', 'start_date'], name='project_category_start_idx'),
+            models.Index(fields=['start_date'], name='project_start_idx'),
+            models.Index(fields=['updated_at'], name='project_updated_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -52,6 +171,18 @@ class Gig(models.Model):
     reports = models.ManyToManyField(DOCUMENT_MODEL, related_name='gig_reports', blank=True)
     freelancers = models.ManyToManyField(FREELANCER_MODEL, related_name='gig_freelancers', blank=True)
     number_of_freelancers = models.IntegerField(blank=True, null=True)
+    # Slots taken by accepted applications, maintained by GigApplicationQuerySet.accept/reject
+    accepted_count = models.PositiveIntegerField(default=0)
+
+    objects = GigQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'start'], name='gig_status_start_idx'),
+            models.Index(fields=['project', 'start'], name='gig_project_start_idx'),
+            models.Index(fields=['start'], name='gig_start_idx'),
+            models.Index(fields=['updated_at'], name='gig_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -70,6 +201,10 @@ class GigReport(models.Model):
     reviewed_by = models.ForeignKey(USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
                                     related_name='reviewed_reports')
     review = models.JSONField(blank=True, null=True)
+    # Stars currently counted in FreelancerRating for this report and the [kind, key]
+    # boards they were counted on, see project.ratings.
+    rated_stars = models.PositiveSmallIntegerField(blank=True, null=True, editable=False)
+    rated_boards = models.JSONField(blank=True, null=True, editable=False)
 
     @property
     def hours_spent(self):
@@ -78,6 +213,33 @@ class GigReport(models.Model):
         return timedelta(0)  # Return zero if either start_time or end_time is None
 
 
+class FreelancerRating(models.Model):
+    """
+    Running review sums for one freelancer in one leaderboard: a project
+    category, a skill, or the overall board (``OVERALL`` with an empty key).
+    ``score`` is the Bayesian average maintained by ``project.ratings``.
+    """
+    OVERALL = 'overall'
+    CATEGORY = 'category'
+    SKILL = 'skill'
+
+    freelancer = models.ForeignKey(FREELANCER_MODEL, on_delete=models.CASCADE, related_name='ratings')
+    kind = models.CharField(max_length=10, choices=[(OVERALL, 'Overall'), (CATEGORY, 'Category'), (SKILL, 'Skill')])
+    key = models.CharField(max_length=100, blank=True)
+    count = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    score = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'key', 'freelancer'], name='freelancer_rating_unique'),
+        ]
+        indexes = [
+            # Leaderboard pages are a range scan of this index.
+            models.Index(fields=['kind', 'key', '-score', '-freelancer'], name='freelancer_rating_rank_idx'),
+        ]
+
+
 class ProjectReport(models.Model):
     user = models.ForeignKey(USER_MODEL, on_delete=models.CASCADE)
     project = models.ForeignKey(Project, on_delete=models.CASCADE, blank=True, null=True,
@@ -92,16 +254,91 @@ class GigApplication(models.Model):
     gig = models.ForeignKey(Gig, on_delete=models.CASCADE, related_name='applications')
     status = models.IntegerField(choices=[(0, 'Pending'), (1, 'Accepted'), (2, 'Rejected')])
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = GigApplicationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['gig', 'status'], name='gigapp_gig_status_idx'),
+            models.Index(fields=['freelancer', 'status'], name='gigapp_freelancer_status_idx'),
+            models.Index(fields=['status', 'created_at'], name='gigapp_status_created_idx'),
+            models.Index(fields=['updated_at'], name='gigapp_updated_idx'),
+        ]
 
     def __str__(self):
         return f'{self.freelancer.user.first_name} applied for {self.gig}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The gig as loaded, so moving the application to another gig recounts both.
+        instance.loaded_gig_id = instance.__dict__.get('gig_id')
+        return instance
+
 
 class ProjectApplication(models.Model):
     freelancer = models.ForeignKey(FREELANCER_MODEL, on_delete=models.CASCADE,
                                    related_name='freelancer_project_application')
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='project_application')
     status = models.IntegerField(choices=[(0, 'Pending'), (1, 'Accepted'), (2, 'Rejected')])
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProjectApplicationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='projectapp_status_updated_idx'),
+            models.Index(fields=['updated_at'], name='projectapp_updated_idx'),
+        ]
+
+
+class ArchivedGigReport(models.Model):
+    """
+    A report of a closed project moved out of ``GigReport`` by
+    ``common.archive``: the same columns and ids, plus ``archived_at``.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    freelancer = models.ForeignKey(FREELANCER_MODEL, on_delete=models.CASCADE, related_name='archived_gig_reports')
+    gig = models.ForeignKey(Gig, on_delete=models.CASCADE, blank=True, null=True, related_name='archived_reports')
+    document = models.ManyToManyField(DOCUMENT_MODEL, related_name='archived_gig_report_document', blank=True)
+    text = models.TextField(blank=True)
+    submitted_at = models.DateTimeField()
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    status = models.CharField(max_length=100, choices=GigReport._meta.get_field('status').choices)
+    reviewed_by = models.ForeignKey(USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='archived_reviewed_reports')
+    review = models.JSONField(blank=True, null=True)
+    rated_stars = models.PositiveSmallIntegerField(blank=True, null=True, editable=False)
+    rated_boards = models.JSONField(blank=True, null=True, editable=False)
+    archived_at = models.DateTimeField()
+
+    hours_spent = GigReport.hours_spent
+
+
+class ArchivedGigApplication(models.Model):
+    """An application to a gig of a closed project, moved out of ``GigApplication``."""
+    id = models.BigIntegerField(primary_key=True)
+    freelancer = models.ForeignKey(FREELANCER_MODEL, on_delete=models.CASCADE,
+                                   related_name='archived_applications')
+    gig = models.ForeignKey(Gig, on_delete=models.CASCADE, related_name='archived_applications')
+    status = models.IntegerField(choices=GigApplication._meta.get_field('status').choices)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    objects = BaseGigApplicationQuerySet.as_manager()
+
+
+@receiver(post_save, sender=GigApplication)
+@receiver(post_delete, sender=GigApplication)
+def recount_gig_slots(sender, instance, raw=False, using=None, **kwargs):
+    # accept() and reject() keep the counter with conditional UPDATEs; other saves and deletes recount the gig.
+    if not raw:
+        gig_ids = {instance.gig_id, getattr(instance, 'loaded_gig_id', None)} - {None}
+        Gig.objects.using(using).filter(pk__in=gig_ids).recount_accepted()
+        instance.loaded_gig_id = instance.gig_id
 
 
 @receiver(post_save, sender=GigReport)
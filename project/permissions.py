@@ -1,11 +1,13 @@
 from rest_framework import permissions
 
-from project.models import GigApplication, ProjectApplication
-
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
     """
     Custom permission to only allow owners of an object to edit it.
+
+    The owner is read from the ``owner_id`` annotation added by
+    ``OwnedQuerySet.with_owner()``; objects loaded without it fall back to a
+    single ``values_list`` lookup. Related rows are never loaded.
     """
 
     def has_object_permission(self, request, view, obj):
@@ -15,8 +17,10 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
             return True
 
         # Write permissions are only allowed to the owner of the project or gig.
-        if isinstance(obj, GigApplication):
-            return obj.gig.project.associated_user == request.user
-        elif isinstance(obj, ProjectApplication):
-            return obj.project.associated_user == request.user
-        return False
+        manager = type(obj)._default_manager
+        if not hasattr(manager, 'owner_id_of'):
+            return False
+        owner_id = getattr(obj, 'owner_id', None)
+        if owner_id is None:
+            owner_id = manager.owner_id_of(obj.pk)
+        return owner_id is not None and owner_id == request.user.pk
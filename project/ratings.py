@@ -0,0 +1,216 @@
+"""
+Freelancer ratings and leaderboards.
+
+Approved gig reports carry a star rating in ``review['rating']``. A counted
+review adds to the running sums of the freelancer's ``FreelancerRating`` rows:
+the overall board, the category of the gig's project and every skill in the
+freelancer's profile. ``GigReport.rated_stars`` and ``rated_boards`` record what
+a report currently contributes and to which boards, so saving a report again
+changes nothing, and edits, rejections and deletions are taken off the boards
+the stars were added to, even if the freelancer's skills or the project's
+category changed since.
+
+Scores are Bayesian averages ``(C * m + total) / (C + count)`` with the prior
+mean ``m`` and weight ``C`` from settings. They depend only on the row's own
+sums, so every update is a single SQL statement and a leaderboard page is a
+range scan of ``freelancer_rating_rank_idx``.
+"""
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Value, FloatField
+from django.db.models.functions import Cast
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from user.models import Freelancer
+from .models import FreelancerRating, GigReport, Project, ArchivedGigReport
+
+MIN_STARS = 1
+MAX_STARS = 5
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def stars_from(status, review):
+    """The star rating a report counts with, or ``None`` if it does not count."""
+    if status != 'approved' or not isinstance(review, dict):
+        return None
+    stars = review.get('rating')
+    if isinstance(stars, bool) or not isinstance(stars, (int, float)) or stars != int(stars):
+        return None
+    return int(stars) if MIN_STARS <= stars <= MAX_STARS else None
+
+
+def board_keys(category, skills):
+    """The ``(kind, key)`` leaderboards a review for this category and skill list feeds."""
+    keys = [(FreelancerRating.OVERALL, '')]
+    if category:
+        keys.append((FreelancerRating.CATEGORY, category))
+    if isinstance(skills, list):
+        keys.extend((FreelancerRating.SKILL, skill.lower())
+                    for skill in dict.fromkeys(skill for skill in skills if isinstance(skill, str) and skill))
+    return keys
+
+
+def bayesian_score(count, total):
+    prior_count = settings.RATING_PRIOR_COUNT
+    return (prior_count * settings.RATING_PRIOR_MEAN + total) / (prior_count + count)
+
+
+def apply_delta(freelancer_id, keys, count_delta, total_delta, using=None):
+    """Add ``count_delta`` reviews worth ``total_delta`` stars to the freelancer's boards."""
+    ratings = FreelancerRating.objects.using(using)
+    if count_delta > 0:
+        # Removals only touch existing rows, so a cascade that already deleted them stays deleted.
+        ratings.bulk_create([FreelancerRating(freelancer_id=freelancer_id, kind=kind, key=key,
+                                              score=bayesian_score(0, 0)) for kind, key in keys],
+                            ignore_conflicts=True)
+    prior_count = settings.RATING_PRIOR_COUNT
+    prior_total = Value(float(prior_count * settings.RATING_PRIOR_MEAN), output_field=FloatField())
+    # ``score`` is assigned first so it reads the old sums on every backend; MySQL
+    # evaluates SET assignments left to right.
+    ratings.filter(reduce(or_, (Q(kind=kind, key=key) for kind, key in keys)), freelancer_id=freelancer_id).update(
+        score=(prior_total + Cast(F('total') + total_delta, FloatField()))
+        / Cast(F('count') + (count_delta + prior_count), FloatField()),
+        count=F('count') + count_delta,
+        total=F('total') + total_delta,
+    )
+
+
+def report_keys(report, using=None):
+    category = Project.objects.using(using).filter(project_projects=report.gig_id) \
+        .values_list('category', flat=True).first() if report.gig_id else None
+    skills = Freelancer.objects.using(using).filter(pk=report.freelancer_id).values_list('skill', flat=True).first()
+    return board_keys(category, skills)
+
+
+def counted_keys(report, boards, using=None):
+    """The boards a counted report was added to; reports counted before boards were recorded use the current ones."""
+    return [tuple(board) for board in boards] if boards is not None else report_keys(report, using)
+
+
+def record_review(report, using=None):
+    """
+    Bring the freelancer's ratings in line with ``report``. Returns whether
+    anything changed.
+    """
+    stars = stars_from(report.status, report.review)
+    with transaction.atomic(using=using):
+        reports = GigReport.objects.using(using).filter(pk=report.pk)
+        counted, boards = reports.select_for_update().values_list('rated_stars', 'rated_boards').first() \
+            or (None, None)
+        if counted == stars:
+            return False
+        old_keys = counted_keys(report, boards, using) if counted is not None else []
+        new_keys = report_keys(report, using) if stars is not None else []
+        if old_keys == new_keys:
+            apply_delta(report.freelancer_id, new_keys, 0, stars - counted, using)
+        else:
+            if old_keys:
+                apply_delta(report.freelancer_id, old_keys, -1, -counted, using)
+            if new_keys:
+                apply_delta(report.freelancer_id, new_keys, 1, stars, using)
+        report.rated_stars, report.rated_boards = stars, new_keys or None
+        reports.update(rated_stars=stars, rated_boards=report.rated_boards)
+    return True
+
+
+def leaderboard(kind, key='', after=None, limit=None):
+    """
+    One page of a leaderboard, best first. ``after`` is the cursor returned
+    with the previous page. Returns ``(rows, next_cursor)``.
+    """
+    limit = limit or settings.RATING_LEADERBOARD_PAGE_SIZE
+    rows = FreelancerRating.objects.filter(kind=kind, key=key, count__gt=0)
+    if after:
+        score, freelancer_id = parse_cursor(after)
+        rows = rows.filter(Q(score__lt=score) | Q(score=score, freelancer_id__lt=freelancer_id))
+    rows = list(rows.order_by('-score', '-freelancer_id')
+                .values('freelancer_id', 'score', 'count', 'total')[:limit + 1])
+    cursor = format_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return [serialize_row(row) for row in rows[:limit]], cursor
+
+
+def format_cursor(row):
+    return f"{row['score']!r}:{row['freelancer_id']}"
+
+
+def parse_cursor(cursor):
+    score, _, freelancer_id = cursor.partition(':')
+    try:
+        return float(score), int(freelancer_id)
+    except ValueError:
+        raise InvalidCursor(cursor)
+
+
+def serialize_row(row):
+    return {
+        'freelancer': row['freelancer_id'],
+        'score': round(row['score'], 3),
+        'reviews': row['count'],
+        'average': round(row['total'] / row['count'], 2),
+    }
+
+
+def rebuild_ratings(chunk_size=2000):
+    """
+    Recompute every leaderboard from the approved reports, e.g. after bulk
+    loads or changes to the prior. Returns the number of reviews counted.
+    """
+    # Archived reports (common.archive) keep counting.
+    models = (GigReport, ArchivedGigReport)
+    skills = dict(Freelancer.objects.filter(
+        reduce(or_, (Q(pk__in=model.objects.filter(status='approved').values('freelancer_id')) for model in models))
+    ).values_list('pk', 'skill'))
+    sums = defaultdict(lambda: [0, 0])
+    # model -> (stars, boards) -> report ids
+    report_ids = {model: defaultdict(list) for model in models}
+    for model in models:
+        reports = model.objects.filter(status='approved') \
+            .values_list('pk', 'freelancer_id', 'review', 'gig__project__category')
+        for pk, freelancer_id, review, category in reports.iterator(chunk_size=chunk_size):
+            stars = stars_from('approved', review)
+            if stars is None:
+                continue
+            keys = tuple(board_keys(category, skills.get(freelancer_id)))
+            report_ids[model][stars, keys].append(pk)
+            for kind, key in keys:
+                counts = sums[freelancer_id, kind, key]
+                counts[0] += 1
+                counts[1] += stars
+
+    with transaction.atomic():
+        FreelancerRating.objects.all().delete()
+        FreelancerRating.objects.bulk_create(
+            [FreelancerRating(freelancer_id=freelancer_id, kind=kind, key=key, count=count, total=total,
+                              score=bayesian_score(count, total))
+             for (freelancer_id, kind, key), (count, total) in sums.items()],
+            batch_size=chunk_size)
+        for model, ids_by_review in report_ids.items():
+            model.objects.exclude(rated_stars=None, rated_boards__isnull=True).update(rated_stars=None, rated_boards=None)
+            for (stars, keys), ids in ids_by_review.items():
+                for start in range(0, len(ids), chunk_size):
+                    model.objects.filter(pk__in=ids[start:start + chunk_size]).update(
+                        rated_stars=stars, rated_boards=[list(key) for key in keys])
+    return sum(len(ids) for ids_by_review in report_ids.values() for ids in ids_by_review.values())
+
+
+@receiver(post_save, sender=GigReport)
+def count_review(sender, instance, created=False, raw=False, using=None, **kwargs):
+    if raw or (created and stars_from(instance.status, instance.review) is None):
+        return
+    record_review(instance, using)
+
+
+@receiver(post_delete, sender=GigReport)
+@receiver(post_delete, sender=ArchivedGigReport)
+def uncount_review(sender, instance, using=None, **kwargs):
+    if instance.rated_stars is not None:
+        apply_delta(instance.freelancer_id, counted_keys(instance, instance.rated_boards, using), -1,
+                    -instance.rated_stars, using)
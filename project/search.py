@@ -0,0 +1,243 @@
+"""
+Full-text search over projects and gigs.
+
+The index lives next to the ORM tables and is kept in sync with ``Project`` and
+``Gig`` rows through ``post_save``/``post_delete`` signals, so index writes share
+the transaction of the row change. The backend is pluggable through
+``settings.SEARCH_BACKEND``; the default keeps an SQLite FTS5 virtual table.
+``manage.py migrate`` creates the index (a ``post_migrate`` handler registered
+by the project app), and ``rebuild_search_index`` creates it if it is missing.
+"""
+import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection as default_connection, connections
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import Project, Gig
+
+PROJECT = 'project'
+GIG = 'gig'
+KINDS = (PROJECT, GIG)
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class BaseSearchBackend(ABC):
+    """
+    Interface every search backend implements.
+
+    Documents are identified by ``(kind, object_id)`` where ``kind`` is one of
+    ``KINDS``. ``search`` returns a list of dicts ordered by relevance.
+    ``create_index`` must be idempotent; it runs after every migrate.
+    """
+
+    @abstractmethod
+    def create_index(self, connection):
+        pass
+
+    @abstractmethod
+    def index(self, kind, rows, connection=None):
+        pass
+
+    @abstractmethod
+    def remove(self, kind, object_ids, connection=None):
+        pass
+
+    @abstractmethod
+    def clear(self, connection=None):
+        pass
+
+    @abstractmethod
+    def search(self, query, kind=None, status=None, category=None, limit=20, offset=0, connection=None):
+        pass
+
+    def index_projects(self, projects, connection=None):
+        self.index(PROJECT, [project_document(project) for project in projects], connection)
+
+    def index_gigs(self, gigs, connection=None):
+        self.index(GIG, [gig_document(gig) for gig in gigs], connection)
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    SQLite FTS5 backend.
+
+    Rowids encode both the kind and the primary key (``pk * 2 + kind``), so
+    updates and deletes are rowid lookups rather than scans of the unindexed
+    columns. Ranking uses the table's configured ``rank`` (weighted bm25), which
+    lets FTS5 stop early for ``ORDER BY rank LIMIT n``.
+    """
+    table = 'project_search_index'
+    weights = (10.0, 2.0, 1.0)  # title, description, text_requirements
+
+    def create_index(self, connection):
+        if connection.vendor != 'sqlite':
+            raise ImproperlyConfigured('SQLiteFTSBackend requires an SQLite database.')
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [self.table])
+            if cursor.fetchone():
+                return
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+                "title, description, text_requirements, "
+                "kind UNINDEXED, object_id UNINDEXED, status UNINDEXED, category UNINDEXED, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+            rank = 'bm25({})'.format(', '.join(str(weight) for weight in self.weights))
+            cursor.execute(f"INSERT INTO {self.table}({self.table}, rank) VALUES ('rank', %s)", [rank])
+
+    @staticmethod
+    def rowid(kind, object_id):
+        return object_id * 2 + KINDS.index(kind)
+
+    def index(self, kind, rows, connection=None):
+        if not rows:
+            return
+        connection = connection or default_connection
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s",
+                               [(self.rowid(kind, row['object_id']),) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {self.table} (rowid, title, description, text_requirements, kind, object_id, "
+                f"status, category) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                [(self.rowid(kind, row['object_id']), row['title'], row['description'], row['text_requirements'],
+                  kind, row['object_id'], row['status'], row['category']) for row in rows]
+            )
+
+    def remove(self, kind, object_ids, connection=None):
+        connection = connection or default_connection
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s",
+                               [(self.rowid(kind, object_id),) for object_id in object_ids])
+
+    def clear(self, connection=None):
+        connection = connection or default_connection
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+
+    def optimize(self, connection=None):
+        connection = connection or default_connection
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.table}({self.table}) VALUES ('optimize')")
+
+    def search(self, query, kind=None, status=None, category=None, limit=20, offset=0, connection=None):
+        match = build_match_expression(query)
+        if not match:
+            return []
+        connection = connection or default_connection
+        sql = [f"SELECT kind, object_id, title, status, category, rank FROM {self.table} "
+               f"WHERE {self.table} MATCH %s"]
+        params = [match]
+        for column, value in (('kind', kind), ('status', status), ('category', category)):
+            if value:
+                sql.append(f"AND {column} = %s")
+                params.append(value)
+        sql.append("ORDER BY rank LIMIT %s OFFSET %s")
+        params.extend([limit, offset])
+        with connection.cursor() as cursor:
+            cursor.execute(' '.join(sql), params)
+            columns = ('type', 'id', 'title', 'status', 'category', 'score')
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def build_match_expression(query):
+    """
+    Turn free text into an FTS5 expression: every word becomes a quoted prefix
+    term and all terms must match. Operators typed by the user are ignored.
+    """
+    terms = TERM_RE.findall(query or '')
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def project_document(project):
+    return {
+        'object_id': project.pk,
+        'title': project.title,
+        'description': project.description,
+        'text_requirements': project.text_requirements,
+        'status': project.status,
+        'category': project.category,
+    }
+
+
+def gig_document(gig):
+    return {
+        'object_id': gig.pk,
+        'title': gig.title,
+        'description': gig.description,
+        'text_requirements': gig.text_requirements,
+        'status': gig.status,
+        'category': gig.project.category,
+    }
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    backend_path = getattr(settings, 'SEARCH_BACKEND', 'project.search.SQLiteFTSBackend')
+    return import_string(backend_path)()
+
+
+def rebuild_index(batch_size=5000, connection=None):
+    """
+    Rebuild the whole index from the database in batches, without
+    instantiating model objects.
+    """
+    backend = get_search_backend()
+    backend.create_index(connection or default_connection)
+    backend.clear(connection)
+    fields = ('pk', 'title', 'description', 'text_requirements', 'status', 'category')
+    total = 0
+    for kind, queryset in (
+            (PROJECT, Project.objects.order_by('pk').values_list(*fields)),
+            (GIG, Gig.objects.order_by('pk').values_list(*fields[:-1], 'project__category')),
+    ):
+        batch = []
+        for row in queryset.iterator(chunk_size=batch_size):
+            batch.append(dict(zip(('object_id',) + fields[1:], row)))
+            if len(batch) >= batch_size:
+                backend.index(kind, batch, connection)
+                total += len(batch)
+                batch = []
+        backend.index(kind, batch, connection)
+        total += len(batch)
+    if hasattr(backend, 'optimize'):
+        backend.optimize(connection)
+    return total
+
+
+def create_search_index(sender, using, **kwargs):
+    """``post_migrate`` handler of the project app."""
+    get_search_backend().create_index(connections[using])
+
+
+@receiver(post_save, sender=Project)
+def index_project(sender, instance, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    backend = get_search_backend()
+    backend.index_projects([instance], connections[using])
+    # Gigs inherit the project category for filtering.
+    backend.index_gigs(instance.project_projects.select_related('project'), connections[using])
+
+
+@receiver(post_save, sender=Gig)
+def index_gig(sender, instance, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    get_search_backend().index_gigs([instance], connections[using])
+
+
+@receiver(post_delete, sender=Project)
+def unindex_project(sender, instance, using=None, **kwargs):
+    get_search_backend().remove(PROJECT, [instance.pk], connections[using])
+
+
+@receiver(post_delete, sender=Gig)
+def unindex_gig(sender, instance, using=None, **kwargs):
+    get_search_backend().remove(GIG, [instance.pk], connections[using])
@@ -1,7 +1,13 @@
+from django.conf import settings
+from django.db import models, transaction
 from rest_framework import serializers
 
-from user.serializers import CompanySerializer
+from common.models import Document
+from common.outbox import append_events, CREATED
+from user.cache import company_profiles
+from user.models import Company
 from .models import Project, Gig, GigReport, ProjectReport, GigApplication, ProjectApplication
+from .search import get_search_backend
 
 
 class ProjectSerializer(serializers.ModelSerializer):
@@ -10,19 +16,47 @@ class ProjectSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class CompanyProfileField(serializers.Field):
+    """
+    A company as its cached summary profile (``user.cache``). Reads the profiles
+    ``GigListSerializer`` fetched for the page, or the cache for a single gig.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, company_id):
+        profiles = self.context.get('company_profiles') or {}
+        profile = profiles[company_id] if company_id in profiles else company_profiles.get(company_id)
+        request = self.context.get('request')
+        if profile and profile.get('company_logo') and request is not None:
+            # Cached profiles are request independent; make the logo URL absolute like ImageField does.
+            profile = dict(profile, company_logo=request.build_absolute_uri(profile['company_logo']))
+        return profile
+
+
+class GigListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        gigs = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.context['company_profiles'] = company_profiles.get_many(gig.user_id for gig in gigs)
+        return super().to_representation(gigs)
+
+
 class GigSerializer(serializers.ModelSerializer):
     project = ProjectSerializer(read_only=True)
-    user = CompanySerializer(read_only=True)
+    user = CompanyProfileField(source='user_id')
 
     class Meta:
         model = Gig
         fields = '__all__'
+        list_serializer_class = GigListSerializer
 
 
 class GigReportSerializer(serializers.ModelSerializer):
     class Meta:
         model = GigReport
-        fields = '__all__'
+        exclude = ('rated_boards',)
 
 
 class ProjectReportSerializer(serializers.ModelSerializer):
@@ -35,9 +69,67 @@ class GigApplicationSerializer(serializers.ModelSerializer):
     class Meta:
         model = GigApplication
         fields = '__all__'
+        # Set by the accept and reject actions, which keep Gig.accepted_count.
+        read_only_fields = ('status',)
 
 
 class ProjectApplicationSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProjectApplication
         fields = '__all__'
+
+
+class BulkGigListSerializer(serializers.ListSerializer):
+    """
+    Validates a whole batch of gigs for one project (``context['project']``)
+    with one query for all referenced documents, and creates it in one
+    transaction: one INSERT for the gigs and one for all document links.
+    """
+
+    def validate(self, attrs):
+        document_ids = {document_id for gig in attrs for document_id in gig['documents']}
+        owned = set(Document.objects.filter(pk__in=document_ids, user=self.context['request'].user)
+                    .values_list('pk', flat=True))
+        missing = sorted(document_ids - owned)
+        if missing:
+            raise serializers.ValidationError(f'Unknown documents: {", ".join(map(str, missing))}.')
+        return attrs
+
+    def create(self, validated_data):
+        project = self.context['project']
+        company = Company.objects.filter(owner_id=project.associated_user_id).first()
+        link = Gig.documents.through
+        with transaction.atomic():
+            gigs = Gig.objects.bulk_create([
+                Gig(project=project, user=company, **{key: value for key, value in gig.items() if key != 'documents'})
+                for gig in validated_data
+            ])
+            link.objects.bulk_create([link(gig_id=gig.pk, document_id=document_id)
+                                      for gig, data in zip(gigs, validated_data) for document_id in data['documents']])
+            # bulk_create sends no signals, so index and record the gigs here.
+            get_search_backend().index_gigs(gigs)
+            append_events(Gig, [gig.pk for gig in gigs], CREATED)
+        return gigs
+
+
+class BulkGigSerializer(serializers.ModelSerializer):
+    documents = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+
+    class Meta:
+        model = Gig
+        fields = ('title', 'description', 'text_requirements', 'json_requirements', 'hours', 'status', 'start', 'end',
+                  'number_of_freelancers', 'documents')
+        list_serializer_class = BulkGigListSerializer
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        kwargs.setdefault('allow_empty', False)
+        kwargs.setdefault('max_length', settings.GIG_BULK_MAX_SIZE)
+        return super().many_init(*args, **kwargs)
+
+    def validate(self, attrs):
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError('start must be before end.')
+        # Repeated ids are linked once, as ManyRelatedManager.set() does.
+        attrs['documents'] = list(dict.fromkeys(attrs['documents']))
+        return attrs
@@ -1,3 +1,612 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import date, timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from common.test_utils import assert_filters_use_indexes, full_table_scans, make_project, make_gig, viewset_queryset
+from project.filters import ProjectFilter, GigFilter, GigApplicationFilter, ProjectApplicationFilter
+from finance.models import Invoice
+from project.models import Project, Gig, GigApplication, ProjectApplication, ACCEPTED, GIG_FULL
+from project.search import build_match_expression, get_search_backend, rebuild_index
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='secret', email='owner@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, **params):
+        response = self.client.get('/project/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(hit['type'], hit['id']) for hit in response.data['results']]
+
+    def test_match_expression_quotes_terms_as_prefixes(self):
+        self.assertEqual(build_match_expression('mob "bank* OR'), '"mob"* "bank"* "OR"*')
+        self.assertEqual(build_match_expression('  '), '')
+
+    def test_prefix_search_is_ranked_and_kept_in_sync(self):
+        project = make_project(self.user)
+        other = make_project(self.user, title='Logo design', description='A mobile friendly logo',
+                             category='design')
+        gig = make_gig(project)
+
+        self.assertEqual(self.search(q='mob')[0], ('project', project.pk))
+        self.assertIn(('project', other.pk), self.search(q='mob'))
+        self.assertEqual(self.search(q='paym'), [('gig', gig.pk)])
+
+        gig.title = 'Payment reconciliation'
+        gig.save()
+        self.assertEqual(self.search(q='reconcil'), [('gig', gig.pk)])
+
+        gig.delete()
+        self.assertEqual(self.search(q='paym'), [])
+
+    def test_filters(self):
+        project = make_project(self.user)
+        make_project(self.user, title='Mobile game', status='closed', category='games')
+        gig = make_gig(project, title='Mobile QA', status='open')
+
+        self.assertEqual(self.search(q='mobile', category='games', type='project'),
+                         [('project', Project.objects.get(category='games').pk)])
+        self.assertEqual(self.search(q='mobile', type='gig', category='software'), [('gig', gig.pk)])
+        self.assertNotIn(('project', project.pk), self.search(q='mobile', status='closed'))
+
+    def test_gig_category_follows_project(self):
+        project = make_project(self.user)
+        gig = make_gig(project)
+        project.category = 'fintech'
+        project.save()
+        self.assertEqual(self.search(q='backend', category='fintech'), [('gig', gig.pk)])
+
+    def test_rebuild(self):
+        project = make_project(self.user)
+        make_gig(project)
+        get_search_backend().clear()
+        self.assertEqual(self.search(q='mobile'), [])
+        self.assertEqual(rebuild_index(batch_size=1), 2)
+        self.assertEqual(self.search(q='mobile'), [('project', project.pk)])
+
+    def test_rebuild_creates_a_missing_index(self):
+        project = make_project(self.user)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {get_search_backend().table}')
+        self.assertEqual(rebuild_index(), 1)
+        self.assertEqual(self.search(q='mobile'), [('project', project.pk)])
+
+    def test_invalid_type(self):
+        response = self.client.get('/project/search/', {'q': 'x', 'type': 'user'})
+        self.assertEqual(response.status_code, 400)
+
+
+class FilterPlanTests(TestCase):
+    # The plans are taken for the querysets the viewsets serve, visibility rules included.
+
+    def setUp(self):
+        from user.models import Freelancer
+        self.user = User.objects.create_user(username='owner', password='secret')
+        self.project = make_project(self.user)
+        self.gig = make_gig(self.project)
+        self.freelancer = Freelancer.objects.create(user=self.user, hourly_rate=10)
+
+    def test_project_filters(self):
+        from project.views import ProjectViewSet
+        values = {'status': 'open', 'category': 'software', 'start_date': '2024-01-01',
+                  'start_date__gte': '2024-01-01', 'start_date__lte': '2024-01-01'}
+        assert_filters_use_indexes(self, ProjectFilter, viewset_queryset(ProjectViewSet, self.user), values)
+
+    def test_gig_filters(self):
+        from project.views import GigViewSet
+        values = {'status': 'open', 'project': self.project.pk,
+                  'start__gte': '2024-01-01T00:00:00Z', 'start__lte': '2024-01-01T00:00:00Z'}
+        assert_filters_use_indexes(self, GigFilter, viewset_queryset(GigViewSet, self.user), values)
+
+    def test_gig_application_filters(self):
+        from project.views import GigApplicationViewSet
+        values = {'status': 1, 'gig': self.gig.pk, 'freelancer': self.freelancer.pk}
+        assert_filters_use_indexes(self, GigApplicationFilter, viewset_queryset(GigApplicationViewSet, self.user),
+                                   values)
+
+    def test_project_application_filters(self):
+        from project.views import ProjectApplicationViewSet
+        values = {'status': 1, 'project': self.project.pk, 'freelancer': self.freelancer.pk}
+        assert_filters_use_indexes(self, ProjectApplicationFilter,
+                                   viewset_queryset(ProjectApplicationViewSet, self.user), values)
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        from user.models import Company, Freelancer
+        owner = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(owner=owner, company_name='Acme')
+        self.project = make_project(owner)
+        self.user = User.objects.create_user(username='free', password='secret')
+        self.freelancer = Freelancer.objects.create(user=self.user, hourly_rate=10)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_gig(self, status):
+        gig = make_gig(self.project, user=self.company)
+        GigApplication.objects.create(freelancer=self.freelancer, gig=gig, status=status)
+        return gig
+
+    def test_sets_and_counts(self):
+        from project.models import ProjectApplication
+        accepted, pending = self.add_gig(1), self.add_gig(0)
+        self.add_gig(2)
+        make_gig(self.project)
+        ProjectApplication.objects.create(freelancer=self.freelancer, project=self.project, status=0)
+
+        data = self.client.get('/project/dashboard/').data
+        self.assertEqual([gig['id'] for gig in data['accepted_gigs']], [accepted.pk])
+        self.assertEqual([gig['id'] for gig in data['pending_gigs']], [pending.pk])
+        self.assertEqual(data['accepted_projects'], [])
+        self.assertEqual([project['id'] for project in data['pending_projects']], [self.project.pk])
+        self.assertEqual(data['counts'], {'accepted_gigs': 1, 'pending_gigs': 1, 'accepted_projects': 0,
+                                          'pending_projects': 1})
+
+    def test_query_count_does_not_grow_with_gigs(self):
+        self.add_gig(1)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get('/project/dashboard/')
+        for status in (0, 1) * 10:
+            self.add_gig(status)
+        with self.assertNumQueries(len(few)):
+            data = self.client.get('/project/dashboard/').data
+        self.assertEqual(data['counts']['accepted_gigs'], 11)
+
+    def test_gig_with_mixed_statuses_matches_legacy_views(self):
+        gig = self.add_gig(2)
+        GigApplication.objects.create(freelancer=self.freelancer, gig=gig, status=1)
+        GigApplication.objects.create(freelancer=self.freelancer, gig=gig, status=0)
+
+        data = self.client.get('/project/dashboard/').data
+        self.assertEqual([row['id'] for row in data['accepted_gigs']], [gig.pk])
+        self.assertEqual([row['id'] for row in data['pending_gigs']], [gig.pk])
+        self.assertEqual([row['id'] for row in self.client.get('/project/accepted-gigs/').data], [gig.pk])
+        self.assertEqual([row['id'] for row in self.client.get('/project/pending-gigs/').data], [gig.pk])
+
+    def test_legacy_gig_views_use_applications(self):
+        accepted = self.add_gig(1)
+        self.assertEqual([gig['id'] for gig in self.client.get('/project/accepted-gigs/').data], [accepted.pk])
+
+
+class ApplicationPermissionTests(TestCase):
+    def setUp(self):
+        from user.models import Freelancer
+        self.owner = User.objects.create_user(username='owner', password='secret')
+        self.project = make_project(self.owner)
+        self.gig = make_gig(self.project)
+        self.applicant = User.objects.create_user(username='free', password='secret')
+        self.freelancer = Freelancer.objects.create(user=self.applicant, hourly_rate=10)
+        self.client = APIClient()
+
+    def apply(self):
+        return GigApplication.objects.create(freelancer=self.freelancer, gig=self.gig, status=0)
+
+    def test_owner_accepts_without_loading_related_rows(self):
+        application = self.apply()
+        self.client.force_authenticate(self.owner)
+        # One query loads the annotated application; accepting is two conditional
+        # UPDATEs and the outbox inserts for the application and the gig inside a
+        # savepoint. No gig or project rows are loaded. The outer savepoint pair
+        # is the request transaction.
+        with self.assertNumQueries(9):
+            response = self.client.post(f'/project/gig-applications/{application.pk}/accept/')
+        self.assertEqual(response.status_code, 200)
+        application.refresh_from_db()
+        self.assertEqual(application.status, 1)
+
+    def test_applicant_cannot_accept(self):
+        application = self.apply()
+        self.client.force_authenticate(self.applicant)
+        response = self.client.post(f'/project/gig-applications/{application.pk}/accept/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_permission_falls_back_to_id_lookup(self):
+        from project.permissions import IsOwnerOrReadOnly
+        application = GigApplication.objects.get(pk=self.apply().pk)
+        request = type('Request', (), {'method': 'POST', 'user': self.owner})()
+        with self.assertNumQueries(1):
+            self.assertTrue(IsOwnerOrReadOnly().has_object_permission(request, None, application))
+
+    def test_batch_reject_checks_ownership_in_one_query(self):
+        from project.models import ProjectApplication
+        own = [self.apply() for _ in range(3)]
+        other_project = make_project(self.applicant)
+        other = GigApplication.objects.create(freelancer=self.freelancer, gig=make_gig(other_project), status=0)
+        self.client.force_authenticate(self.owner)
+        ids = [application.pk for application in own] + [other.pk]
+        # One query checks ownership for the whole batch; the rejection looks up accepted
+        # rows, updates the rest and appends the outbox events inside a savepoint. The
+        # outer savepoint pair is the request transaction.
+        with self.assertNumQueries(9):
+            response = self.client.post('/project/gig-applications/reject/', {'ids': ids}, format='json')
+        self.assertEqual(response.data, {'rejected': ids[:3], 'forbidden': [other.pk]})
+        self.assertEqual(set(GigApplication.objects.values_list('pk', 'status')),
+                         {(pk, 2) for pk in ids[:3]} | {(other.pk, 0)})
+
+        project_application = ProjectApplication.objects.create(freelancer=self.freelancer, project=self.project,
+                                                                 status=0)
+        response = self.client.post('/project/project-applications/reject/', {'ids': [project_application.pk]},
+                                    format='json')
+        self.assertEqual(response.data['rejected'], [project_application.pk])
+
+
+class GigSlotTests(TestCase):
+    def setUp(self):
+        from user.models import Freelancer
+        self.owner = User.objects.create_user(username='owner', password='secret')
+        self.gig = make_gig(make_project(self.owner), number_of_freelancers=1)
+        self.freelancers = [Freelancer.objects.create(user=User.objects.create_user(username=f'free{index}'),
+                                                      hourly_rate=10) for index in range(2)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def apply(self, freelancer):
+        return GigApplication.objects.create(freelancer=freelancer, gig=self.gig, status=0)
+
+    def accept(self, application):
+        return self.client.post(f'/project/gig-applications/{application.pk}/accept/')
+
+    def test_gig_full(self):
+        first, second = self.apply(self.freelancers[0]), self.apply(self.freelancers[1])
+        self.assertEqual(self.accept(first).status_code, 200)
+        response = self.accept(second)
+        self.assertEqual((response.status_code, response.data), (409, {'status': 'gig full'}))
+        second.refresh_from_db()
+        self.assertEqual(second.status, 0)
+        self.gig.refresh_from_db()
+        self.assertEqual(self.gig.accepted_count, 1)
+
+    def test_accepting_twice_takes_one_slot(self):
+        application = self.apply(self.freelancers[0])
+        self.gig.number_of_freelancers = 2
+        self.gig.save()
+        self.accept(application)
+        self.assertEqual(self.accept(application).status_code, 200)
+        self.gig.refresh_from_db()
+        self.assertEqual(self.gig.accepted_count, 1)
+
+    def test_reject_releases_slot(self):
+        first, second = self.apply(self.freelancers[0]), self.apply(self.freelancers[1])
+        self.accept(first)
+        self.client.post(f'/project/gig-applications/{first.pk}/reject/')
+        self.assertEqual(self.accept(second).status_code, 200)
+        self.client.post('/project/gig-applications/reject/', {'ids': [first.pk, second.pk]}, format='json')
+        self.gig.refresh_from_db()
+        self.assertEqual(self.gig.accepted_count, 0)
+
+    def test_status_cannot_be_set_through_the_api(self):
+        self.client.force_authenticate(self.freelancers[0].user)
+        response = self.client.post('/project/gig-applications/', {
+            'freelancer': self.freelancers[0].pk, 'gig': self.gig.pk, 'status': 1}, format='json')
+        self.assertEqual((response.status_code, response.data['status']), (201, 0))
+        response = self.client.patch(f"/project/gig-applications/{response.data['id']}/", {'status': 1}, format='json')
+        self.assertEqual(response.data['status'], 0)
+        self.gig.refresh_from_db()
+        self.assertEqual(self.gig.accepted_count, 0)
+
+    def test_saves_and_deletes_outside_accept_recount(self):
+        application = self.apply(self.freelancers[0])
+        application.status = 1  # e.g. an admin edit
+        application.save()
+        self.gig.refresh_from_db()
+        self.assertEqual(self.gig.accepted_count, 1)
+        application.delete()
+        self.gig.refresh_from_db()
+        self.assertEqual(self.gig.accepted_count, 0)
+
+    def test_moving_an_accepted_application_recounts_both_gigs(self):
+        other = make_gig(self.gig.project, number_of_freelancers=1)
+        application = self.apply(self.freelancers[0])
+        self.assertEqual(self.accept(application).status_code, 200)
+        application = GigApplication.objects.get(pk=application.pk)
+        application.gig = other
+        application.save()
+        self.gig.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.gig.accepted_count, other.accepted_count), (0, 1))
+
+    def test_recount(self):
+        GigApplication.objects.filter(pk=self.apply(self.freelancers[0]).pk).update(status=1)
+        Gig.objects.recount_accepted()
+        self.gig.refresh_from_db()
+        self.assertEqual(self.gig.accepted_count, 1)
+        self.assertFalse(Gig.objects.with_free_slots().filter(pk=self.gig.pk).exists())
+
+
+class GigSlotConcurrencyTests(TransactionTestCase):
+    slots = 25
+    applications = 300
+    workers = 12
+    # Accepts per second all workers together must reach; far below what SQLite does.
+    min_throughput = 50
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Parallel accepts need a database that allows concurrent connections.')
+        from user.models import Freelancer
+        owner = User.objects.create_user(username='owner', password='secret')
+        self.gig = make_gig(make_project(owner), number_of_freelancers=self.slots)
+        users = User.objects.bulk_create([User(username=f'free{index}') for index in range(self.applications)])
+        freelancers = Freelancer.objects.bulk_create([Freelancer(user=user, hourly_rate=10) for user in users])
+        self.application_ids = [application.pk for application in GigApplication.objects.bulk_create(
+            [GigApplication(freelancer=freelancer, gig=self.gig, status=0) for freelancer in freelancers])]
+
+    def test_simultaneous_accepts_never_overfill(self):
+        outcomes, errors = [], []
+        pending = list(self.application_ids)
+        lock = threading.Lock()
+        start_gate = threading.Barrier(self.workers)
+
+        def worker():
+            try:
+                start_gate.wait()
+                while True:
+                    with lock:
+                        if not pending:
+                            return
+                        pk = pending.pop()
+                    application = GigApplication.objects.only('pk', 'gig_id').get(pk=pk)
+                    outcomes.append(GigApplication.objects.accept(application))
+            except Exception as error:  # surfaced in the main thread below
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.workers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        throughput = self.applications / (time.perf_counter() - started)
+
+        self.assertEqual(errors, [])
+        self.assertGreater(throughput, self.min_throughput)
+        self.assertEqual(outcomes.count(ACCEPTED), self.slots)
+        self.assertEqual(outcomes.count(GIG_FULL), self.applications - self.slots)
+        self.gig.refresh_from_db()
+        self.assertEqual(self.gig.accepted_count, self.slots)
+        self.assertEqual(GigApplication.objects.filter(status=1).count(), self.slots)
+
+
+@override_settings(SYNC_WATERMARK_OVERLAP_SECONDS=0)
+class DeltaSyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='secret')
+        self.projects = [make_project(self.user, title=f'project {index}') for index in range(3)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, since, url='/project/projects/'):
+        response = self.client.get(url, {'updated_since': since})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_changes_and_tombstones_since_watermark(self):
+        first = self.sync((timezone.now() - timedelta(hours=1)).isoformat())
+        self.assertEqual([row['id'] for row in first['results']], [project.pk for project in self.projects])
+        changed, deleted, _ = self.projects
+        changed.status = 'closed'
+        changed.save()
+        deleted_id = deleted.pk
+        deleted.delete()
+        second = self.sync(first['watermark'])
+        self.assertEqual([row['id'] for row in second['results']], [changed.pk])
+        self.assertEqual(second['deleted'], [deleted_id])
+        self.assertEqual(self.sync(second['watermark'])['results'], [])
+
+    def test_queryset_updates_bump_updated_at(self):
+        from user.models import Freelancer
+        freelancer = Freelancer.objects.create(user=User.objects.create_user(username='free'), hourly_rate=10)
+        application = GigApplication.objects.create(freelancer=freelancer, gig=make_gig(self.projects[0]), status=0)
+        watermark = self.sync(timezone.now().isoformat(), '/project/gig-applications/')['watermark']
+        GigApplication.objects.accept(application)
+        rows = self.sync(watermark, '/project/gig-applications/')['results']
+        self.assertEqual([(row['id'], row['status']) for row in rows], [(application.pk, 1)])
+
+    def test_tombstones_only_reach_users_who_saw_the_row(self):
+        from user.models import Freelancer
+        gig = make_gig(self.projects[0])
+        applicants = [User.objects.create_user(username=f'free{index}') for index in range(2)]
+        applications = [GigApplication.objects.create(gig=gig, status=0, freelancer=Freelancer.objects.create(
+            user=applicant, hourly_rate=10)) for applicant in applicants]
+        since = timezone.now().isoformat()
+        deleted_id = applications[1].pk
+        applications[1].delete()
+
+        self.assertEqual(self.sync(since, '/project/gig-applications/')['deleted'], [deleted_id])
+        self.client.force_authenticate(applicants[1])
+        self.assertEqual(self.sync(since, '/project/gig-applications/')['deleted'], [deleted_id])
+        self.client.force_authenticate(applicants[0])
+        self.assertEqual(self.sync(since, '/project/gig-applications/')['deleted'], [])
+
+    def test_invalid_and_expired_watermarks(self):
+        self.assertEqual(self.client.get('/project/projects/', {'updated_since': 'yesterday'}).status_code, 400)
+        expired = (timezone.now() - timedelta(days=365)).isoformat()
+        self.assertEqual(self.client.get('/project/projects/', {'updated_since': expired}).status_code, 410)
+
+    def test_watermark_before_events_pruned_by_count(self):
+        from common.outbox import prune_events
+        since = (timezone.now() - timedelta(hours=1)).isoformat()
+        self.sync(since)
+        make_project(self.user).delete()
+        prune_events(max_events=0)
+        self.assertEqual(self.client.get('/project/projects/', {'updated_since': since}).status_code, 410)
+        self.assertEqual(self.sync(timezone.now().isoformat())['deleted'], [])
+
+    def test_sync_queries_use_updated_at_indexes(self):
+        since = timezone.now()
+        for model in (Project, Gig, GigApplication, ProjectApplication, Invoice):
+            with self.subTest(model=model.__name__):
+                queryset = model.objects.filter(updated_at__gt=since).order_by('updated_at', 'pk')
+                self.assertEqual(full_table_scans(queryset), [])
+
+
+class BulkGigTests(TestCase):
+    def setUp(self):
+        from common.models import Document
+        from user.models import Company
+        self.owner = User.objects.create_user(username='owner', password='secret')
+        self.company = Company.objects.create(owner=self.owner, company_name='Acme')
+        self.project = make_project(self.owner)
+        self.documents = [Document.objects.create(user=self.owner, document=f'documents/{index}.pdf')
+                          for index in range(3)]
+        self.foreign_document = Document.objects.create(user=User.objects.create_user(username='other'),
+                                                        document='documents/other.pdf')
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def payload(self, count, **kwargs):
+        gig = {'title': 'Bulk gig', 'description': 'Created in bulk', 'start': '2024-01-01T09:00:00Z',
+               'end': '2024-01-05T17:00:00Z', 'documents': [document.pk for document in self.documents[:2]]}
+        gig.update(kwargs)
+        return [dict(gig, title=f'Bulk gig {index}') for index in range(count)]
+
+    def post(self, payload):
+        return self.client.post(f'/project/projects/{self.project.pk}/gigs/', payload, format='json')
+
+    def test_creates_gigs_and_links_in_constant_queries(self):
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.post(self.payload(2)).status_code, 201)
+        with self.assertNumQueries(len(few)):
+            response = self.post(self.payload(30))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 30)
+        gig = Gig.objects.get(pk=response.data[0]['id'])
+        self.assertEqual((gig.project_id, gig.user_id), (self.project.pk, self.company.pk))
+        self.assertEqual(response.data[0]['user']['company_name'], 'Acme')
+        self.assertNotIn('company_specialities', response.data[0]['user'])
+        self.assertEqual(sorted(gig.documents.values_list('pk', flat=True)), [doc.pk for doc in self.documents[:2]])
+        self.assertEqual(Gig.documents.through.objects.count(), 64)
+        self.assertEqual(len(get_search_backend().search('Bulk gig', kind='gig', limit=100)), 32)
+        from common.models import OutboxEvent
+        self.assertEqual(OutboxEvent.objects.filter(model='project.gig', action='created').count(), 32)
+
+    def test_invalid_batches_create_nothing(self):
+        payload = self.payload(3)
+        payload[1]['end'] = '2023-01-01T00:00:00Z'
+        response = self.post(payload)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[1], {'non_field_errors': ['start must be before end.']})
+        self.assertEqual(self.post(self.payload(2, documents=[self.foreign_document.pk])).status_code, 400)
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertFalse(Gig.objects.exists())
+
+    def test_repeated_documents_are_linked_once(self):
+        document = self.documents[0].pk
+        response = self.post(self.payload(1, documents=[document, document]))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(list(Gig.objects.get(pk=response.data[0]['id']).documents.values_list('pk', flat=True)),
+                         [document])
+
+    def test_only_the_owner_adds_gigs(self):
+        self.client.force_authenticate(User.objects.get(username='other'))
+        self.assertEqual(self.post(self.payload(1)).status_code, 403)
+
+
+class RatingTests(TestCase):
+    def setUp(self):
+        from user.models import Company, Freelancer
+        owner = User.objects.create_user(username='owner', password='secret')
+        self.gig = make_gig(make_project(owner), user=Company.objects.create(owner=owner, company_name='Acme'))
+        self.design_gig = make_gig(make_project(owner, category='design'), user=self.gig.user)
+        self.alice, self.bob, self.carol = [
+            Freelancer.objects.create(user=User.objects.create_user(username=name), hourly_rate=10, skill=skills)
+            for name, skills in (('alice', ['Python', 'SQL']), ('bob', ['python']), ('carol', None))]
+
+    def review(self, freelancer, stars, gig=None, status='approved'):
+        from project.models import GigReport
+        return GigReport.objects.create(freelancer=freelancer, gig=gig or self.gig, start_time=timezone.now(),
+                                        end_time=timezone.now() + timedelta(hours=1), status=status,
+                                        review={'rating': stars})
+
+    def board(self, kind='overall', key=''):
+        from project.models import FreelancerRating
+        return {rating.freelancer_id: (rating.count, rating.total, round(rating.score, 6))
+                for rating in FreelancerRating.objects.filter(kind=kind, key=key)}
+
+    def test_reviews_update_the_sums_incrementally_and_idempotently(self):
+        report = self.review(self.alice, 5)
+        self.assertEqual(self.board(), {self.alice.pk: (1, 5, round(22.5 / 6, 6))})
+        self.assertEqual(self.board('category', 'software'), self.board())
+        self.assertEqual(self.board('skill', 'python'), self.board())
+        self.assertEqual(self.board('skill', 'sql'), self.board())
+
+        report.save()
+        report.save()
+        self.assertEqual(self.board()[self.alice.pk][:2], (1, 5))
+        report.review = {'rating': 3}
+        report.save()
+        self.assertEqual(self.board('skill', 'sql')[self.alice.pk], (1, 3, round(20.5 / 6, 6)))
+        report.status = 'rejected'
+        report.save()
+        self.assertEqual(self.board()[self.alice.pk], (0, 0, 3.5))
+
+        self.review(self.alice, 4).delete()
+        self.review(self.alice, 'great', status='approved')
+        self.review(self.alice, 5, status='submitted')
+        self.assertEqual(self.board()[self.alice.pk], (0, 0, 3.5))
+
+    def test_reviews_leave_the_boards_they_were_counted_on(self):
+        from project.ratings import rebuild_ratings
+        report = self.review(self.alice, 5)
+        self.alice.skill = ['Go']
+        self.alice.save()
+        self.gig.project.category = 'design'
+        self.gig.project.save()
+        report.review = {'rating': 3}
+        report.save()
+        self.assertEqual(self.board('skill', 'python'), {self.alice.pk: (0, 0, 3.5)})
+        self.assertEqual(self.board('category', 'software')[self.alice.pk][:2], (0, 0))
+        self.assertEqual(self.board('skill', 'go')[self.alice.pk][:2], (1, 3))
+
+        rebuild_ratings()
+        self.alice.skill = ['Rust']
+        self.alice.save()
+        report.delete()
+        self.assertEqual(self.board('skill', 'go')[self.alice.pk][:2], (0, 0))
+        self.assertEqual(self.board('category', 'design')[self.alice.pk][:2], (0, 0))
+        self.assertEqual(self.board()[self.alice.pk][:2], (0, 0))
+
+    def test_leaderboard_pages_by_bayesian_score(self):
+        from project.ratings import leaderboard, rebuild_ratings
+        self.review(self.alice, 5)
+        for _ in range(10):
+            self.review(self.bob, 4)
+        self.review(self.carol, 5, gig=self.design_gig)
+
+        with self.assertNumQueries(1):
+            first, cursor = leaderboard('overall', limit=1)
+        self.assertEqual([row['freelancer'] for row in first], [self.bob.pk])
+        second, cursor = leaderboard('overall', after=cursor, limit=1)
+        third, cursor = leaderboard('overall', after=cursor, limit=1)
+        self.assertEqual([second[0]['freelancer'], third[0]['freelancer']], sorted([self.alice.pk, self.carol.pk],
+                                                                                 reverse=True))
+        self.assertIsNone(cursor)
+        self.assertEqual(leaderboard('category', 'design')[0][0]['freelancer'], self.carol.pk)
+
+        client = APIClient()
+        client.force_authenticate(self.alice.user)
+        response = client.get('/project/leaderboard/', {'skill': 'Python'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['freelancer'] for row in response.data['results']], [self.bob.pk, self.alice.pk])
+        best = response.data['results'][0]
+        self.assertEqual(best['profile']['user']['username'], 'bob')
+        del best['profile']
+        self.assertEqual(best, {'freelancer': self.bob.pk, 'score': 3.833, 'reviews': 10, 'average': 4.0})
+        self.assertEqual(client.get('/project/leaderboard/', {'after': 'nope'}).status_code, 400)
+
+        before = {kind: self.board(*kind) for kind in (('overall', ''), ('category', 'design'), ('skill', 'python'))}
+        self.assertEqual(rebuild_ratings(chunk_size=3), 12)
+        self.assertEqual({kind: self.board(*kind) for kind in before}, before)
@@ -2,7 +2,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
 from project.views import ProjectViewSet, GigViewSet, GigReportViewSet, ProjectReportViewSet, GigApplicationViewSet, \
-    ProjectApplicationViewSet, AcceptedGigsView, PendingGigsView, AcceptedProjectsView, PendingProjectsView
+    ProjectApplicationViewSet, AcceptedGigsView, PendingGigsView, AcceptedProjectsView, PendingProjectsView, SearchView, DashboardView, \
+    LeaderboardView
 
 router = DefaultRouter()
 router.register(r'projects', ProjectViewSet)
@@ -18,4 +19,7 @@ urlpatterns = [
     path('pending-gigs/', PendingGigsView.as_view(), name='pending-gigs'),
     path('accepted-projects/', AcceptedProjectsView.as_view(), name='accepted-projects'),
     path('pending-projects/', PendingProjectsView.as_view(), name='pending-projects'),
+    path('search/', SearchView.as_view(), name='search'),
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
+    path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
 ]
@@ -1,103 +1,154 @@
-from django.db.models import Q, Count, F
-from rest_framework import viewsets, generics
+from django.conf import settings
+from django.db.models import Q, Exists, OuterRef, Prefetch
+from rest_framework import viewsets, generics, status
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from .models import Project, Gig, GigReport, ProjectReport, ProjectApplication, GigApplication
+from common.archive import IncludeArchivedMixin
+from common.sync import DeltaSyncMixin
+from user.cache import freelancer_profiles
+from user.models import Freelancer
+
+from .filters import ProjectFilter, GigFilter, GigApplicationFilter, ProjectApplicationFilter
+from .models import Project, Gig, GigReport, ProjectReport, ProjectApplication, GigApplication, GIG_FULL, \
+    FreelancerRating, ArchivedGigReport, ArchivedGigApplication
 from .permissions import IsOwnerOrReadOnly
+from .ratings import leaderboard, InvalidCursor
+from .search import get_search_backend, KINDS
 from .serializers import ProjectSerializer, GigSerializer, GigReportSerializer, ProjectReportSerializer, \
-    ProjectApplicationSerializer, GigApplicationSerializer
+    ProjectApplicationSerializer, GigApplicationSerializer, BulkGigSerializer
 
 
-class ProjectViewSet(viewsets.ModelViewSet):
+class ProjectViewSet(DeltaSyncMixin, viewsets.ModelViewSet):
     queryset = Project.objects.all()
     serializer_class = ProjectSerializer
-
-
-class GigViewSet(viewsets.ModelViewSet):
+    filterset_class = ProjectFilter
+
+    @action(detail=True, methods=['post'], url_path='gigs', url_name='bulk-gigs')
+    def gigs(self, request, pk=None):
+        """
+        Create many gigs for the project in one transaction.
+
+        POST Data: a list of gigs (``title``, ``description``, ``start``, ``end``, ...)
+        with ``documents`` as a list of the user's document ids. The gigs belong to
+        the project owner's company.
+
+        Returns:
+        - 201 Created with the created gigs.
+        - 400 Bad Request with per-gig errors; nothing is created.
+        - 403 Forbidden if the user does not own the project.
+        """
+        project = self.get_object()
+        if project.associated_user_id != request.user.pk:
+            return Response({"error": "Only the project owner can add gigs."}, status=status.HTTP_403_FORBIDDEN)
+        serializer = BulkGigSerializer(data=request.data, many=True, context={'request': request, 'project': project})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        gigs = serializer.save()
+        created = Gig.objects.filter(pk__in=[gig.pk for gig in gigs]).order_by('pk') \
+            .select_related('project').prefetch_related(*DashboardView.GIG_PREFETCH)
+        return Response(GigSerializer(created, many=True).data, status=status.HTTP_201_CREATED)
+
+
+class GigViewSet(DeltaSyncMixin, viewsets.ModelViewSet):
     queryset = Gig.objects.all()
     serializer_class = GigSerializer
+    filterset_class = GigFilter
 
     def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):  # schema generation, see common/schema.py
+            return Gig.objects.none()
         user = self.request.user
-        gigs = self.annotate_gigs_with_accepted_freelancers_count()
-        gigs = self.filter_gigs_by_freelancers_count(gigs)
-        gigs = self.exclude_gigs_with_user_application(gigs, user)
-        return gigs.distinct()
-
-    @staticmethod
-    def annotate_gigs_with_accepted_freelancers_count():
-        return Gig.objects.annotate(
-            accepted_freelancers_count=Count('applications', filter=Q(applications__status=1))
-        )
-
-    @staticmethod
-    def filter_gigs_by_freelancers_count(gigs):
-        return gigs.filter(
-            Q(accepted_freelancers_count__lt=F('number_of_freelancers')) | Q(number_of_freelancers__isnull=True))
+        gigs = Gig.objects.with_free_slots()
+        return self.exclude_gigs_with_user_application(gigs, user)
 
     @staticmethod
     def exclude_gigs_with_user_application(gigs, user):
-        return gigs.exclude(applications__freelancer__user=user)
+        return gigs.exclude(applications__freelancer__user=user) \
+            .exclude(archived_applications__freelancer__user=user)
 
 
-class GigReportViewSet(viewsets.ModelViewSet):
+class GigReportViewSet(IncludeArchivedMixin, viewsets.ModelViewSet):
     queryset = GigReport.objects.all()
     serializer_class = GigReportSerializer
 
+    def get_archived_queryset(self):
+        return ArchivedGigReport.objects.all()
+
 
 class ProjectReportViewSet(viewsets.ModelViewSet):
     queryset = ProjectReport.objects.all()
     serializer_class = ProjectReportSerializer
 
 
-class GigApplicationViewSet(viewsets.ModelViewSet):
+class BatchRejectMixin:
+    """
+    ``POST <applications>/reject/`` with ``{"ids": [...]}`` rejects every listed
+    application the user owns. Ownership is checked for the whole batch in one
+    query; ids the user may not change are reported back, not applied.
+    """
+
+    @action(detail=False, methods=['post'], url_path='reject', url_name='reject-many')
+    def reject_many(self, request):
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids):
+            return Response({"error": "ids must be a list of integers."}, status=status.HTTP_400_BAD_REQUEST)
+        owned = self.get_queryset().owned_by(request.user).filter(pk__in=ids)
+        rejected = sorted(owned.values_list('pk', flat=True))
+        self.perform_batch_reject(rejected)
+        return Response({'rejected': rejected, 'forbidden': sorted(set(ids) - set(rejected))})
+
+    def perform_batch_reject(self, ids):
+        self.get_queryset().model.objects.reject(ids)
+
+
+class GigApplicationViewSet(IncludeArchivedMixin, DeltaSyncMixin, BatchRejectMixin, viewsets.ModelViewSet):
     queryset = GigApplication.objects.all()
     serializer_class = GigApplicationSerializer
+    filterset_class = GigApplicationFilter
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        # Assuming user is either the owner of the gig or the freelancer who submitted the application
-        return GigApplication.objects.filter(
-            Q(gig__project__associated_user=user) | Q(freelancer__user=user)
-        )
+        if getattr(self, 'swagger_fake_view', False):
+            return GigApplication.objects.none()
+        return GigApplication.objects.visible_to(self.request.user).with_owner()
+
+    def get_archived_queryset(self):
+        return ArchivedGigApplication.objects.visible_to(self.request.user).with_owner()
+
+    def perform_create(self, serializer):
+        serializer.save(status=0)  # Pending
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsOwnerOrReadOnly])
     def accept(self, request, pk=None):
         application = self.get_object()
-        self.check_object_permissions(request, application)
-        application.status = 1  # Accepted
-        application.save()
+        if GigApplication.objects.accept(application) == GIG_FULL:
+            return Response({'status': 'gig full'}, status=status.HTTP_409_CONFLICT)
         return Response({'status': 'accepted'})
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsOwnerOrReadOnly])
     def reject(self, request, pk=None):
         application = self.get_object()
-        self.check_object_permissions(request, application)
-        application.status = 2  # Rejected
-        application.save()
+        GigApplication.objects.reject([application.pk])
         return Response({'status': 'rejected'})
 
 
-class ProjectApplicationViewSet(viewsets.ModelViewSet):
+class ProjectApplicationViewSet(DeltaSyncMixin, BatchRejectMixin, viewsets.ModelViewSet):
     queryset = ProjectApplication.objects.all()
     serializer_class = ProjectApplicationSerializer
+    filterset_class = ProjectApplicationFilter
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        # Assuming user is either the owner of the project or the freelancer who submitted the application
-        print(user.username)
-        return ProjectApplication.objects.filter(
-            Q(project__associated_user=user) | Q(freelancer__user=user)
-        )
+        if getattr(self, 'swagger_fake_view', False):
+            return ProjectApplication.objects.none()
+        return ProjectApplication.objects.visible_to(self.request.user).with_owner()
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsOwnerOrReadOnly])
     def accept(self, request, pk=None):
         application = self.get_object()
-        self.check_object_permissions(request, application)
         application.status = 1  # Accepted
         application.save()
         return Response({'status': 'accepted'})
@@ -105,21 +156,27 @@ class ProjectApplicationViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsOwnerOrReadOnly])
     def reject(self, request, pk=None):
         application = self.get_object()
-        self.check_object_permissions(request, application)
         application.status = 2  # Rejected
         application.save()
         return Response({'status': 'rejected'})
 
 
+def gig_application_exists(user, status):
+    """Whether the user has an application with ``status`` to the outer gig."""
+    return Exists(GigApplication.objects.filter(gig=OuterRef('pk'), freelancer__user=user, status=status))
+
+
+def project_application_exists(user, status):
+    """Whether the user has an application with ``status`` to the outer project."""
+    return Exists(ProjectApplication.objects.filter(project=OuterRef('pk'), freelancer__user=user, status=status))
+
+
 class AcceptedGigsView(generics.ListAPIView):
     serializer_class = GigSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        return Gig.objects.filter(
-            Q(gig_application__freelancer__user=user, gig_application__status=1)
-        ).distinct()
+        return Gig.objects.filter(gig_application_exists(self.request.user, 1))
 
 
 class PendingGigsView(generics.ListAPIView):
@@ -127,10 +184,7 @@ class PendingGigsView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        return Gig.objects.filter(
-            Q(gig_application__freelancer__user=user, gig_application__status=0)
-        ).distinct()
+        return Gig.objects.filter(gig_application_exists(self.request.user, 0))
 
 
 class AcceptedProjectsView(generics.ListAPIView):
@@ -140,10 +194,7 @@ class AcceptedProjectsView(generics.ListAPIView):
     def get_queryset(self):
         user = self.request.user
         # Filter projects where the user is either the owner or has accepted applications
-        return Project.objects.filter(
-            Q(associated_user=user) |
-            Q(project_application__freelancer__user=user, project_application__status=1)
-        ).distinct()
+        return Project.objects.filter(Q(associated_user=user) | project_application_exists(user, 1))
 
 
 class PendingProjectsView(generics.ListAPIView):
@@ -153,7 +204,138 @@ class PendingProjectsView(generics.ListAPIView):
     def get_queryset(self):
         user = self.request.user
         # Filter projects where the user is either the owner or has pending applications
-        return Project.objects.filter(
-            Q(associated_user=user) |
-            Q(project_application__freelancer__user=user, project_application__status=0)
-        ).distinct()
+        return Project.objects.filter(Q(associated_user=user) | project_application_exists(user, 0))
+
+
+class DashboardView(APIView):
+    """
+    The freelancer's "my work" screen in one request.
+
+    Returns the accepted and pending gigs and projects (the same sets as the
+    accepted-/pending- endpoints) plus their counts. Gigs and projects are each
+    loaded with a single query that flags whether the user has an accepted and
+    a pending application, and related rows are prefetched once for both sets,
+    so the number of queries does not grow with the number of gigs.
+    """
+    permission_classes = [IsAuthenticated]
+
+    # Freelancers are serialized as ids, so their JSON profile columns are never loaded.
+    # Companies come from the profile cache (user.cache).
+    GIG_PREFETCH = ('documents', 'reports', Prefetch('freelancers', Freelancer.objects.only('id')),
+                    'project__documents', Prefetch('project__freelancers', Freelancer.objects.only('id')),
+                    'project__reports')
+    PROJECT_PREFETCH = ('documents', Prefetch('freelancers', Freelancer.objects.only('id')), 'reports')
+
+    def get(self, request):
+        user = request.user
+        gigs = list(Gig.objects.annotate(accepted=gig_application_exists(user, 1),
+                                         pending=gig_application_exists(user, 0))
+                    .filter(Q(accepted=True) | Q(pending=True))
+                    .select_related('project')
+                    .prefetch_related(*self.GIG_PREFETCH)
+                    .order_by('start'))
+        projects = list(Project.objects.annotate(accepted=project_application_exists(user, 1),
+                                                 pending=project_application_exists(user, 0))
+                        .filter(Q(associated_user=user) | Q(accepted=True) | Q(pending=True))
+                        .prefetch_related(*self.PROJECT_PREFETCH)
+                        .order_by('start_date'))
+
+        context = self.get_serializer_context()
+        gig_data = GigSerializer(gigs, many=True, context=context).data
+        project_data = ProjectSerializer(projects, many=True, context=context).data
+        owned = {project.pk for project in projects if project.associated_user_id == user.pk}
+
+        sets = {
+            'accepted_gigs': [data for gig, data in zip(gigs, gig_data) if gig.accepted],
+            'pending_gigs': [data for gig, data in zip(gigs, gig_data) if gig.pending],
+            'accepted_projects': [data for project, data in zip(projects, project_data)
+                                  if project.pk in owned or project.accepted],
+            'pending_projects': [data for project, data in zip(projects, project_data)
+                                 if project.pk in owned or project.pending],
+        }
+        return Response(dict(sets, counts={name: len(rows) for name, rows in sets.items()}))
+
+    def get_serializer_context(self):
+        return {'request': self.request, 'view': self}
+
+
+class SearchView(APIView):
+    """
+    Ranked full-text search over projects and gigs.
+
+    Query parameters:
+    - `q`: Search text. Every word is matched as a prefix.
+    - `type`: Optional, `project` or `gig`.
+    - `status`, `category`: Optional exact filters.
+    - `limit`, `offset`: Paging, `limit` is capped by `SEARCH_MAX_RESULTS`.
+
+    Returns:
+    - 200 OK with the matching documents, best match first.
+    - 400 Bad Request if `type` or paging parameters are invalid.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        kind = params.get('type') or None
+        if kind is not None and kind not in KINDS:
+            return Response({"error": f"type must be one of {', '.join(KINDS)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(params.get('limit', 20)), settings.SEARCH_MAX_RESULTS)
+            offset = int(params.get('offset', 0))
+        except ValueError:
+            return Response({"error": "limit and offset must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1 or offset < 0:
+            return Response({"error": "limit must be positive and offset non-negative."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        results = get_search_backend().search(
+            params.get('q', ''),
+            kind=kind,
+            status=params.get('status') or None,
+            category=params.get('category') or None,
+            limit=limit,
+            offset=offset,
+        )
+        return Response({'results': results})
+
+
+class LeaderboardView(APIView):
+    """
+    Top-rated freelancers, best Bayesian score first.
+
+    Query parameters:
+    - `category` or `skill`: The board to read; without either, the overall board.
+    - `after`: Cursor returned by the previous page.
+    - `limit`: Page size, capped by `RATING_LEADERBOARD_PAGE_SIZE`.
+
+    Returns:
+    - 200 OK with the freelancers on the page, each with its cached summary
+      profile, and the cursor for the next page.
+    - 400 Bad Request for an invalid cursor or limit, or both `category` and `skill`.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        category, skill = params.get('category'), params.get('skill')
+        if category and skill:
+            return Response({"error": "Pass either category or skill, not both."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if category:
+            kind, key = FreelancerRating.CATEGORY, category
+        elif skill:
+            kind, key = FreelancerRating.SKILL, skill.lower()
+        else:
+            kind, key = FreelancerRating.OVERALL, ''
+        try:
+            limit = min(int(params.get('limit', settings.RATING_LEADERBOARD_PAGE_SIZE)),
+                        settings.RATING_LEADERBOARD_PAGE_SIZE)
+            results, cursor = leaderboard(kind, key, params.get('after'), max(limit, 1))
+        except (ValueError, InvalidCursor):
+            return Response({"error": "Invalid cursor or limit."}, status=status.HTTP_400_BAD_REQUEST)
+        profiles = freelancer_profiles.get_many(row['freelancer'] for row in results)
+        for row in results:
+            row['profile'] = profiles.get(row['freelancer'])
+        return Response({'results': results, 'cursor': cursor})
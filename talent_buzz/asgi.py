@@ -13,4 +13,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'talent_buzz.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.urls import reverse  # noqa: E402  needs the settings and app registry
+
+from common.streams import EventStreamApplication  # noqa: E402
+
+# Server-sent event connections are long-lived and mostly idle, so they bypass
+# the Django request cycle (see common.streams).
+event_stream_path = reverse('event-stream')
+event_stream = EventStreamApplication()
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == event_stream_path:
+        return await event_stream(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 import datetime
 import os
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -54,14 +55,21 @@ THIRD_PARTY_APPS = [
     'rest_framework',
     'rest_framework_simplejwt.token_blacklist',
     'rest_framework.authtoken',
-    'drf_yasg',
     'corsheaders',
+    'django_filters',
 ]
 
 CUSTOM_APPS = ['user', 'common', 'project', 'finance']
+
+# drf_yasg is imported on the first schema request (common/schema.py) rather than
+# as an installed app at startup; its templates and static files are added by
+# path. find_spec locates the package without importing it.
+DRF_YASG_DIR = Path(find_spec('drf_yasg').submodule_search_locations[0])
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + CUSTOM_APPS
 
 MIDDLEWARE = [
+    'common.middleware.RequestMetricsMiddleware',
+    'common.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,7 +85,7 @@ ROOT_URLCONF = 'talent_buzz.urls'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [BASE_DIR / 'templates']
+        'DIRS': [BASE_DIR / 'templates', DRF_YASG_DIR / 'templates']
         ,
         'APP_DIRS': True,
         'OPTIONS': {
@@ -100,6 +108,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Every view runs in a transaction, reads included, so outbox events commit with
+        # the rows they describe; long-lived views opt out with non_atomic_requests.
+        'ATOMIC_REQUESTS': True,
+        # A file, not SQLite's default in-memory test database, so the concurrency tests
+        # can run their threads against one database.
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -136,6 +150,7 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.0/howto/static-files/
 
 STATIC_URL = 'static/'
+STATICFILES_DIRS = [DRF_YASG_DIR / 'static']
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -145,7 +160,7 @@ AUTH_USER_MODEL = 'user.User'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [BASE_DIR / 'templates']
+        'DIRS': [BASE_DIR / 'templates', DRF_YASG_DIR / 'templates']
         ,
         'APP_DIRS': True,
         'OPTIONS': {
@@ -172,6 +187,128 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Full-text search over projects and gigs, see project/search.py
+SEARCH_BACKEND = 'project.search.SQLiteFTSBackend'
+SEARCH_MAX_RESULTS = 100
+
+# Per-route request metrics, see common/middleware.py. Requests over either
+# budget are logged with their slowest queries.
+METRICS_LATENCY_BUDGET_MS = 500
+METRICS_QUERY_BUDGET = 50
+METRICS_SLOW_QUERY_COUNT = 3
+# Bearer token the Prometheus scraper sends to /metrics; without it only staff
+# sessions can read the endpoint.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# On-demand profiling, see common/profiling.py. Requests are profiled when they
+# carry a signed X-Profile header (manage.py profiling_token) or are sampled.
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_BUFFER_SIZE = 50
+PROFILING_TOKEN_MAX_AGE = 3600
+PROFILING_STATS_LIMIT = 40
+
+# Admin changelists over tables larger than this show an estimated row count,
+# see common/admin_utils.py. Distinct values for list filters are cached.
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+ADMIN_FILTER_CHOICES_TIMEOUT = 600
+
+# Invoice numbers are sequential per company and year, see finance/numbering.py.
+INVOICE_NUMBER_FORMAT = '{year}-{number:06d}'
+
+# Exchange rates (finance.rates): rates are stored as the value of one unit of
+# a currency in this base currency. Looked up rates are cached per process for
+# at most EXCHANGE_RATE_CACHE_SECONDS, after which rates loaded elsewhere apply.
+EXCHANGE_RATE_BASE_CURRENCY = 'EUR'
+EXCHANGE_RATE_CACHE_SECONDS = 5 * 60
+
+# Outbox (common.outbox): events per feed page, and the pruning policy applied
+# by the prune_outbox command.
+OUTBOX_BATCH_SIZE = 500
+OUTBOX_RETENTION_DAYS = 14
+OUTBOX_MAX_EVENTS = 1000000
+
+# Server-sent events (common.streams): events buffered per connection before the
+# oldest is dropped, the keep-alive interval, how long a ?token= stream token
+# can be used to connect, and how long the WSGI fallback keeps a stream (and
+# its worker thread) before the client has to reconnect.
+SSE_QUEUE_SIZE = 100
+SSE_HEARTBEAT_SECONDS = 15
+SSE_TOKEN_MAX_AGE = 60
+SSE_SYNC_STREAM_SECONDS = 60
+
+# Delta sync (common.sync): how far behind the clock handed-out watermarks trail,
+# so rows from transactions still open at read time are not skipped.
+SYNC_WATERMARK_OVERLAP_SECONDS = 5
+
+# Batch endpoint (common.batch): sub-requests per batch, and threads used to run
+# read-only batches concurrently.
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_WORKERS = 4
+
+# Auth throttling (user.throttling): token buckets per scope, "<burst>/<period>"
+# refilled evenly over the period. Buckets live in THROTTLE_CACHE, which must be
+# a cache shared by all workers (Redis or Memcached) in production.
+THROTTLE_CACHE = 'default'
+AUTH_THROTTLE_RATES = {
+    'signup': '10/hour',
+    'password_reset': '5/hour',
+    'token': '20/min',
+    'social_login': '30/min',
+}
+AUTH_THROTTLE_BLOCKLIST_SIZE = 10000
+
+# Bulk gig creation (POST /project/projects/<id>/gigs/): gigs per request.
+GIG_BULK_MAX_SIZE = 200
+
+# Freelancer ratings (project.ratings): scores are Bayesian averages that start
+# at RATING_PRIOR_MEAN stars and move away from it as reviews outweigh
+# RATING_PRIOR_COUNT virtual reviews. Leaderboard pages hold at most
+# RATING_LEADERBOARD_PAGE_SIZE freelancers.
+RATING_PRIOR_MEAN = 3.5
+RATING_PRIOR_COUNT = 5
+RATING_LEADERBOARD_PAGE_SIZE = 50
+
+# OpenAPI schema (common.schema): a JSON file written at deploy time by
+# export_openapi_schema. When unset the schema is generated on first request;
+# either way it is kept in memory and served with an ETag.
+OPENAPI_SCHEMA_FILE = None
+
+# Worker startup (common.importtime, manage.py import_time_report): the import
+# time budget for django.setup() plus URLconf loading, and modules that must
+# only be imported on first use.
+STARTUP_IMPORT_BUDGET_MS = 1500
+STARTUP_DEFERRED_MODULES = ['drf_yasg', 'PIL']
+
+# Company and freelancer profile cache (user.cache): the cache alias, and how
+# long an entry lives. Entries are invalidated on write, the timeout only
+# bounds memory. Invalidations only reach workers that share the cache, so it is
+# off (None) until this names a cache shared by all workers (Redis or
+# Memcached); the default LocMemCache is per process and serves stale profiles.
+PROFILE_CACHE = None
+PROFILE_CACHE_TIMEOUT = 60 * 60
+
+# Archival (common.archive, manage.py archive_rows): reports and applications
+# of closed projects and paid invoices move to archive tables this many days
+# after the project ended or the invoice was paid, ARCHIVE_BATCH_SIZE rows per
+# transaction. The hourly scheduled run moves at most ARCHIVE_JOB_MAX_BATCHES
+# batches per model, so it finishes within SCHEDULER_LEASE_SECONDS.
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_BATCH_SIZE = 1000
+ARCHIVE_JOB_MAX_BATCHES = 20
+
+# Scheduler (common.scheduler, manage.py run_scheduler): how often schedulers
+# look for due jobs, how long the leader's lease lasts without renewal (longer
+# than the slowest job), and how long job runs are kept.
+SCHEDULER_TICK_SECONDS = 10
+SCHEDULER_LEASE_SECONDS = 300
+SCHEDULER_RUN_RETENTION_DAYS = 30
+
+# Overdue invoices (finance.overdue): invoices updated per transaction.
+INVOICE_OVERDUE_CHUNK_SIZE = 5000
+
+# Payouts (finance.payouts): payout batches per INSERT.
+PAYOUT_CHUNK_SIZE = 5000
+
 SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'ALGORITHM': 'HS256',
@@ -16,27 +16,17 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from drf_yasg import openapi
-from drf_yasg.views import get_schema_view
-from rest_framework import permissions
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="AI",
-        default_version='v1',
-        description="AI generative for events",
-        terms_of_service="https://www.yourapp.com/terms/",
-        contact=openapi.Contact(email="sadeghesfahani.sina@gmail.com"),
-        license=openapi.License(name="MIT License"),
-    ),
-    public=True,
-    permission_classes=([permissions.AllowAny]),
-)
+from common.views import metrics, openapi_schema, swagger_ui
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/', include('user.urls')),
     path('project/', include('project.urls')),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+    path('finance/', include('finance.urls')),
+    path('common/', include('common.urls')),
+    path('metrics', metrics, name='metrics'),
+    path('swagger/', swagger_ui, name='schema-swagger-ui'),
+    path('swagger.json', openapi_schema, name='schema-json'),
 
 ]
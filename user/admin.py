@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from common.admin_utils import KeysetPaginator, CachedAllValuesFieldListFilter
 from .models import User, Company, Freelancer
 
 
@@ -8,8 +9,14 @@ class CompanyAdmin(admin.ModelAdmin):
     list_display = (
     'company_name', 'owner', 'company_website', 'company_size', 'company_industry', 'company_type', 'company_founded',
     'company_location')
+    list_select_related = ('owner',)
+    paginator = KeysetPaginator
+    show_full_result_count = False
     search_fields = ('company_name', 'company_industry', 'company_type', 'company_location')
-    list_filter = ('company_size', 'company_industry', 'company_type', 'company_founded')
+    list_filter = (
+        ('company_size', CachedAllValuesFieldListFilter), ('company_industry', CachedAllValuesFieldListFilter),
+        ('company_type', CachedAllValuesFieldListFilter), 'company_founded'
+    )
     readonly_fields = ('owner',)
     fieldsets = (
         (None, {
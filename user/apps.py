@@ -1,6 +1,15 @@
+from datetime import timedelta
+
 from django.apps import AppConfig
 
 
 class UserConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'user'
+
+    def ready(self):
+        from . import cache  # noqa: F401  registers the profile cache invalidation signal handlers
+        from common import scheduler
+        from .tokens import flush_expired_tokens
+
+        scheduler.register('user.flush_expired_tokens', timedelta(hours=6), flush_expired_tokens)
@@ -0,0 +1,143 @@
+"""
+Read-through cache for company and freelancer profiles.
+
+Profiles are cached in their summary form (``CompanySummarySerializer`` and
+``FreelancerSummarySerializer``), which carries the resolved owner or user and
+the employees. Each entry is tagged with the profile's version token, and
+every write replaces the token: on save and delete of the profile, on changes
+to ``Company.employees`` and when a user embedded in a profile is saved. An
+entry cached by a reader that raced a write carries an old token and is never
+served. Looking up many profiles is one ``get_many`` for tokens and entries
+together; misses are loaded from the database in one query per model.
+
+Version tokens only reach the workers that share the cache, so the cache is
+off unless ``PROFILE_CACHE`` names a cache shared by all of them (Redis or
+Memcached); profiles are then always loaded from the database.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Company, Freelancer, User
+from .serializers import CompanySummarySerializer, FreelancerSummarySerializer, UserSerializer
+
+# User fields that appear in cached profiles; saving other fields (e.g. last_login) keeps them valid.
+EMBEDDED_USER_FIELDS = frozenset(UserSerializer.Meta.fields)
+
+
+def new_version():
+    return uuid.uuid4().hex
+
+
+class ProfileCache:
+    def __init__(self, kind, get_queryset, serializer_class):
+        self.kind = kind
+        self.get_queryset = get_queryset
+        self.serializer_class = serializer_class
+
+    @property
+    def cache(self):
+        return caches[settings.PROFILE_CACHE] if settings.PROFILE_CACHE else None
+
+    def load(self, pks):
+        return {row.pk: dict(self.serializer_class(row).data) for row in self.get_queryset().filter(pk__in=pks)}
+
+    def entry_key(self, pk):
+        return f'profile:{self.kind}:{pk}'
+
+    def version_key(self, pk):
+        return f'profile:{self.kind}:{pk}:version'
+
+    def get_many(self, pks):
+        """Return ``{pk: profile}`` for the profiles that exist."""
+        pks = {pk for pk in pks if pk is not None}
+        if not pks:
+            return {}
+        cache = self.cache
+        if cache is None:
+            return self.load(pks)
+        found = cache.get_many([key for pk in pks for key in (self.entry_key(pk), self.version_key(pk))])
+        profiles, misses = {}, {}
+        for pk in pks:
+            version, entry = found.get(self.version_key(pk)), found.get(self.entry_key(pk))
+            if version is not None and entry is not None and entry[0] == version:
+                profiles[pk] = entry[1]
+            else:
+                misses[pk] = version
+        if not misses:
+            return profiles
+
+        for pk, version in misses.items():
+            if version is None:
+                version = new_version()
+                # If a writer (or another reader) set a token first, skip caching this profile for now.
+                misses[pk] = version if cache.add(self.version_key(pk), version, None) else None
+        loaded = self.load(misses)
+        profiles.update(loaded)
+        connection = transaction.get_connection()
+        if connection.in_atomic_block and connection.run_on_commit:
+            # This transaction has writes that may still roll back; don't cache what it sees.
+            return profiles
+        cache.set_many({self.entry_key(pk): (misses[pk], profile) for pk, profile in loaded.items() if misses[pk]},
+                       settings.PROFILE_CACHE_TIMEOUT)
+        return profiles
+
+    def get(self, pk):
+        return self.get_many([pk]).get(pk)
+
+    def invalidate(self, pks):
+        pks = [pk for pk in pks if pk is not None]
+        if not pks or self.cache is None:
+            return
+
+        def bump():
+            self.cache.set_many({self.version_key(pk): new_version() for pk in pks}, None)
+
+        # Again after commit, in case a reader cached the pre-commit row under the first new token.
+        bump()
+        transaction.on_commit(bump)
+
+
+company_profiles = ProfileCache(
+    'company', lambda: Company.objects.summary().select_related('owner').prefetch_related('employees'),
+    CompanySummarySerializer)
+freelancer_profiles = ProfileCache(
+    'freelancer', lambda: Freelancer.objects.summary().select_related('user'), FreelancerSummarySerializer)
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_company(sender, instance, raw=False, **kwargs):
+    company_profiles.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=Freelancer)
+@receiver(post_delete, sender=Freelancer)
+def invalidate_freelancer(sender, instance, raw=False, **kwargs):
+    freelancer_profiles.invalidate([instance.pk])
+
+
+@receiver(m2m_changed, sender=Company.employees.through)
+def invalidate_employers(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            company_profiles.invalidate([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        company_profiles.invalidate(pk_set)
+    elif action == 'pre_clear':
+        # The companies are only known before the rows go.
+        company_profiles.invalidate(instance.employees.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_profiles(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    if created or (update_fields is not None and not EMBEDDED_USER_FIELDS.intersection(update_fields)):
+        return
+    company_profiles.invalidate(Company.objects.filter(Q(owner=instance) | Q(employees=instance))
+                                .values_list('pk', flat=True).distinct())
+    freelancer_profiles.invalidate(Freelancer.objects.filter(user=instance).values_list('pk', flat=True))
@@ -68,7 +68,18 @@ class User(AbstractUser):
         return self.first_name + " " + self.last_name + self.username
 
 
+class ProfileQuerySet(models.QuerySet):
+    """
+    Queryset for models with large JSON profile columns. ``summary`` leaves them
+    out, so list and nested contexts neither transfer nor decode them.
+    """
+    def summary(self):
+        return self.defer(*self.model.PROFILE_FIELDS)
+
+
 class Freelancer(models.Model):
+    PROFILE_FIELDS = ('availability', 'skill', 'language', 'experience', 'education', 'certification', 'portfolio')
+
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     hourly_rate = models.DecimalField(max_digits=10, decimal_places=2, blank=True)
     availability = models.JSONField(blank=True, null=True)
@@ -82,11 +93,15 @@ class Freelancer(models.Model):
     certification = models.JSONField(blank=True, null=True)
     portfolio = models.JSONField(blank=True, null=True)
 
+    objects = ProfileQuerySet.as_manager()
+
     def __str__(self):
         return self.user.first_name + " " + self.user.last_name
 
 
 class Company(models.Model):
+    PROFILE_FIELDS = ('company_specialities', 'company_social_media')
+
     owner = models.OneToOneField(User, on_delete=models.CASCADE)
     employees = models.ManyToManyField(User, related_name='employees')
     company_name = models.CharField(max_length=120, blank=True)
@@ -101,5 +116,7 @@ class Company(models.Model):
     company_specialities = models.JSONField(blank=True, null=True)
     company_social_media = models.JSONField(blank=True, null=True)
 
+    objects = ProfileQuerySet.as_manager()
+
     def __str__(self):
         return self.company_name
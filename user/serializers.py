@@ -39,6 +39,15 @@ class FreelancerSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class FreelancerSummarySerializer(serializers.ModelSerializer):
+    """Freelancer without the JSON profile columns, for lists and nesting."""
+    user = UserSerializer()
+
+    class Meta:
+        model = Freelancer
+        exclude = Freelancer.PROFILE_FIELDS
+
+
 class CompanySerializer(serializers.ModelSerializer):
     owner = UserSerializer()
     employees = UserSerializer(many=True)
@@ -46,3 +55,13 @@ class CompanySerializer(serializers.ModelSerializer):
     class Meta:
         model = Company
         fields = '__all__'
+
+
+class CompanySummarySerializer(serializers.ModelSerializer):
+    """Company without the JSON profile columns, for lists and nesting."""
+    owner = UserSerializer()
+    employees = UserSerializer(many=True)
+
+    class Meta:
+        model = Company
+        exclude = Company.PROFILE_FIELDS
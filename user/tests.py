@@ -1,3 +1,194 @@
-from django.test import TestCase
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from user.throttling import TokenBucket, AuthRateThrottle, blocklist, parse_rate
+
+User = get_user_model()
+
+
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.bucket = TokenBucket(*parse_rate('5/min'), cache)
+
+    def take(self, now, count=1):
+        return [self.bucket.take('bucket', now) for _ in range(count)]
+
+    def test_burst_then_refill_rate(self):
+        self.assertEqual(parse_rate('5/min'), (5, 12000))
+        self.assertEqual(self.take(0, 5), [0] * 5)
+        self.assertEqual(self.take(0), [12000])
+        self.assertEqual(self.take(6000), [6000])
+        self.assertEqual(self.take(12000, 2), [0, 12000])
+
+    def test_idle_bucket_refills_to_capacity_only(self):
+        self.take(0, 5)
+        self.assertEqual(self.take(600000, 6), [0] * 5 + [12000])
+
+    def test_concurrent_takes_never_exceed_the_burst(self):
+        bucket = TokenBucket(*parse_rate('100/h'), cache)
+        allowed = []
+
+        def worker():
+            allowed.extend(1 for _ in range(25) if bucket.take('shared', 1000) == 0)
+
+        threads = [threading.Thread(target=worker) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(allowed), 100)
+
+
+class ThrottledEndpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        blocklist.clear()
+        self.client = APIClient()
+
+    @override_settings(AUTH_THROTTLE_RATES={'token': '3/min'})
+    def test_token_endpoint_is_throttled_before_checking_passwords(self):
+        statuses = [self.client.post('/auth/token/', {'username': 'someone', 'password': 'wrong'}).status_code
+                    for _ in range(4)]
+        self.assertEqual(statuses, [401, 401, 401, 429])
+        response = self.client.post('/auth/token/', {'username': 'other', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '20')
+
+    @override_settings(AUTH_THROTTLE_RATES={'password_reset': '2/h'})
+    def test_password_reset_is_throttled_per_email_across_ips(self):
+        statuses = [self.client.post('/auth/password-reset/', {'email': 'Victim@example.com'},
+                                     REMOTE_ADDR=f'10.0.0.{index}').status_code for index in range(3)]
+        self.assertEqual(statuses, [400, 400, 429])
+        other = self.client.post('/auth/password-reset/', {'email': 'other@example.com'}, REMOTE_ADDR='10.0.0.9')
+        self.assertEqual(other.status_code, 400)
+
+    @override_settings(AUTH_THROTTLE_RATES={'token': '1/min'})
+    def test_blocked_clients_are_rejected_without_cache_access(self):
+        self.client.post('/auth/token/', {'username': 'someone', 'password': 'wrong'})
+        self.client.post('/auth/token/', {'username': 'someone', 'password': 'wrong'})
+        with mock.patch.object(TokenBucket, 'take') as take:
+            for _ in range(100):
+                response = self.client.post('/auth/token/', {'username': 'someone', 'password': 'wrong'})
+                self.assertEqual(response.status_code, 429)
+        take.assert_not_called()
+
+    def test_unconfigured_scopes_are_not_throttled(self):
+        throttle = AuthRateThrottle()
+        throttle.scope = 'unknown'
+        self.assertTrue(throttle.allow_request(None, None))
+
+
+class ProfileSummaryTests(TestCase):
+    def setUp(self):
+        from user.models import Freelancer, Company
+        self.user = User.objects.create_user(username='free', password='secret')
+        Freelancer.objects.create(user=self.user, hourly_rate=10, skill=['python'], portfolio=[{'url': 'x'}])
+        Company.objects.create(owner=self.user, company_name='Acme', company_specialities=['web'])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data, ' '.join(query['sql'] for query in queries)
+
+    def test_lists_skip_the_json_columns(self):
+        freelancers, sql = self.get('/auth/freelancers/')
+        self.assertNotIn('skill', freelancers[0])
+        self.assertEqual(freelancers[0]['user']['username'], 'free')
+        self.assertNotIn('"portfolio"', sql)
+        companies, sql = self.get('/auth/companies/')
+        self.assertNotIn('company_specialities', companies[0])
+        self.assertNotIn('"company_specialities"', sql)
+
+    def test_detail_returns_the_full_profile(self):
+        freelancer, _ = self.get(f'/auth/freelancers/{self.user.freelancer.pk}/')
+        self.assertEqual((freelancer['skill'], freelancer['portfolio']), (['python'], [{'url': 'x'}]))
+        company, _ = self.get(f'/auth/companies/{self.user.company.pk}/')
+        self.assertEqual(company['company_specialities'], ['web'])
+
+
+@override_settings(PROFILE_CACHE='default')
+class ProfileCacheTests(TransactionTestCase):
+    # Invalidation runs again on commit, so these tests commit for real.
+    def setUp(self):
+        from user.models import Company
+        cache.clear()
+        self.owners = [User.objects.create_user(username=f'owner{index}', first_name='Ann') for index in range(3)]
+        self.companies = [Company.objects.create(owner=owner, company_name=f'Company {index}')
+                          for index, owner in enumerate(self.owners)]
+        self.companies[0].employees.add(self.owners[1])
+
+    def profiles(self):
+        from user.cache import company_profiles
+        return company_profiles.get_many(company.pk for company in self.companies)
+
+    def test_many_profiles_are_read_in_one_round_trip(self):
+        with self.assertNumQueries(2):  # companies with their owners, then the employees
+            cold = self.profiles()
+        with self.assertNumQueries(0), mock.patch.object(cache, 'get_many', wraps=cache.get_many) as get_many:
+            self.assertEqual(self.profiles(), cold)
+        self.assertEqual(get_many.call_count, 1)
+        first = cold[self.companies[0].pk]
+        self.assertEqual((first['company_name'], first['owner']['username']), ('Company 0', 'owner0'))
+        self.assertEqual([employee['id'] for employee in first['employees']], [self.owners[1].pk])
+
+    @override_settings(PROFILE_CACHE=None)
+    def test_without_a_shared_cache_profiles_come_from_the_database(self):
+        with mock.patch.object(cache, 'get_many') as get_many, mock.patch.object(cache, 'set_many') as set_many:
+            with self.assertNumQueries(2):
+                self.assertEqual(self.profiles()[self.companies[0].pk]['company_name'], 'Company 0')
+            self.companies[0].save()
+        get_many.assert_not_called()
+        set_many.assert_not_called()
+
+    def test_writes_replace_the_version(self):
+        self.profiles()
+        company = self.companies[0]
+        company.company_name = 'Renamed'
+        company.save()
+        company.employees.remove(self.owners[1])
+        self.owners[0].first_name = 'Bea'
+        self.owners[0].save()
+        self.owners[2].employees.add(company)
+        self.companies[1].delete()
+        profiles = self.profiles()
+        self.assertEqual(profiles[company.pk]['company_name'], 'Renamed')
+        self.assertEqual(profiles[company.pk]['owner']['first_name'], 'Bea')
+        self.assertEqual([employee['id'] for employee in profiles[company.pk]['employees']], [self.owners[2].pk])
+        self.assertNotIn(self.companies[1].pk, profiles)
+
+    def test_uncommitted_writes_are_not_cached(self):
+        from django.db import transaction
+        company = self.companies[0]
+        try:
+            with transaction.atomic():
+                company.company_name = 'Rolled back'
+                company.save()
+                self.assertEqual(self.profiles()[company.pk]['company_name'], 'Rolled back')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(self.profiles()[company.pk]['company_name'], 'Company 0')
+
+    def test_gig_pages_read_companies_from_the_cache(self):
+        from project.models import Gig
+        from project.serializers import GigSerializer
+        from common.test_utils import make_project, make_gig
+        for company in self.companies:
+            make_gig(make_project(company.owner), user=company)
+        gigs = Gig.objects.select_related('project').prefetch_related(
+            'documents', 'reports', 'freelancers', 'project__documents', 'project__freelancers', 'project__reports')
+        GigSerializer(gigs, many=True).data
+        with self.assertNumQueries(7):  # the gigs and their six prefetches, no company rows
+            data = GigSerializer(gigs.all(), many=True).data
+        self.assertEqual(sorted(gig['user']['company_name'] for gig in data), ['Company 0', 'Company 1', 'Company 2'])
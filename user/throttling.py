@@ -0,0 +1,173 @@
+"""
+Token-bucket throttles for the unauthenticated auth endpoints.
+
+Buckets live in the shared cache (``settings.THROTTLE_CACHE``) as a GCRA
+"theoretical arrival time" in milliseconds: taking a token is one atomic
+``incr`` by the refill interval, and a bucket is empty while that time runs
+more than ``capacity`` intervals ahead of the clock. A bucket that sat idle is
+caught up with a second ``incr``; a refused token is handed back with ``decr``.
+
+In front of the cache, every process keeps a small blocklist of keys the cache
+refused and until when, so the requests of a client that keeps hammering are
+rejected with a dict lookup and never reach the cache.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """``'5/min'`` -> ``(5, 12000)``: the bucket size and the milliseconds between refills."""
+    count, period = rate.split('/')
+    capacity = int(count)
+    return capacity, -(-PERIODS[period[0]] * 1000 // capacity)
+
+
+class LocalBlocklist:
+    """Bounded, thread-safe map of throttle keys to the time (ms) they are blocked until."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.blocked = OrderedDict()
+        self.lock = threading.Lock()
+
+    def blocked_until(self, key, now):
+        with self.lock:
+            until = self.blocked.get(key)
+            if until is not None and until <= now:
+                del self.blocked[key]
+                return None
+            return until
+
+    def block(self, key, until):
+        with self.lock:
+            self.blocked[key] = until
+            self.blocked.move_to_end(key)
+            while len(self.blocked) > self.max_size:
+                self.blocked.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.blocked.clear()
+
+
+blocklist = LocalBlocklist(getattr(settings, 'AUTH_THROTTLE_BLOCKLIST_SIZE', 10000))
+
+
+class TokenBucket:
+    def __init__(self, capacity, interval, cache):
+        self.capacity = capacity
+        self.interval = interval
+        self.cache = cache
+        self.burst = capacity * interval
+        # Long enough that expiry, which refills the bucket, rarely cuts a busy bucket short.
+        self.timeout = max(60, 10 * self.burst // 1000)
+
+    def take(self, key, now):
+        """Take a token at ``now`` (ms). Returns 0, or the milliseconds until one is available."""
+        try:
+            arrival = self.cache.incr(key, self.interval)
+        except ValueError:
+            self.cache.add(key, now, self.timeout)
+            arrival = self.cache.incr(key, self.interval)
+        if arrival - self.interval < now:
+            # The bucket refilled while idle: start counting from now.
+            arrival = self.cache.incr(key, now - (arrival - self.interval))
+        if arrival <= now + self.burst:
+            return 0
+        self.give_back(key)
+        return arrival - (now + self.burst)
+
+    def give_back(self, key):
+        try:
+            self.cache.decr(key, self.interval)
+        except ValueError:
+            pass
+
+
+class AuthRateThrottle(BaseThrottle):
+    """
+    Throttle keyed by every identity in ``idents`` (``ip``, ``user``,
+    ``username``, ``email``) at the rate of ``settings.AUTH_THROTTLE_RATES[scope]``.
+    A request needs a token from each of its buckets.
+    """
+    scope = None
+    idents = ('ip',)
+    timer = time.time
+
+    def __init__(self):
+        self.wait_ms = 0
+
+    def get_rate(self):
+        return getattr(settings, 'AUTH_THROTTLE_RATES', {}).get(self.scope)
+
+    def get_identity(self, request, ident):
+        if ident == 'ip':
+            return self.get_ident(request)
+        if ident == 'user':
+            return request.user.pk if request.user and request.user.is_authenticated else None
+        value = request.data.get(ident) if hasattr(request.data, 'get') else None
+        return value.strip().lower() if isinstance(value, str) and value.strip() else None
+
+    def get_cache_keys(self, request):
+        keys = []
+        for ident in self.idents:
+            value = self.get_identity(request, ident)
+            if value is not None:
+                digest = hashlib.sha1(str(value).encode()).hexdigest()[:20]
+                keys.append(f'throttle:{self.scope}:{ident}:{digest}')
+        return keys
+
+    def allow_request(self, request, view):
+        rate = self.get_rate()
+        if rate is None:
+            return True
+        now = int(self.timer() * 1000)
+        keys = self.get_cache_keys(request)
+        for key in keys:
+            until = blocklist.blocked_until(key, now)
+            if until is not None:
+                self.wait_ms = until - now
+                return False
+        bucket = TokenBucket(*parse_rate(rate), caches[getattr(settings, 'THROTTLE_CACHE', 'default')])
+        taken = []
+        for key in keys:
+            wait = bucket.take(key, now)
+            if wait:
+                for taken_key in taken:
+                    bucket.give_back(taken_key)
+                blocklist.block(key, now + wait)
+                self.wait_ms = wait
+                return False
+            taken.append(key)
+        return True
+
+    def wait(self):
+        return self.wait_ms / 1000
+
+
+class SignupThrottle(AuthRateThrottle):
+    scope = 'signup'
+    idents = ('ip', 'email')
+
+
+class PasswordResetThrottle(AuthRateThrottle):
+    scope = 'password_reset'
+    idents = ('ip', 'email')
+
+
+class TokenObtainThrottle(AuthRateThrottle):
+    scope = 'token'
+    idents = ('ip', 'username')
+
+
+class SocialLoginThrottle(AuthRateThrottle):
+    scope = 'social_login'
+    idents = ('ip',)
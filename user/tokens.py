@@ -0,0 +1,17 @@
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+
+def flush_expired_tokens(chunk_size=10000):
+    """
+    Delete expired refresh tokens and their blacklist entries, ``chunk_size``
+    at a time. Returns the number of tokens deleted.
+    """
+    expired = OutstandingToken.objects.filter(expires_at__lte=timezone.now())
+    total = 0
+    while True:
+        ids = list(expired.values_list('pk', flat=True)[:chunk_size])
+        if ids:
+            total += OutstandingToken.objects.filter(pk__in=ids).delete()[1].get(OutstandingToken._meta.label, 0)
+        if len(ids) < chunk_size:
+            return total
@@ -1,9 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenRefreshView
 
 from .views import UserCreateView, UserEditView, PasswordResetView, SetPasswordView, ActivateAccountView, \
-    GoogleLoginView, FacebookLoginView, GetUserIdView, UserViewSet, FreelancerViewSet, CompanyViewSet
+    GoogleLoginView, FacebookLoginView, GetUserIdView, UserViewSet, FreelancerViewSet, CompanyViewSet, \
+    ThrottledTokenObtainPairView
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet)
@@ -11,7 +12,7 @@ router.register(r'freelancers', FreelancerViewSet)
 router.register(r'companies', CompanyViewSet)
 
 urlpatterns = [
-    path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('token/', ThrottledTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('user/create/', UserCreateView.as_view(), name='user-create'),
     path('user/edit/<int:pk>/', UserEditView.as_view(), name='user-edit'),
@@ -1,6 +1,5 @@
 import logging
 
-import requests
 from django.conf.global_settings import EMAIL_HOST_USER
 from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import default_token_generator
@@ -12,11 +11,13 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView
 
 from talent_buzz.settings import PLATFORM_DOMAIN
 from .models import Freelancer, Company
 from .serializers import UserSerializer, PasswordResetSerializer, SetPasswordSerializer, FreelancerSerializer, \
-    CompanySerializer
+    CompanySerializer, FreelancerSummarySerializer, CompanySummarySerializer
+from .throttling import SignupThrottle, PasswordResetThrottle, TokenObtainThrottle, SocialLoginThrottle
 
 logger = logging.getLogger(__name__)
 
@@ -56,8 +57,10 @@ class UserCreateView(generics.CreateAPIView):
        Returns:
        - 201 Created if registration is successful.
        - 400 Bad Request if there are input errors.
+       - 429 Too Many Requests when throttled.
        """
     permission_classes = (AllowAny,)
+    throttle_classes = (SignupThrottle,)
     queryset = User.objects.all()
     serializer_class = UserSerializer
 
@@ -116,10 +119,12 @@ class PasswordResetView(APIView):
         Returns:
         - 200 OK if password reset email is sent successfully.
         - 400 Bad Request if there are errors.
+        - 429 Too Many Requests when throttled.
     """
 
     EMAIL_SUBJECT = 'Password Reset Requested'
-    PERMISSION_CLASSES = (AllowAny,)
+    permission_classes = (AllowAny,)
+    throttle_classes = (PasswordResetThrottle,)
 
     def post(self, request):
         serializer = PasswordResetSerializer(data=request.data)
@@ -217,6 +222,7 @@ class ActivateAccountView(APIView):
 
 class GoogleLoginView(viewsets.ViewSet):
     permission_classes = (AllowAny,)
+    throttle_classes = (SocialLoginThrottle,)
 
     def login_or_signup(self, request):
         access_token = request.data.get('access_token')
@@ -238,6 +244,8 @@ class GoogleLoginView(viewsets.ViewSet):
 
     @staticmethod
     def get_google_user_info(access_token):
+        import requests  # only social logins need it, so it stays out of worker startup
+
         headers = {
             'Authorization': f'Bearer {access_token}'
         }
@@ -265,6 +273,7 @@ class GoogleLoginView(viewsets.ViewSet):
 
 class FacebookLoginView(viewsets.ViewSet):
     permission_classes = (AllowAny,)
+    throttle_classes = (SocialLoginThrottle,)
 
     def login_or_signup(self, request):
         access_token = request.data.get('access_token')
@@ -286,6 +295,8 @@ class FacebookLoginView(viewsets.ViewSet):
 
     @staticmethod
     def get_facebook_user_info(access_token):
+        import requests
+
         params = {
             'fields': 'id,name,email,picture',
             'access_token': access_token
@@ -314,6 +325,11 @@ class FacebookLoginView(viewsets.ViewSet):
         return user
 
 
+class ThrottledTokenObtainPairView(TokenObtainPairView):
+    """``TokenObtainPairView`` throttled per IP and username before the password is checked."""
+    throttle_classes = (TokenObtainThrottle,)
+
+
 # @login_required
 class GetUserIdView(APIView):
     permission_classes = (IsAuthenticated,)
@@ -331,11 +347,37 @@ class UserViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
 class FreelancerViewSet(viewsets.ModelViewSet):
+    """
+    Lists return the summary projection; the JSON profile columns are only
+    loaded and returned by the detail routes.
+    """
     queryset = Freelancer.objects.all()
     serializer_class = FreelancerSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        if self.action == 'list':
+            return Freelancer.objects.summary().select_related('user').order_by('pk')
+        return Freelancer.objects.select_related('user')
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return FreelancerSummarySerializer
+        return FreelancerSerializer
+
+
 class CompanyViewSet(viewsets.ModelViewSet):
+    """Same summary/detail split as ``FreelancerViewSet``."""
     queryset = Company.objects.all()
     serializer_class = CompanySerializer
-    permission_classes = [IsAuthenticated]
\ No newline at end of file
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        if self.action == 'list':
+            return Company.objects.summary().select_related('owner').prefetch_related('employees').order_by('pk')
+        return Company.objects.select_related('owner').prefetch_related('employees')
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return CompanySummarySerializer
+        return CompanySerializer